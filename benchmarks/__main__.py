@@ -0,0 +1,96 @@
+import sys
+import json
+from argparse import ArgumentParser
+
+from .scenarios import SCENARIOS, Options
+
+
+def print_result(result, as_json: bool = False):
+    if as_json:
+        print(json.dumps(result.to_dict()))
+        return
+
+    print(
+        f"{result.scenario:<10} "
+        f"{result.elapsed:8.2f}s "
+        f"{result.queries:8d} queries "
+        f"{result.queries_per_second:10.1f} q/s "
+        f"{result.records:7d} records "
+        f"{result.store_calls_per_record:6.2f} store-calls/record "
+        f"{result.peak_memory_kb:10.1f} KiB peak")
+
+
+def main():
+    parser = ArgumentParser(
+        prog="benchmarks",
+        description="Benchmark the tools against a local stub DNS server "
+        "and a fake asset store.")
+    parser.add_argument(
+        "scenario", help="scenario to run",
+        choices=[*SCENARIOS, "all"], nargs="?", default="all")
+    parser.add_argument(
+        "-n", "--names", help="number of target names (dnsdump, txtminer)",
+        type=int, default=20)
+    parser.add_argument(
+        "-w", "--words", help="wordlist size (dnsfuzz)",
+        type=int, default=2000)
+    parser.add_argument(
+        "-a", "--addresses", help="number of swept addresses, rounded up "
+        "to a network (ptrsweep)", type=int, default=4096)
+    parser.add_argument(
+        "--hit-ratio", help="ratio of existing subdomains (dnsfuzz) or "
+        "addresses with a name (ptrsweep)",
+        type=float, default=0.05)
+    parser.add_argument(
+        "--wildcard", help="add a wildcard record to the zone (dnsfuzz)",
+        action="store_true")
+    parser.add_argument(
+        "--axfr", help="allow zone transfers from the stub (dnsdump)",
+        action="store_true")
+    parser.add_argument(
+        "--latency", help="stub DNS server latency (ms)",
+        type=float, default=0)
+    parser.add_argument(
+        "--loss", help="stub DNS server UDP loss probability",
+        type=float, default=0)
+    parser.add_argument(
+        "--rtt", help="fake asset store round-trip time (ms)",
+        type=float, default=0)
+    parser.add_argument(
+        "-c", "--concurrency", help="commands run concurrently (dnsdump)",
+        type=int, default=8)
+    parser.add_argument(
+        "--workers", help="worker processes (dnsfuzz)",
+        type=int, default=1)
+    parser.add_argument(
+        "--no-memory", help="do not trace memory, for accurate throughput",
+        action="store_true")
+    parser.add_argument(
+        "--json", help="print results as JSON lines",
+        action="store_true")
+    config = parser.parse_args()
+
+    options = Options(
+        names=config.names,
+        words=config.words,
+        addresses=config.addresses,
+        hit_ratio=config.hit_ratio,
+        wildcard=config.wildcard,
+        axfr=config.axfr,
+        latency=config.latency / 1000.0,
+        loss=config.loss,
+        rtt=config.rtt / 1000.0,
+        concurrency=config.concurrency,
+        workers=config.workers,
+        trace_memory=not config.no_memory)
+
+    scenarios = SCENARIOS if config.scenario == "all" \
+        else {config.scenario: SCENARIOS[config.scenario]}
+
+    for bench in scenarios.values():
+        print_result(bench(options), config.json)
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import time
+import asyncio
+import itertools
+from collections import Counter
+from typing import Any
+
+from oam_client.messages import Entity, Edge, EntityTag, EdgeTag
+
+
+def _make(cls: type, **attrs) -> Any:
+    """
+    Build an oam_client message without going through the broker.
+    """
+    try:
+        return cls(**attrs)
+    except TypeError:
+        o = cls.__new__(cls)
+        for k, v in attrs.items():
+            object.__setattr__(o, k, v)
+        return o
+
+
+class FakeStore:
+    """
+    Asset store double recording every call, deduplicating entities on
+    their asset key like the real store does.
+    """
+
+    rtt: float
+    calls: Counter
+    entities: dict[str, Any]
+
+    def __init__(self, rtt: float = 0.0):
+        """
+        :param rtt: simulated round-trip time of each call (in s)
+        """
+        self.rtt = rtt
+        self.calls = Counter()
+        self.entities = {}
+        self.ids = itertools.count(1)
+
+    def _entity(self, asset) -> Entity:
+        self.calls["create_entity"] += 1
+        key = f"{asset.asset_type.value}:{asset.key}"
+        if key not in self.entities:
+            entity = _make(Entity, asset=asset, type=asset.asset_type)
+            object.__setattr__(entity, "id", str(next(self.ids)))
+            self.entities[key] = entity
+        return self.entities[key]
+
+    def _edge(self, relation, from_id: str, to_id: str) -> Edge:
+        self.calls["create_edge"] += 1
+        return _make(
+            Edge, id=str(next(self.ids)), relation=relation,
+            from_entity=from_id, to_entity=to_id)
+
+    def _entity_tag(self, prop, entity_id: str) -> EntityTag:
+        self.calls["create_entity_tag"] += 1
+        return _make(EntityTag, id=str(next(self.ids)), prop=prop)
+
+    def _edge_tag(self, prop, edge_id: str) -> EdgeTag:
+        self.calls["create_edge_tag"] += 1
+        return _make(EdgeTag, id=str(next(self.ids)), prop=prop)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeAsyncBrokerClient(FakeStore):
+    """
+    Stand-in for oam_client.AsyncBrokerClient.
+    """
+
+    async def _wait(self):
+        if self.rtt > 0:
+            await asyncio.sleep(self.rtt)
+
+    async def create_entity(self, asset) -> Entity:
+        await self._wait()
+        return self._entity(asset)
+
+    async def create_edge(self, relation, from_id: str, to_id: str) -> Edge:
+        await self._wait()
+        return self._edge(relation, from_id, to_id)
+
+    async def create_entity_tag(self, prop, entity_id: str) -> EntityTag:
+        await self._wait()
+        return self._entity_tag(prop, entity_id)
+
+    async def create_edge_tag(self, prop, edge_id: str) -> EdgeTag:
+        await self._wait()
+        return self._edge_tag(prop, edge_id)
+
+
+class FakeBrokerClient(FakeStore):
+    """
+    Stand-in for oam_client.BrokerClient.
+    """
+
+    def _wait(self):
+        if self.rtt > 0:
+            time.sleep(self.rtt)
+
+    def create_entity(self, asset) -> Entity:
+        self._wait()
+        return self._entity(asset)
+
+    def create_edge(self, relation, from_id: str, to_id: str) -> Edge:
+        self._wait()
+        return self._edge(relation, from_id, to_id)
+
+    def create_entity_tag(self, prop, entity_id: str) -> EntityTag:
+        self._wait()
+        return self._entity_tag(prop, entity_id)
+
+    def create_edge_tag(self, prop, edge_id: str) -> EdgeTag:
+        self._wait()
+        return self._edge_tag(prop, edge_id)
@@ -0,0 +1,298 @@
+import io
+import os
+import asyncio
+import time
+import tempfile
+import tracemalloc
+import contextlib
+import ipaddress
+from dataclasses import dataclass, asdict
+from typing import Callable
+
+import dns.resolver
+import dns.asyncresolver
+import dns.reversename
+
+from common.runner import CommandRunner
+
+from .stubdns import Zone, StubDNSServer
+from .fakebroker import FakeAsyncBrokerClient, FakeBrokerClient
+
+ORIGIN = "bench.test"
+
+TXT_TOKENS = [
+    "google-site-verification=4fWm2DqH0aXn6x8yQ1sLkJ9cB3pT5rVz7uGeNiYoKhA",
+    "MS=ms81234567",
+    "docker-verification=1b2c3d4e-5f60-7182-93a4-b5c6d7e8f901",
+    "atlassian-domain-verification=Zx9Yw8Vu7Ts6Rq5Po4Nm3Lk2Ji1Hg0Fe",
+    "v=spf1 include:_spf.bench.test -all",
+    "some-unknown-token=abcdef0123456789",
+]
+
+
+@dataclass
+class Result:
+    scenario: str
+    elapsed: float
+    queries: int
+    queries_per_second: float
+    records: int
+    store_calls: int
+    store_calls_per_record: float
+    peak_memory_kb: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class Options:
+    names: int = 20
+    words: int = 2000
+    addresses: int = 4096
+    hit_ratio: float = 0.05
+    wildcard: bool = False
+    axfr: bool = False
+    latency: float = 0.0
+    loss: float = 0.0
+    rtt: float = 0.0
+    concurrency: int = 8
+    workers: int = 1
+    trace_memory: bool = True
+
+
+def _resolver(cls, server: StubDNSServer):
+    resolver = cls(configure=False)
+    resolver.nameservers = [server.host]
+    resolver.port = server.port
+    resolver.timeout = 1.0
+    resolver.lifetime = 5.0
+    return resolver
+
+
+def _measure(
+        name: str,
+        options: Options,
+        server: StubDNSServer,
+        store,
+        run: Callable[[], int]
+) -> Result:
+    # tracemalloc slows allocations down a lot, which skews throughput
+    if options.trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        records = run()
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if options.trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    queries = sum(server.count().values())
+    calls = store.total_calls if store is not None else 0
+    return Result(
+        scenario=name,
+        elapsed=elapsed,
+        queries=queries,
+        queries_per_second=queries / elapsed if elapsed > 0 else 0.0,
+        records=records,
+        store_calls=calls,
+        store_calls_per_record=calls / records if records > 0 else 0.0,
+        peak_memory_kb=peak / 1024)
+
+
+def dnsdump_zone(options: Options) -> Zone:
+    zone = Zone()
+    zone.add(ORIGIN, "SOA", f"ns1.{ORIGIN}. hostmaster.{ORIGIN}. 1 7200 3600 1209600 300")
+    zone.add(ORIGIN, "NS", f"ns1.{ORIGIN}.", f"ns2.{ORIGIN}.")
+    zone.add(f"ns1.{ORIGIN}", "A", "127.0.0.1")
+    zone.add(f"ns2.{ORIGIN}", "A", "127.0.0.1")
+    for i in range(options.names):
+        host = f"host{i}.{ORIGIN}"
+        zone.add(host, "A", f"10.0.{i // 256}.{i % 256}", f"10.1.{i // 256}.{i % 256}")
+        zone.add(host, "AAAA", f"2001:db8::{i:x}")
+        zone.add(host, "MX", f"10 mx1.{ORIGIN}.", f"20 mx2.{ORIGIN}.")
+        zone.add(host, "TXT", *[f'"{t}"' for t in TXT_TOKENS[:3]])
+        zone.add(host, "CAA", '0 issue "letsencrypt.org"')
+    return zone
+
+
+def bench_dnsdump(options: Options) -> Result:
+    from dnsdump.service import DumpDNSCommand
+
+    store = FakeAsyncBrokerClient(options.rtt)
+    server = StubDNSServer(
+        dnsdump_zone(options), options.latency, options.loss,
+        transfer=options.axfr)
+    with server:
+        resolver = _resolver(dns.asyncresolver.Resolver, server)
+        records = 0
+
+        def success_handler(domain, rdtype, data):
+            nonlocal records
+            records += 1
+
+        # A transfer of the apex returns the records of every host
+        domains = [ORIGIN] if options.axfr \
+            else [f"host{i}.{ORIGIN}" for i in range(options.names)]
+
+        def run() -> int:
+            commands = (
+                DumpDNSCommand(
+                    domain=domain,
+                    store=store,
+                    on_success=success_handler,
+                    on_failure=lambda rdtype: None,
+                    ratelimiter_batch=1_000_000,
+                    ratelimiter_delay=1000,
+                    retries=1,
+                    resolver=resolver,
+                    axfr=options.axfr)
+                for domain in domains)
+            runner = CommandRunner(options.concurrency)
+            asyncio.run(runner.run_all(commands, return_exceptions=False))
+            runner.shutdown()
+            return records
+
+        return _measure("dnsdump", options, server, store, run)
+
+
+def dnsfuzz_zone(options: Options) -> tuple[Zone, list[str]]:
+    zone = Zone()
+    zone.add(ORIGIN, "A", "10.0.0.1")
+    words = [f"w{i:06d}" for i in range(options.words)]
+    step = max(1, int(1 / options.hit_ratio)) if options.hit_ratio > 0 else 0
+    for i, word in enumerate(words):
+        if step and i % step == 0:
+            zone.add(f"{word}.{ORIGIN}", "A", f"10.2.{i // 256 % 256}.{i % 256}")
+    if options.wildcard:
+        zone.add(f"*.{ORIGIN}", "A", "10.9.9.9")
+    return zone, words
+
+
+def bench_dnsfuzz(options: Options) -> Result:
+    from dnsfuzz.service import FuzzDNSCommand
+
+    store = FakeBrokerClient(options.rtt)
+    zone, words = dnsfuzz_zone(options)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+         StubDNSServer(zone, options.latency, options.loss) as server:
+        wordlist = os.path.join(tmp, "wordlist.txt")
+        with open(wordlist, "w") as f:
+            f.write("\n".join(words) + "\n")
+
+        resolv = os.path.join(tmp, "resolv.conf")
+        with open(resolv, "w") as f:
+            f.write(f"nameserver {server.host}\n")
+
+        found = 0
+
+        def success_handler(domain: str):
+            nonlocal found
+            found += 1
+
+        cmd = FuzzDNSCommand(
+            domain=ORIGIN,
+            wordlist=wordlist,
+            on_success=success_handler,
+            on_failure=lambda d: None,
+            store=store,
+            ratelimiter_batch=1_000_000,
+            ratelimiter_delay=1000,
+            resolv=resolv,
+            workers=options.workers)
+        cmd.resolver.port = server.port
+        cmd.resolver.timeout = 1.0
+        cmd.resolver.lifetime = 5.0
+
+        def run() -> int:
+            asyncio.run(cmd.run())
+            return found
+
+        return _measure("dnsfuzz", options, server, store, run)
+
+
+def txtminer_zone(options: Options) -> Zone:
+    zone = Zone()
+    for i in range(options.names):
+        zone.add(f"host{i}.{ORIGIN}", "TXT", *[f'"{t}"' for t in TXT_TOKENS])
+    return zone
+
+
+def bench_txtminer(options: Options) -> Result:
+    from txtminer.service import ExtractProductsFromDomain
+
+    with StubDNSServer(txtminer_zone(options), options.latency, options.loss) as server:
+        previous = dns.resolver.default_resolver
+        dns.resolver.default_resolver = _resolver(dns.resolver.Resolver, server)
+        products = 0
+
+        def success_handler(product: str, txt: str):
+            nonlocal products
+            products += 1
+
+        def run() -> int:
+            for i in range(options.names):
+                ExtractProductsFromDomain(
+                    f"host{i}.{ORIGIN}",
+                    on_success=success_handler,
+                    on_failure=lambda t: None).run()
+            return products
+
+        try:
+            return _measure("txtminer", options, server, None, run)
+        finally:
+            dns.resolver.default_resolver = previous
+
+
+def ptrsweep_zone(options: Options) -> tuple[Zone, list[str]]:
+    zone = Zone()
+    prefix = max(0, 32 - (options.addresses - 1).bit_length())
+    network = ipaddress.ip_network(f"10.3.0.0/{prefix}")
+    step = max(1, int(1 / options.hit_ratio)) if options.hit_ratio > 0 else 0
+    for i, address in enumerate(network):
+        if step and i % step == 0:
+            zone.add(
+                dns.reversename.from_address(str(address)).to_text(),
+                "PTR", f"ip-{i}.{ORIGIN}.")
+    return zone, [str(network)]
+
+
+def bench_ptrsweep(options: Options) -> Result:
+    from ptrsweep.service import SweepPTRCommand
+
+    store = FakeAsyncBrokerClient(options.rtt)
+    zone, targets = ptrsweep_zone(options)
+
+    with StubDNSServer(zone, options.latency, options.loss) as server:
+        resolver = _resolver(dns.asyncresolver.Resolver, server)
+        found = 0
+
+        def success_handler(address: str, names: list[str]):
+            nonlocal found
+            found += 1
+
+        cmd = SweepPTRCommand(
+            targets=targets,
+            store=store,
+            on_success=success_handler,
+            on_failure=lambda a: None,
+            ratelimiter_batch=1_000_000,
+            ratelimiter_delay=1000,
+            resolver=resolver)
+
+        def run() -> int:
+            asyncio.run(cmd.run())
+            return found
+
+        return _measure("ptrsweep", options, server, store, run)
+
+
+SCENARIOS: dict[str, Callable[[Options], Result]] = {
+    "dnsdump": bench_dnsdump,
+    "dnsfuzz": bench_dnsfuzz,
+    "txtminer": bench_txtminer,
+    "ptrsweep": bench_ptrsweep,
+}
@@ -0,0 +1,66 @@
+import re
+import sys
+import statistics
+import subprocess
+from argparse import ArgumentParser
+
+TOOLS = ["apex", "txtminer", "dnsdump", "dnsfuzz", "certdump", "ptrsweep"]
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(argv: list[str]) -> tuple[float, dict[str, int]]:
+    """
+    Run ARGV under -X importtime.
+
+    :returns: the wall time in ms and the cumulative import time of each
+        top level module in us
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv],
+        capture_output=True, text=True)
+
+    imports: dict[str, int] = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if match is None:
+            continue
+        _, cumulative, indent, module = match.groups()
+        if len(indent) == 1:
+            imports[module] = int(cumulative)
+            total += int(cumulative)
+
+    return total / 1000, imports
+
+
+def main():
+    parser = ArgumentParser(
+        prog="benchmarks.startup",
+        description="Measure the import time of the tools, the part of "
+        "their startup spent before doing any work.")
+    parser.add_argument(
+        "tools", help="tools to measure", nargs="*", default=TOOLS)
+    parser.add_argument(
+        "-r", "--runs", help="runs per tool, the median is reported",
+        type=int, default=5)
+    parser.add_argument(
+        "-k", "--top", help="slowest imports reported per tool",
+        type=int, default=5)
+
+    config = parser.parse_args()
+
+    for tool in config.tools:
+        runs = [measure(["-m", tool, "--help"]) for _ in range(config.runs)]
+        total = statistics.median(t for t, _ in runs)
+        print(f"{tool:<10} {total:8.1f} ms")
+
+        slowest = sorted(
+            runs[-1][1].items(), key=lambda i: i[1], reverse=True)
+        for module, cumulative in slowest[:config.top]:
+            print(f"  {module:<40} {cumulative / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import random
+import socket
+import asyncio
+import multiprocessing
+from collections import Counter
+from typing import Optional
+
+import dns.flags
+import dns.name
+import dns.rcode
+import dns.rrset
+import dns.message
+import dns.rdatatype
+import dns.exception
+from dns.name import Name
+
+RCVBUF = 4 * 1024 * 1024
+
+
+class Zone:
+    """
+    In-memory authoritative data served by the StubDNSServer.
+    """
+
+    nodes: dict[Name, dict[int, dns.rrset.RRset]]
+
+    def __init__(self):
+        self.nodes = {}
+
+    def add(self, name: str, rdtype: str, *rdatas: str, ttl: int = 300):
+        _name = dns.name.from_text(name)
+        _rdtype = dns.rdatatype.from_text(rdtype)
+        node = self.nodes.setdefault(_name, {})
+        rrset = dns.rrset.from_text(_name, ttl, "IN", _rdtype, *rdatas)
+        if _rdtype in node:
+            node[_rdtype].union_update(rrset)
+        else:
+            node[_rdtype] = rrset
+
+        # Empty non-terminals exist too
+        parent = _name
+        while len(parent) > 1:
+            parent = parent.parent()
+            self.nodes.setdefault(parent, {})
+
+    def transfer(self, origin: Name) -> Optional[list[dns.rrset.RRset]]:
+        """
+        Return the RRsets of the zone at ORIGIN in AXFR order, between
+        two copies of its SOA, or None when ORIGIN has no SOA.
+        """
+        soa = self.nodes.get(origin, {}).get(dns.rdatatype.SOA)
+        if soa is None:
+            return None
+
+        rrsets = [soa]
+        for name in sorted(self.nodes):
+            if not name.is_subdomain(origin):
+                continue
+            for rdtype, rrset in self.nodes[name].items():
+                if name != origin or rdtype != dns.rdatatype.SOA:
+                    rrsets.append(rrset)
+        rrsets.append(soa)
+        return rrsets
+
+    def find(self, qname: Name) -> Optional[tuple[Name, dict[int, dns.rrset.RRset]]]:
+        """
+        Return the node matching QNAME, synthesized from the closest
+        wildcard when QNAME does not exist.
+        """
+        node = self.nodes.get(qname)
+        if node is not None:
+            return (qname, node)
+
+        parent = qname
+        while len(parent) > 1:
+            parent = parent.parent()
+            if parent in self.nodes:
+                wildcard = self.nodes.get(dns.name.Name((b"*",) + parent.labels))
+                if wildcard is None:
+                    return None
+                return (qname, wildcard)
+        return None
+
+
+class StubDNSServer:
+    """
+    Authoritative stub DNS server running in a child process, with
+    configurable latency and packet loss, used to benchmark the tools
+    without touching real resolvers.
+
+    The server lives in its own process so it neither competes with the
+    benchmarked tool for the GIL nor shows up in its memory usage.
+    """
+
+    zone: Zone
+    latency: float
+    loss: float
+    transfer: bool
+    host: str
+    port: int
+    queries: Counter
+
+    def __init__(
+            self,
+            zone: Zone,
+            latency: float = 0.0,
+            loss: float = 0.0,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            transfer: bool = False
+    ):
+        """
+        :param zone: the served records
+        :param latency: delay before each answer (in s)
+        :param loss: probability of dropping a UDP query
+        :param port: listening port, a free one is picked when 0
+        :param transfer: allow zone transfers (AXFR over TCP)
+        """
+        self.zone = zone
+        self.latency = latency
+        self.loss = loss
+        self.transfer = transfer
+        self.host = host
+        self.port = port
+        self.queries = Counter()
+
+    def answer(self, query: dns.message.Message) -> dns.message.Message:
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+
+        question = query.question[0]
+        self.queries[dns.rdatatype.to_text(question.rdtype)] += 1
+
+        qname = question.name
+        for _ in range(8):
+            found = self.zone.find(qname)
+            if found is None:
+                if qname == question.name:
+                    response.set_rcode(dns.rcode.NXDOMAIN)
+                return response
+
+            owner, node = found
+            rrset = node.get(question.rdtype)
+            if rrset is not None:
+                response.answer.append(self._owned(rrset, owner))
+                return response
+
+            cname = node.get(dns.rdatatype.CNAME)
+            if cname is None:
+                return response
+
+            # Chase the CNAME inside the zone
+            response.answer.append(self._owned(cname, owner))
+            qname = cname[0].target
+
+        return response
+
+    @staticmethod
+    def _owned(rrset: dns.rrset.RRset, owner: Name) -> dns.rrset.RRset:
+        if rrset.name == owner:
+            return rrset
+        synthesized = dns.rrset.RRset(owner, rrset.rdclass, rrset.rdtype)
+        synthesized.update(rrset)
+        return synthesized
+
+    def _to_wire(self, query: dns.message.Message, max_size: int) -> bytes:
+        response = self.answer(query)
+        try:
+            return response.to_wire(max_size=max_size)
+        except dns.exception.TooBig:
+            truncated = dns.message.make_response(query)
+            truncated.flags |= dns.flags.TC
+            return truncated.to_wire()
+
+    def _transfer(self, query: dns.message.Message, chunk: int = 100) -> list[bytes]:
+        question = query.question[0]
+        self.queries["AXFR"] += 1
+
+        rrsets = self.zone.transfer(question.name) if self.transfer else None
+        if rrsets is None:
+            response = dns.message.make_response(query)
+            response.set_rcode(dns.rcode.REFUSED)
+            return [response.to_wire()]
+
+        wires = []
+        for i in range(0, len(rrsets), chunk):
+            response = dns.message.make_response(query)
+            response.flags |= dns.flags.AA
+            response.answer = rrsets[i:i + chunk]
+            wires.append(response.to_wire(max_size=65535))
+        return wires
+
+    async def _serve_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+                query = dns.message.from_wire(await reader.readexactly(length))
+                if self.latency > 0:
+                    await asyncio.sleep(self.latency)
+                if query.question[0].rdtype == dns.rdatatype.AXFR:
+                    wires = self._transfer(query)
+                else:
+                    wires = [self._to_wire(query, 65535)]
+                for wire in wires:
+                    writer.write(len(wire).to_bytes(2, "big") + wire)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _start(self):
+        server = self
+
+        class Protocol(asyncio.DatagramProtocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def datagram_received(self, data, addr):
+                if server.loss > 0 and random.random() < server.loss:
+                    return
+                try:
+                    query = dns.message.from_wire(data)
+                except dns.exception.DNSException:
+                    return
+                max_size = query.payload if query.edns >= 0 else 512
+                wire = server._to_wire(query, max_size)
+                if server.latency > 0:
+                    loop.call_later(
+                        server.latency, self.transport.sendto, wire, addr)
+                else:
+                    self.transport.sendto(wire, addr)
+
+        loop = asyncio.get_running_loop()
+
+        # Bursts of thousands of queries must not overflow the socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+        sock.bind((self.host, self.port))
+        self.port = sock.getsockname()[1]
+
+        self.udp, _ = await loop.create_datagram_endpoint(Protocol, sock=sock)
+        self.tcp = await asyncio.start_server(
+            self._serve_tcp, self.host, self.port)
+
+    def _serve(self, conn):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self._start())
+        conn.send(self.port)
+
+        def control():
+            command = conn.recv()
+            conn.send(dict(self.queries))
+            if command == "stop":
+                self.udp.close()
+                self.tcp.close()
+                loop.stop()
+
+        loop.add_reader(conn.fileno(), control)
+        loop.run_forever()
+
+    def count(self) -> Counter:
+        """
+        Return the number of queries received so far, by type.
+        """
+        self.conn.send("count")
+        self.queries = Counter(self.conn.recv())
+        return self.queries
+
+    def start(self) -> "StubDNSServer":
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=self._serve, args=(child,), daemon=True)
+        self.process.start()
+        self.port = self.conn.recv()
+        return self
+
+    def stop(self):
+        self.conn.send("stop")
+        self.queries = Counter(self.conn.recv())
+        self.process.join()
+        self.conn.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
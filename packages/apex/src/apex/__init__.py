@@ -1,14 +1,18 @@
-from os import getenv
-from dns.name import Name, from_text, BadEscape, EmptyLabel
-import logging
+from common.logger import getLogger
 
+from .core import find_apex
 
-loglevel = getenv("LOG_LEVEL", "WARNING").upper()
 
-logging.basicConfig(
-    level=getattr(logging, loglevel, logging.WARNING))
+logger = getLogger("apex")
 
-logger = logging.getLogger("apex")
+
+class InvalidDomain(ValueError):
+
+    domain: str
+
+    def __init__(self, domain: str):
+        super().__init__(f"There is no apex domain for {domain}")
+        self.domain = domain
 
 
 def apex(domain: str) -> str:
@@ -22,13 +26,15 @@ def apex(domain: str) -> str:
     @raises
     InvalidDomain(domain: str)
     """
-    logger.debug(f"parse:{domain}")
+    from dns.name import from_text, BadEscape, EmptyLabel
+
+    logger.debug("parse:%s", domain)
     try:
         _domain = from_text(domain)
     except (BadEscape, EmptyLabel):
         raise InvalidDomain(domain)
 
     try:
-        return __apex_backend(_domain).to_text(True)
-    except InvalidDomain as e:
-        raise e
+        return find_apex(_domain).to_text(True)
+    except ValueError:
+        raise InvalidDomain(domain)
@@ -2,10 +2,13 @@ import common.cli_setup  # noqa: F401
 
 import sys
 from argparse import ArgumentParser
+from typing import Iterator, TextIO
 from termcolor import colored
 
-from common.output import print_error
-from .service import FindApexCommand
+from common.output import print_error, add_output_arguments, open_output
+from common.metrics import add_metrics_arguments, start_metrics
+from common.profile import add_profile_arguments, start_profile
+from .service import FindApexesCommand
 
 
 def print_result(r: str, nocolor: bool = False):
@@ -16,21 +19,137 @@ def print_result(r: str, nocolor: bool = False):
     print(message, file=sys.stdout)
 
 
+def print_group(apex: str, subdomains: list[str], nocolor: bool = False):
+    print_result(apex, nocolor)
+    for subdomain in subdomains:
+        print(f"  {subdomain}", file=sys.stdout)
+
+
+def read_domains(f: TextIO) -> Iterator[str]:
+    for line in f:
+        line = line.strip()
+        if line == "":
+            continue
+        yield line
+
+
+def run_batch(f: TextIO, config):
+    groups: dict[str, list[str]] = {}
+    writer = open_output(config)
+
+    def result_handler(domain: str, apex: str):
+        if config.group:
+            groups.setdefault(apex, []).append(domain.rstrip("."))
+        elif writer is not None:
+            writer.write({"domain": domain, "apex": apex})
+        else:
+            print_result(apex, config.nocolor)
+
+    def failure_handler(domain: str):
+        if writer is not None:
+            writer.write({"domain": domain, "apex": None})
+            return
+        print_error(f"There is no apex domain for {domain}", config.nocolor)
+
+    try:
+        cmd = FindApexesCommand(
+            read_domains(f),
+            on_result=result_handler,
+            on_failure=failure_handler,
+            unique=config.unique and not config.group,
+            psl=config.psl)
+    except Exception as e:
+        print_error(str(e), config.nocolor)
+        sys.exit(1)
+
+    cmd.run()
+
+    for apex, subdomains in groups.items():
+        if config.unique:
+            subdomains = list(dict.fromkeys(subdomains))
+        if writer is not None:
+            writer.write({"apex": apex, "domains": subdomains})
+        else:
+            print_group(apex, subdomains, config.nocolor)
+
+
 def main():
-    parser = ArgumentParser()
+    parser = ArgumentParser(
+        prog="apex",
+        description="Return the apex of the given domains.")
     parser.add_argument(
-        "domain", help="target domain")
+        "domain", help="target domain, read domains from stdin if omitted",
+        nargs="?", default=None)
+    parser.add_argument(
+        "-f", "--file", help="file of newline-delimited domains ('-' for stdin)",
+        default=None)
+    parser.add_argument(
+        "-g", "--group", help="group domains by apex",
+        action="store_true")
+    parser.add_argument(
+        "-u", "--unique", help="report each apex only once",
+        action="store_true")
+    parser.add_argument(
+        "--psl", help="path to a public suffix list file", default=None)
     parser.add_argument(
         "--nocolor", help="disable colored outputs", action="store_true")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+
     config = parser.parse_args()
 
-    def result_handler(domain: str):
-        print_result(domain, config.nocolor)
+    try:
+        start_metrics(config)
+        start_profile(config)
+    except (OSError, ValueError) as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    if config.domain is not None and config.file is not None:
+        print_error("domain and --file are mutually exclusive", config.nocolor)
+        sys.exit(1)
+
+    if config.domain is None:
+        if config.file is None or config.file == "-":
+            run_batch(sys.stdin, config)
+            return
+
+        try:
+            f = open(config.file)
+        except OSError as e:
+            print_error(e, config.nocolor)
+            sys.exit(1)
+
+        with f:
+            run_batch(f, config)
+        return
+
+    # A single domain only needs the rules of its TLD, and its text
+    # lookup does not pay for the import of dnspython
+    writer = open_output(config)
+
+    def result_handler(domain: str, apex: str):
+        if writer is not None:
+            writer.write({"domain": domain, "apex": apex})
+        else:
+            print_result(apex, config.nocolor)
+
+    def failure_handler(domain: str):
+        if writer is not None:
+            writer.write({"domain": domain, "apex": None})
+        else:
+            print_error(
+                f"There is no apex domain for {domain}", config.nocolor)
+        sys.exit(1)
 
     try:
-        cmd = FindApexCommand(
-            config.domain,
-            on_result=result_handler)
+        cmd = FindApexesCommand(
+            [config.domain],
+            on_result=result_handler,
+            on_failure=failure_handler,
+            psl=config.psl,
+            tld=config.domain.strip().rstrip(".").rsplit(".", 1)[-1])
     except Exception as e:
         print_error(str(e), config.nocolor)
         sys.exit(1)
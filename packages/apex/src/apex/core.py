@@ -1,34 +1,102 @@
-from dns.name import Name
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
 
 from common.logger import getLogger
 
+from .psl import SuffixTrie, load_suffix_trie
+
+# dnspython is only needed by the Name based API, find_apexes works on
+# text and must not pay for its import
+if TYPE_CHECKING:
+    from dns.name import Name
+
 logger = getLogger(__name__)
 
 
-def parse_labels(domain: Name) -> bool:
-    valid = len(domain.labels) >= 3
-    logger.debug(f"parse_labels:{domain}:{valid}")
+def _reversed_labels(domain: "Name") -> list[str]:
+    labels = domain.labels[:-1] if domain.is_absolute() else domain.labels
+    return [label.lower().decode("latin-1") for label in reversed(labels)]
+
+
+def apex_length(domain: "Name", trie: Optional[SuffixTrie] = None) -> int:
+    """
+    Return the number of labels (root excluded) of the apex of DOMAIN.
+
+    :param domain: a domain or a subdomain
+    :param trie: the compiled public suffix list, the embedded one by default
+    """
+    trie = load_suffix_trie() if trie is None else trie
+    return trie.suffix_length(_reversed_labels(domain)) + 1
+
+
+def parse_labels(domain: "Name", trie: Optional[SuffixTrie] = None) -> None:
+    labels = len(domain) - 1 if domain.is_absolute() else len(domain)
+    valid = labels >= apex_length(domain, trie)
+    logger.debug("parse_labels:%s:%s", domain, valid)
     if not valid:
         raise ValueError(f"There is no apex domain for {domain}")
 
 
-def is_apex(domain: Name) -> bool:
-    p = len(domain.labels) == 3
-    logger.debug(f"is_apex:{domain}:{p}")
+def is_apex(domain: "Name", trie: Optional[SuffixTrie] = None) -> bool:
+    labels = len(domain) - 1 if domain.is_absolute() else len(domain)
+    p = labels == apex_length(domain, trie)
+    logger.debug("is_apex:%s:%s", domain, p)
     return p
 
 
-def find_apex(domain: Name) -> Name:
-    logger.debug(f"get_apex:try domain:{domain}")
+def find_apex(domain: "Name", trie: Optional[SuffixTrie] = None) -> "Name":
+    logger.debug("get_apex:try domain:%s", domain)
 
     try:
-        parse_labels(domain)
+        parse_labels(domain, trie)
     except ValueError:
         raise
 
-    if is_apex(domain):
-        return domain
+    from dns.name import Name
+
+    length = apex_length(domain, trie)
+    if domain.is_absolute():
+        length += 1
+
+    return Name(domain.labels[-length:])
+
+
+def find_apexes(
+        domains: Iterable[str],
+        trie: Optional[SuffixTrie] = None
+) -> Iterator[tuple[str, Optional[str]]]:
+    """
+    Resolve the apex of many domains at once.
+
+    Domains are handled as plain text, skipping the dns.name.Name
+    round-trip, so millions of names can be processed in a single run.
+
+    :param domains: domains or subdomains, one per item
+    :param trie: the compiled public suffix list, the embedded one by default
+    :returns: (domain, apex) pairs, apex is None when there is no apex
+    """
+    trie = load_suffix_trie() if trie is None else trie
+
+    for domain in domains:
+        text = domain.strip().rstrip(".").lower()
+
+        if not text.isascii():
+            from dns.name import from_unicode
+            from dns.exception import DNSException
+
+            try:
+                text = from_unicode(text).to_text(True)
+            except DNSException:
+                yield (domain, None)
+                continue
+
+        labels = text.split(".")
+        if "" in labels:
+            yield (domain, None)
+            continue
+
+        length = trie.suffix_length(labels[::-1]) + 1
+        if len(labels) < length:
+            yield (domain, None)
+            continue
 
-    parent = domain.parent()
-    logger.debug(f"get_apex:try parent:{parent}")
-    return find_apex(parent)
+        yield (domain, ".".join(labels[-length:]))
@@ -0,0 +1,171 @@
+import os
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from common.logger import getLogger
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+DEFAULT_PSL = os.path.join(__location__, "public_suffix_list.dat")
+
+WILDCARD = "*"
+
+logger = getLogger(__name__)
+
+
+class SuffixNode:
+    __slots__ = ("children", "is_rule", "is_exception")
+
+    children: dict[str, "SuffixNode"]
+    is_rule: bool
+    is_exception: bool
+
+    def __init__(self):
+        self.children = {}
+        self.is_rule = False
+        self.is_exception = False
+
+
+class SuffixTrie:
+    """
+    Public Suffix List compiled into a trie of reversed labels.
+
+    Labels are stored lowercased and IDNA encoded so that they can be
+    matched directly against the wire labels of a dns.name.Name.
+    """
+
+    root: SuffixNode
+    size: int
+
+    def __init__(self):
+        self.root = SuffixNode()
+        self.size = 0
+
+    def add_rule(self, rule: str):
+        """
+        Add a single PSL rule (e.g. "co.uk", "*.ck" or "!www.ck").
+
+        :param rule: the rule as written in the public suffix list
+        :raises ValueError: when the rule cannot be IDNA encoded
+        """
+        is_exception = rule.startswith("!")
+        if is_exception:
+            rule = rule[1:]
+
+        node = self.root
+        for label in reversed(rule.lower().split(".")):
+            if label != WILDCARD and not label.isascii():
+                try:
+                    label = label.encode("idna").decode("ascii")
+                except UnicodeError:
+                    raise ValueError(f"invalid public suffix rule: {rule}")
+
+            child = node.children.get(label)
+            if child is None:
+                child = node.children[label] = SuffixNode()
+            node = child
+
+        node.is_rule = True
+        node.is_exception = is_exception
+        self.size += 1
+
+    def suffix_length(self, labels: list[str]) -> int:
+        """
+        Return the number of labels of the public suffix of a name.
+
+        The walk is O(len(labels)): exception rules win over wildcards,
+        the longest matching rule wins otherwise and the implicit "*"
+        rule makes the TLD a public suffix when nothing matches.
+
+        :param labels: the lowercased labels, TLD first, without the root
+        """
+        length = 1
+        node = self.root
+        for depth, label in enumerate(labels, start=1):
+            child = node.children.get(label)
+
+            if child is not None and child.is_exception:
+                return depth - 1
+
+            if WILDCARD in node.children:
+                length = depth
+
+            if child is None:
+                break
+
+            if child.is_rule:
+                length = depth
+            node = child
+
+        return length
+
+
+def parse_rules(lines: Iterable[str], private: bool = True) -> Iterable[str]:
+    """
+    Yield the rules of a public suffix list file.
+
+    :param lines: the lines of the public suffix list
+    :param private: keep the rules of the PRIVATE DOMAINS section
+    """
+    in_private = False
+    for line in lines:
+        line = line.strip()
+
+        if line.startswith("//"):
+            if "===BEGIN PRIVATE DOMAINS===" in line:
+                in_private = True
+            elif "===END PRIVATE DOMAINS===" in line:
+                in_private = False
+            continue
+
+        if line == "" or (in_private and not private):
+            continue
+
+        # Rules end at the first whitespace
+        yield line.split()[0]
+
+
+def _rule_tld(rule: str) -> str:
+    tld = rule.rsplit(".", 1)[-1].lstrip("!").lower()
+    if not tld.isascii():
+        try:
+            tld = tld.encode("idna").decode("ascii")
+        except UnicodeError:
+            pass
+    return tld
+
+
+@lru_cache(maxsize=None)
+def load_suffix_trie(
+        path: Optional[str] = None,
+        private: bool = True,
+        tld: Optional[str] = None
+) -> SuffixTrie:
+    """
+    Compile a public suffix list file into a SuffixTrie.
+
+    The result is cached, so the list is parsed once per process.
+
+    :param path: path of the list, the embedded copy is used by default
+    :param private: keep the rules of the PRIVATE DOMAINS section
+    :param tld: only compile the rules under this TLD, enough to look
+        up domains that all end with it
+    :raises OSError: when the list cannot be opened
+    """
+    path = DEFAULT_PSL if path is None else path
+    tld = None if tld is None else _rule_tld(tld)
+
+    trie = SuffixTrie()
+    with open(path, encoding="utf-8") as f:
+        for rule in parse_rules(f, private):
+            if tld is not None and _rule_tld(rule) != tld:
+                continue
+
+            try:
+                trie.add_rule(rule)
+            except ValueError as e:
+                logger.warning(f"load_suffix_trie:{e}")
+
+    logger.debug("load_suffix_trie:%s:%s rules", path, trie.size)
+    return trie
@@ -1,8 +1,10 @@
-from dns import name
-from typing import Callable
-from dns.exception import DNSException
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
 
-from .core import find_apex, parse_labels
+from .core import find_apex, find_apexes, parse_labels
+from .psl import SuffixTrie, load_suffix_trie
+
+if TYPE_CHECKING:
+    from dns.name import Name
 
 
 class FindApexCommand:
@@ -12,29 +14,40 @@ class FindApexCommand:
 
     IS_ASYNC = False
 
-    domain: name.Name
+    domain: "Name"
+    trie: SuffixTrie
     on_result: Callable[[str], None]
 
     def __init__(
             self,
             domain: str,
-            on_result: Callable[[str], None]
+            on_result: Callable[[str], None],
+            psl: Optional[str] = None
     ):
         """
         Instanciate the FindApex command
 
         :param domain: the target domain
         :param on_result: function called when the result is returned
+        :param psl: path to a public suffix list, the embedded one by default
         :raises InvalidDomain: when domain cannot have an apex domain
+        :raises OSError: when the public suffix list cannot be opened
         """
+        from dns.name import from_text
+        from dns.exception import DNSException
 
         try:
-            _domain = name.from_text(domain)
+            _domain = from_text(domain)
         except DNSException:
             raise
 
         try:
-            parse_labels(_domain)
+            self.trie = load_suffix_trie(psl)
+        except OSError:
+            raise
+
+        try:
+            parse_labels(_domain, self.trie)
         except ValueError:
             raise
 
@@ -42,5 +55,65 @@ class FindApexCommand:
         self.on_result = on_result
 
     def run(self):
-        apex = find_apex(self.domain)
+        apex = find_apex(self.domain, self.trie)
         self.on_result(apex.to_text(True))
+
+
+class FindApexesCommand:
+    """
+    Find the apex domain for every domain of a stream of DOMAINS.
+    """
+
+    IS_ASYNC = False
+
+    domains: Iterable[str]
+    trie: SuffixTrie
+    unique: bool
+    on_result: Callable[[str, str], None]
+    on_failure: Callable[[str], None]
+
+    def __init__(
+            self,
+            domains: Iterable[str],
+            on_result: Callable[[str, str], None],
+            on_failure: Callable[[str], None],
+            unique: bool = False,
+            psl: Optional[str] = None,
+            tld: Optional[str] = None
+    ):
+        """
+        Instanciate the FindApexes command
+
+        :param domains: the target domains, consumed lazily
+        :param on_result: function called with each domain and its apex
+        :param on_failure: function called when a domain has no apex
+        :param unique: report each apex only once
+        :param psl: path to a public suffix list, the embedded one by default
+        :param tld: TLD of every domain, only its rules are compiled
+        :raises OSError: when the public suffix list cannot be opened
+        """
+
+        try:
+            self.trie = load_suffix_trie(psl, tld=tld)
+        except OSError:
+            raise
+
+        self.domains = domains
+        self.unique = unique
+        self.on_result = on_result
+        self.on_failure = on_failure
+
+    def run(self):
+        seen: set[str] = set()
+
+        for domain, apex in find_apexes(self.domains, self.trie):
+            if apex is None:
+                self.on_failure(domain)
+                continue
+
+            if self.unique:
+                if apex in seen:
+                    continue
+                seen.add(apex)
+
+            self.on_result(domain, apex)
@@ -5,16 +5,22 @@ import common.cli_setup  # noqa: F401
 # - TLSCertificate -[issuer_contact]-> ContactRecord
 
 import sys
+import json
 import asyncio
 from argparse import ArgumentParser
-from oam_client import AsyncBrokerClient
 from termcolor import colored
-from common.output import print_error
+from common.output import print_error, add_output_arguments, open_output
+from common.store.client import add_store_arguments, open_store
+from common.metrics import add_metrics_arguments, start_metrics, InstrumentedStore
+from common.profile import add_profile_arguments, start_profile
 from .service import DumpCertificateCommand
 
 
-def print_success(obj_type: str, obj: str):
-    print(f"{colored(obj_type, 'blue', attrs=['bold'])}: {colored(obj, 'blue')}")
+def print_success(obj_type: str, obj: str, nocolor: bool = False):
+    if nocolor:
+        print(f"{obj_type}: {obj}")
+    else:
+        print(f"{colored(obj_type, 'blue', attrs=['bold'])}: {colored(obj, 'blue')}")
 
 
 async def async_main():
@@ -25,19 +31,45 @@ async def async_main():
     parser.add_argument("-d", "--domain",
                         help="the target domain",
                         required=True)
+    parser.add_argument("--nocolor",
+                        help="disable colored output",
+                        action="store_true")
+
+    add_output_arguments(parser)
+    add_store_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
 
     config = parser.parse_args()
 
     try:
-        store = AsyncBrokerClient("https://localhost", verify=False)
+        start_metrics(config)
+        start_profile(config)
+    except (OSError, ValueError) as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    try:
+        store = InstrumentedStore(open_store(config.store))
     except Exception as e:
-        print_error(e, config.nocolor, config.silent)
+        print_error(e, config.nocolor)
         sys.exit(1)
 
+    writer = open_output(config)
+
+    def on_success(obj_type: str, obj: str):
+        if writer is None:
+            print_success(obj_type, obj, config.nocolor)
+        else:
+            writer.write(
+                {"domain": config.domain, "type": obj_type,
+                 "data": json.loads(obj)})
+
     cmd = DumpCertificateCommand(
         config.domain,
         store,
-        on_success=lambda t, o: print_success(t, o)
+        on_success=on_success,
+        store_window=config.store_window
     )
 
     await cmd.run()
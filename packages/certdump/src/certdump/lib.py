@@ -217,7 +217,8 @@ def _get_entity(o: Entity | T, asset_type: AssetType) -> Entity:
     asset_cls = get_asset_by_type(asset_type)
     if isinstance(o, asset_cls):
         return Entity(asset=o, type=o.asset_type)
-    elif isinstance(o, Entity) and o.asset.asset_type == asset_type:
+    # Entities of the broker and of the local store are different classes
+    elif hasattr(o, "asset") and o.asset.asset_type == asset_type:
         return o
     else:
         raise ValueError(f"param must be a '{asset_type}' or a derived entity")
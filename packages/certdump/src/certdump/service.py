@@ -11,6 +11,8 @@ from cryptography.x509.oid import AuthorityInformationAccessOID
 from cryptography.x509.oid import SubjectInformationAccessOID
 from typing import Optional, Callable
 import certdump.lib as lib
+from common.metrics import STAGE_ITEMS
+from common.store.client import StoreWindow, DEFAULT_WINDOW
 
 from .core import get_cert_chain
 
@@ -21,6 +23,7 @@ class DumpCertificateCommand:
 
     domain: str
     store: BrokerClient
+    window: StoreWindow
     chain: list[x509.Certificate]
     on_success: Callable[[str, str], None]
 
@@ -28,11 +31,17 @@ class DumpCertificateCommand:
             self,
             domain: str,
             store: BrokerClient,
-            on_success: Callable[[str, str], None]
+            on_success: Callable[[str, str], None],
+            store_window: int = DEFAULT_WINDOW
     ):
         self.domain = domain
         self.store = store
 
+        try:
+            self.window = StoreWindow(store_window)
+        except ValueError:
+            raise
+
         _chain = get_cert_chain(self.domain)
 
         self.chain = []
@@ -48,21 +57,22 @@ class DumpCertificateCommand:
         previous_cert = None
 
         for cert in self.chain:
+            STAGE_ITEMS.inc(tool="certdump", stage="certificate")
 
             cert_entity = await self.store.create_entity(
                 lib.make_certificate_entity(cert))
 
             if previous_cert is not None:
-                await self.store.create_edge(
+                await self.window.submit(self.store.create_edge(
                     SimpleRelation("issuing_certificate"),
                     previous_cert.id,
-                    cert_entity.id)
+                    cert_entity.id))
 
             # handle CN subject
             CN_list = lib.handle_CN_subject(cert)
             for cn in CN_list:
-                await lib.store_cert_common_name(
-                    self.store, cert_entity, cn)
+                await self.window.submit(lib.store_cert_common_name(
+                    self.store, cert_entity, cn))
                 self.on_success("CN", cn.to_json())
 
             # handle O subject
@@ -70,11 +80,11 @@ class DumpCertificateCommand:
             for o in O_list:
                 self.on_success("O", o.to_json())
                 if cert_entity.asset.is_ca:
-                    await lib.store_cert_authority_org(
-                        self.store, cert_entity, o)
+                    await self.window.submit(lib.store_cert_authority_org(
+                        self.store, cert_entity, o))
                 else:
-                    await lib.store_domain_verified_for_org(
-                        self.store, base, o)
+                    await self.window.submit(lib.store_domain_verified_for_org(
+                        self.store, base, o))
             # In case there is multiple "O", they are all verified_for the CN
             # and SAN domains, but only the first one is use for other
             # operations to avoid polluting the graph.
@@ -89,46 +99,50 @@ class DumpCertificateCommand:
             for ou in OU_list:
                 self.on_success("OU", ou.to_json())
                 if primary_org:
-                    await lib.store_org_org_unit_org(self.store, primary_org, ou)
+                    await self.window.submit(lib.store_org_org_unit_org(
+                        self.store, primary_org, ou))
                 else:
                     if cert_entity.asset.is_ca:
-                        await lib.store_cert_authority_org(
-                            self.store, cert_entity, ou)
+                        await self.window.submit(lib.store_cert_authority_org(
+                            self.store, cert_entity, ou))
                     else:
-                        await lib.store_domain_verified_for_org(
-                            self.store, base, ou)
+                        await self.window.submit(lib.store_domain_verified_for_org(
+                            self.store, base, ou))
 
             # handle SAN names
             san_names = lib.make_san_entry(
                 cert, x509.DNSName, FQDN, 'from_text')
             for name in san_names:
                 self.on_success("SAN", name.to_json())
-                await lib.store_cert_san_dns_name(
-                    self.store, cert_entity, name)
+                await self.window.submit(lib.store_cert_san_dns_name(
+                    self.store, cert_entity, name))
                 for org in O_list:
-                    await lib.store_domain_verified_for_org(
-                        self.store, name, org)
+                    await self.window.submit(lib.store_domain_verified_for_org(
+                        self.store, name, org))
 
             # handle SAN addresses
             san_addresses = lib.make_san_entry(
                 cert, x509.IPAddress, IPAddress, 'from_text')
             for addr in san_addresses:
                 self.on_success("SAN", addr.to_json())
-                await lib.store_cert_san_address(self.store, cert_entity, addr)
+                await self.window.submit(lib.store_cert_san_address(
+                    self.store, cert_entity, addr))
 
             # handle SAN emails
             san_emails = lib.make_san_entry(
                 cert, x509.RFC822Name, Identifier, 'from_email')
             for email in san_emails:
                 self.on_success("SAN", email.to_json())
-                await lib.store_cert_san_email(self.store, cert_entity, email)
+                await self.window.submit(lib.store_cert_san_email(
+                    self.store, cert_entity, email))
 
             # handle SAN URLs
             san_urls = lib.make_san_entry(
                 cert, x509.UniformResourceIdentifier, URL, 'from_text')
             for url in san_urls:
                 self.on_success("SAN", url.to_json())
-                await lib.store_cert_san_url(self.store, cert_entity, url)
+                await self.window.submit(lib.store_cert_san_url(
+                    self.store, cert_entity, url))
 
             # handle OCSP URL
             ocsp_url = lib.make_info_access_entry(
@@ -136,8 +150,8 @@ class DumpCertificateCommand:
                 AuthorityInformationAccessOID.OCSP, URL, 'from_text')
             if ocsp_url is not None:
                 self.on_success("OCSP", ocsp_url.to_json())
-                await lib.store_cert_ocsp_server_url(
-                    self.store, cert_entity, ocsp_url)
+                await self.window.submit(lib.store_cert_ocsp_server_url(
+                    self.store, cert_entity, ocsp_url))
 
             # handle issuing cert URL
             iss_cert_url = lib.make_info_access_entry(
@@ -145,8 +159,8 @@ class DumpCertificateCommand:
                 AuthorityInformationAccessOID.CA_ISSUERS, URL, 'from_text')
             if iss_cert_url is not None:
                 self.on_success("ISS CERT", iss_cert_url.to_json())
-                await lib.store_cert_issuing_certificate_url(
-                    self.store, cert_entity, iss_cert_url)
+                await self.window.submit(lib.store_cert_issuing_certificate_url(
+                    self.store, cert_entity, iss_cert_url))
 
             # handle CA repo URL
             ca_repo_url = lib.make_info_access_entry(
@@ -154,7 +168,9 @@ class DumpCertificateCommand:
                 SubjectInformationAccessOID.CA_REPOSITORY, URL, 'from_text')
             if ca_repo_url is not None:
                 self.on_success("CA REPO", ca_repo_url.to_json())
-                await lib.store_cert_issuing_certificate_url(
-                    self.store, cert_entity, ca_repo_url)
+                await self.window.submit(lib.store_cert_issuing_certificate_url(
+                    self.store, cert_entity, ca_repo_url))
 
             previous_cert = cert_entity
+
+        await self.window.join()
@@ -1,6 +1,8 @@
 import sys
 import signal
 
+from .logger import setup_logging
+
 
 def sigint_handler(sig: int, _):
     print("exited by user", file=sys.stderr)
@@ -8,3 +10,5 @@ def sigint_handler(sig: int, _):
 
 
 signal.signal(signal.SIGINT, sigint_handler)
+
+setup_logging()
@@ -39,7 +39,8 @@ class Context():
             self,
             source: str,
             config: Optional[Namespace] = None,
-            enforce_taxonomy: bool = True
+            enforce_taxonomy: bool = True,
+            db: Optional[Repository] = None
     ):
         self.source = source
         self.config = SimpleNamespace() if config is None else config
@@ -48,7 +49,7 @@ class Context():
             get_creds(),
             emit_events = True,
             enforce_taxonomy = enforce_taxonomy
-        )
+        ) if db is None else db
 
     def __enter__(self):
         self.db.__enter__()
@@ -0,0 +1,161 @@
+import time
+import random
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+from dns.name import Name
+from dns.rdatatype import RdataType
+from dns.asyncresolver import Resolver
+from dns.resolver import Answer, NXDOMAIN, NoNameservers
+from dns.exception import DNSException, Timeout
+
+from ..logger import getLogger
+from ..metrics import DNS_QUERY_SECONDS, DNS_QUERIES, DNS_RETRIES
+
+logger = getLogger(__name__)
+
+# SERVFAIL and REFUSED answers surface as NoNameservers once dnspython
+# has given up on every nameserver
+TRANSIENT = (Timeout, NoNameservers, OSError)
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How many times, and how long, a DNS query is retried.
+
+    Transient failures (timeouts, SERVFAIL, network errors) and NXDOMAIN
+    have their own budget: an NXDOMAIN is an authoritative answer and
+    is only asked again when a resolver is known to be flaky.
+    """
+
+    attempts:           int = 3
+    nxdomain_attempts:  int = 1
+    base_delay:         float = 0.2
+    max_delay:          float = 5.0
+    deadline:           float = 10.0
+
+    def __post_init__(self):
+        if self.attempts < 1:
+            raise ValueError("retry attempts must be greather than 0")
+
+        if self.nxdomain_attempts < 1:
+            raise ValueError("NXDOMAIN attempts must be greather than 0")
+
+        if self.base_delay < 0 or self.max_delay < 0:
+            raise ValueError("retry delays must be greather or equal to 0")
+
+        if self.deadline <= 0:
+            raise ValueError("query deadline must be greather than 0")
+
+    def backoff(self, retry: int) -> float:
+        """
+        Return the delay before the RETRY-th retry, exponential with
+        full jitter so concurrent queries do not retry in lockstep.
+        """
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+class ResilientResolver:
+    """
+    Resolve DNS queries with retries, on top of a dns.asyncresolver.
+
+    Every query has a deadline covering all its attempts and the
+    backoff between them. Concurrent queries for the same name and
+    type are coalesced: the first one goes on the wire and the others
+    wait for its answer.
+    """
+
+    resolver: Resolver
+    policy: RetryPolicy
+    tool: str
+    inflight: dict[tuple[Name, RdataType], asyncio.Future]
+
+    def __init__(
+            self,
+            resolver: Resolver,
+            policy: Optional[RetryPolicy] = None,
+            tool: str = "dns"
+    ):
+        """
+        Instanciate the ResilientResolver.
+
+        :param resolver: the resolver queries are sent through, its
+            lifetime bounds each attempt
+        :param policy: the retry policy of every query, RetryPolicy()
+            by default
+        :param tool: the tool label of the DNS metrics
+        """
+        self.resolver = resolver
+        self.policy = RetryPolicy() if policy is None else policy
+        self.tool = tool
+        self.inflight = {}
+
+    async def resolve(self, qname: Name, rdtype: RdataType | str) -> Answer:
+        """
+        Resolve QNAME/RDTYPE, or wait for the same query in flight.
+
+        :raises NXDOMAIN: when the NXDOMAIN budget is spent
+        :raises Timeout: when the transient budget or the deadline is
+            spent on timeouts
+        :raises NoNameservers: when it is spent on SERVFAIL answers
+        :raises DNSException: on any other final answer (e.g. NoAnswer)
+        """
+        key = (qname, RdataType.make(rdtype))
+
+        future = self.inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._resolve(*key))
+            self.inflight[key] = future
+            future.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            logger.debug("resolve:coalesced:%s:%s", qname, key[1].name)
+
+        # A cancelled caller must not cancel the query of the others
+        return await asyncio.shield(future)
+
+    async def _resolve(self, qname: Name, rdtype: RdataType) -> Answer:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.policy.deadline
+        budgets = {
+            "transient": self.policy.attempts,
+            "nxdomain": self.policy.nxdomain_attempts,
+        }
+        retry = 0
+
+        while True:
+            remaining = deadline - loop.time()
+            lifetime = remaining if self.resolver.lifetime is None \
+                else min(self.resolver.lifetime, remaining)
+
+            start = time.perf_counter()
+            try:
+                answer = await self.resolver.resolve(
+                    qname, rdtype, lifetime=lifetime)
+                DNS_QUERIES.inc(tool=self.tool, outcome="answer")
+                return answer
+            except NXDOMAIN as e:
+                DNS_QUERIES.inc(tool=self.tool, outcome=type(e).__name__)
+                error, budget = e, "nxdomain"
+            except TRANSIENT as e:
+                DNS_QUERIES.inc(tool=self.tool, outcome=type(e).__name__)
+                error, budget = e, "transient"
+            except DNSException as e:
+                DNS_QUERIES.inc(tool=self.tool, outcome=type(e).__name__)
+                raise
+            finally:
+                DNS_QUERY_SECONDS.observe(
+                    time.perf_counter() - start, tool=self.tool)
+
+            budgets[budget] -= 1
+            delay = self.policy.backoff(retry)
+            if budgets[budget] == 0 or loop.time() + delay >= deadline:
+                raise error
+
+            retry += 1
+            DNS_RETRIES.inc(tool=self.tool)
+            logger.debug(
+                "resolve %s %s failed (retry %s): %s, retrying in %.2fs",
+                rdtype.name, qname, retry, error, delay)
+            await asyncio.sleep(delay)
@@ -5,20 +5,21 @@ from dns.exception import DNSException
 import dns.rdatatype
 
 from ..logger import getLogger
+from .resolve import ResilientResolver
 
 logger = getLogger(__name__)
 
 
 async def ensure_domain(
         domain: Name,
-        resolver: Resolver
+        resolver: Resolver | ResilientResolver
 ):
     rdtype = dns.rdatatype.from_text("A")
     try:
         await resolver.resolve(domain, rdtype)
-        logger.debug(f"check domain:{domain}:{True}")
+        logger.debug("check domain:%s:%s", domain, True)
     except NoAnswer as e:
-        logger.debug(f"check domain:{domain}:{True}:{type(e)}")
+        logger.debug("check domain:%s:%s:%s", domain, True, type(e))
     except DNSException as e:
-        logger.debug(f"check domain:{domain}:{False}:{type(e)}")
+        logger.debug("check domain:%s:%s:%s", domain, False, type(e))
         raise
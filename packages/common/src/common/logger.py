@@ -8,8 +8,14 @@ else:
 
 __loglevel = getattr(logging, LOGLEVEL, logging.WARNING)
 
-logging.basicConfig(
-    level=__loglevel)
+
+def setup_logging():
+    """
+    Configure the root logger of a CLI. Libraries leave it to the
+    application, so nothing is configured at import time.
+    """
+    logging.basicConfig(
+        level=__loglevel)
 
 
 def getLogger(name: str) -> logging.Logger:
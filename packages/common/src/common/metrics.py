@@ -0,0 +1,341 @@
+import json
+import time
+import atexit
+import threading
+from argparse import ArgumentParser, Namespace
+from bisect import bisect_left
+from collections.abc import Awaitable
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Optional
+
+from .logger import getLogger
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = getLogger(__name__)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(
+        key: LabelKey,
+        extra: Optional[tuple[str, str]] = None
+) -> str:
+    pairs = list(key) + ([extra] if extra is not None else [])
+    if len(pairs) == 0:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by labels.
+    """
+
+    name: str
+    help: str
+    values: dict[LabelKey, float]
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in self.values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "type": "counter",
+                "values": [
+                    {"labels": dict(key), "value": value}
+                    for key, value in self.values.items()]}
+
+
+class Histogram:
+    """
+    Distribution of observed values (e.g. latencies in seconds),
+    optionally split by labels.
+    """
+
+    name: str
+    help: str
+    buckets: tuple[float, ...]
+    values: dict[LabelKey, tuple[list[int], float, int]]
+
+    def __init__(
+            self,
+            name: str,
+            help: str,
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total, count = self.values.get(
+                key, ([0] * len(self.buckets), 0.0, 0))
+            if i < len(counts):
+                counts[i] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def total(self) -> tuple[float, int]:
+        """
+        Return the sum and the count of the values observed under every
+        label.
+        """
+        with self.lock:
+            return (
+                sum(total for _, total, _ in self.values.values()),
+                sum(count for _, _, count in self.values.values()))
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    labels = _format_labels(key, ("le", str(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(key, ("le", "+Inf"))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "type": "histogram",
+                "buckets": list(self.buckets),
+                "values": [
+                    {"labels": dict(key), "counts": list(counts),
+                     "sum": total, "count": count}
+                    for key, (counts, total, count) in self.values.items()]}
+
+
+class Registry:
+    """
+    Set of metrics shared by every graphrecon tool of a process.
+    """
+
+    metrics: dict[str, Counter | Histogram]
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Counter(name, help)
+            return self.metrics[name]
+
+    def histogram(
+            self,
+            name: str,
+            help: str,
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(name, help, buckets)
+            return self.metrics[name]
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        return {
+            name: metric.to_dict()
+            for name, metric in list(self.metrics.items())}
+
+
+REGISTRY = Registry()
+
+DNS_QUERY_SECONDS = REGISTRY.histogram(
+    "graphrecon_dns_query_seconds",
+    "Latency of DNS queries")
+DNS_QUERIES = REGISTRY.counter(
+    "graphrecon_dns_queries_total",
+    "DNS queries by outcome")
+DNS_RETRIES = REGISTRY.counter(
+    "graphrecon_dns_retries_total",
+    "DNS queries retried after a failure")
+RATELIMITER_WAIT_SECONDS = REGISTRY.histogram(
+    "graphrecon_ratelimiter_wait_seconds",
+    "Time spent waiting for the rate limiter")
+BROKER_CALL_SECONDS = REGISTRY.histogram(
+    "graphrecon_broker_call_seconds",
+    "Latency of asset store calls")
+STAGE_ITEMS = REGISTRY.counter(
+    "graphrecon_stage_items_total",
+    "Items processed by each stage of each tool")
+
+
+class InstrumentedStore:
+    """
+    Proxy timing every call made to an asset store client, sync or async.
+    """
+
+    def __init__(self, store: Any):
+        self._store = store
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._store, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            result = attr(*args, **kwargs)
+
+            if not isinstance(result, Awaitable):
+                BROKER_CALL_SECONDS.observe(
+                    time.perf_counter() - start, method=name)
+                return result
+
+            async def wait():
+                try:
+                    return await result
+                finally:
+                    BROKER_CALL_SECONDS.observe(
+                        time.perf_counter() - start, method=name)
+            return wait()
+
+        return call
+
+
+def serve_prometheus(
+        port: int,
+        host: str = "127.0.0.1"
+) -> "ThreadingHTTPServer":
+    """
+    Serve the metrics in the Prometheus text format from a background
+    thread.
+
+    :raises OSError: when the port cannot be bound
+    """
+    # http.server is slow to import, most runs never serve metrics
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics:" + format, *args)
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError:
+        raise
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.debug("serve_prometheus:%s:%s", host, port)
+    return server
+
+
+def dump_json(path: str):
+    with open(path, "w") as f:
+        json.dump(REGISTRY.to_dict(), f)
+
+
+def dump_json_periodically(path: str, interval: float) -> threading.Event:
+    """
+    Write the metrics as JSON to PATH every INTERVAL seconds from a
+    background thread, until the returned event is set.
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            dump_json(path)
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return stop
+
+
+def add_metrics_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        "--metrics-port", help="Serve Prometheus metrics on this port",
+        type=int, default=None)
+    parser.add_argument(
+        "--metrics-file", help="Periodically dump metrics as JSON to this file",
+        default=None)
+    parser.add_argument(
+        "--metrics-interval", help="Delay between two metrics dumps (s)",
+        type=float, default=10)
+
+
+def start_metrics(config: Namespace):
+    """
+    Start the exporters requested by the arguments of
+    add_metrics_arguments. The JSON dump is written one last time when
+    the process exits.
+    """
+    if config.metrics_port is not None:
+        try:
+            serve_prometheus(config.metrics_port)
+        except OSError:
+            raise
+
+    if config.metrics_file is not None:
+        stop = dump_json_periodically(
+            config.metrics_file,
+            config.metrics_interval)
+        atexit.register(stop.set)
+        atexit.register(dump_json, config.metrics_file)
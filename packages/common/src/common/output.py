@@ -1,6 +1,14 @@
+import os
 import sys
+import json
+import atexit
+from argparse import ArgumentParser
+from typing import Any, Optional, TextIO
 from termcolor import colored
 
+FORMATS = ("text", "ndjson")
+DEFAULT_FORMAT = "text"
+
 
 def print_error(
         e: str | Exception,
@@ -20,3 +28,76 @@ def print_error(
     else:
         message = f"{colored('ERROR', 'red', attrs=['bold'])}: {_message}"
     print(message, file=sys.stderr)
+
+
+def add_output_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        "--format", help="output format, ndjson writes one JSON object "
+        "per line for other tools to consume",
+        choices=FORMATS, default=DEFAULT_FORMAT)
+
+
+class NDJSONWriter:
+    """
+    Buffered writer of one JSON object per line.
+
+    Records are serialized compactly, without any highlighting, and
+    written by blocks of SIZE lines instead of one write per record.
+    """
+
+    out: TextIO
+    size: int
+    lines: list[str]
+    closed: bool
+
+    def __init__(self, out: TextIO = sys.stdout, size: int = 256):
+        """
+        Instanciate the NDJSONWriter.
+
+        :param out: the stream records are written to
+        :param size: number of lines kept before they are written
+        :raises ValueError: when size is an impossible value
+        """
+        if size < 1:
+            raise ValueError("output buffer size must be greather than 0")
+
+        self.out = out
+        self.size = size
+        self.lines = []
+        self.closed = False
+
+    def write(self, record: dict[str, Any]):
+        if self.closed:
+            return
+
+        self.lines.append(
+            json.dumps(record, separators=(",", ":"), ensure_ascii=False))
+        if len(self.lines) >= self.size:
+            self.flush()
+
+    def flush(self):
+        if len(self.lines) == 0:
+            return
+
+        lines, self.lines = self.lines, []
+        try:
+            self.out.write("\n".join(lines) + "\n")
+            self.out.flush()
+        except BrokenPipeError:
+            # The reading end is gone (e.g. `| head`), drop the rest
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, self.out.fileno())
+            self.closed = True
+
+
+def open_output(config) -> Optional[NDJSONWriter]:
+    """
+    Return the NDJSONWriter of a CLI run with --format ndjson, flushed
+    when the process exits, or None for the text format.
+    """
+    if config.format != "ndjson":
+        return None
+
+    writer = NDJSONWriter()
+    atexit.register(writer.flush)
+    return writer
@@ -0,0 +1,197 @@
+import sys
+import time
+import atexit
+from argparse import ArgumentParser, Namespace
+from typing import TYPE_CHECKING, Optional, TextIO
+
+from .logger import getLogger
+from .metrics import (
+    DNS_QUERY_SECONDS, BROKER_CALL_SECONDS, RATELIMITER_WAIT_SECONDS)
+
+if TYPE_CHECKING:
+    import cProfile
+    import tracemalloc
+
+logger = getLogger(__name__)
+
+# Where the waits go, from the latencies recorded by the metrics
+WAITS = (
+    ("dns", DNS_QUERY_SECONDS),
+    ("store", BROKER_CALL_SECONDS),
+    ("ratelimit", RATELIMITER_WAIT_SECONDS),
+)
+
+# Where the CPU time goes, a function counts in the first category with
+# a pattern found in its "path:function"
+CATEGORIES = (
+    ("waiting", (
+        "select.epoll", "select.select", "select.kqueue", "selectors.py",
+        "_thread.lock")),
+    ("dns", ("/dns/", "/dnsdump/core.py", "/common/dns/")),
+    ("parsing", (
+        "/cryptography/", "/json/", "_json.", "/asset_model/",
+        "/certdump/lib.py", "_ssl.")),
+    ("store", (
+        "/oam_client/", "/common/store/", "sqlite3", "/store.py")),
+    ("output", (
+        "/common/output.py", "/termcolor/", "/pygments/", "builtins.print",
+        "TextIOWrapper")),
+)
+
+
+def add_profile_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        "--profile", help="Profile the run and write a CPU and allocation "
+        "report to this file, the raw statistics to REPORT.prof and the "
+        "allocations to REPORT.heap", metavar="REPORT", default=None)
+    parser.add_argument(
+        "--profile-top", help="Functions and allocation sites listed in "
+        "the profile report",
+        type=int, default=20)
+    parser.add_argument(
+        "--profile-nomemory", help="Do not trace allocations while "
+        "profiling, tracing slows the run down",
+        action="store_true")
+
+
+def categorize(stats: dict) -> dict[str, float]:
+    """
+    Split the own time of the functions of pstats STATS between
+    CATEGORIES, the rest is "other".
+    """
+    split = {name: 0.0 for name, _ in CATEGORIES}
+    split["other"] = 0.0
+
+    for (path, _, function), (_, _, own, _, _) in stats.items():
+        key = f"{path}:{function}"
+        for name, patterns in CATEGORIES:
+            if any(pattern in key for pattern in patterns):
+                split[name] += own
+                break
+        else:
+            split["other"] += own
+    return split
+
+
+def wait_totals() -> dict[str, tuple[float, int]]:
+    """
+    Return the summed latency and the count of each of WAITS so far.
+    """
+    return {name: histogram.total() for name, histogram in WAITS}
+
+
+def write_report(
+        out: TextIO,
+        profiler: "cProfile.Profile",
+        elapsed: float,
+        top: int,
+        snapshot: Optional["tracemalloc.Snapshot"] = None,
+        peak: int = 0,
+        waits: Optional[dict[str, tuple[float, int]]] = None
+):
+    import pstats
+
+    stats = pstats.Stats(profiler, stream=out)
+    split = categorize(stats.stats)
+    total = sum(split.values()) or 1.0
+
+    out.write(f"command: {' '.join(sys.argv)}\n")
+    out.write(f"elapsed: {elapsed:.2f}s, profiled: {total:.2f}s\n\n")
+
+    # The own time of the async tools mostly lands in the event loop
+    # polling while replies are awaited, the latencies tell what for.
+    # Concurrent calls overlap, their sum may exceed the elapsed time.
+    if waits is not None:
+        out.write("Wait split (latency summed over concurrent calls)\n")
+        for name, (spent, count) in waits.items():
+            mean = 1000 * spent / count if count > 0 else 0.0
+            out.write(
+                f"  {name:<10} {spent:9.3f}s {count:8} calls "
+                f"{mean:9.2f}ms mean\n")
+        out.write("\n")
+
+    out.write("CPU split (own time)\n")
+    for name, spent in sorted(split.items(), key=lambda x: -x[1]):
+        out.write(f"  {name:<10} {spent:9.3f}s {100 * spent / total:6.1f}%\n")
+    out.write("\n")
+
+    out.write("Top functions (own time)\n")
+    stats.strip_dirs().sort_stats("tottime").print_stats(top)
+
+    out.write("Top functions (cumulative time)\n")
+    stats.sort_stats("cumulative").print_stats(top)
+
+    if snapshot is None:
+        return
+
+    out.write("Top allocation sites (live at exit)\n")
+    for stat in snapshot.statistics("lineno")[:top]:
+        frame = stat.traceback[0]
+        out.write(
+            f"  {stat.size / 1024:10.1f} KiB {stat.count:8} blocks  "
+            f"{frame.filename}:{frame.lineno}\n")
+    out.write(f"\npeak traced memory: {peak / 1024:.1f} KiB\n")
+
+
+def start_profile(config: Namespace):
+    """
+    Start the profiling requested by the arguments of
+    add_profile_arguments. The report is written when the process exits.
+
+    Only the main thread is profiled, e.g. not the store writes run in
+    worker threads or processes.
+
+    :raises OSError: when the report cannot be written
+    :raises ValueError: when profile_top is an impossible value
+    """
+    if config.profile is None:
+        return
+
+    if config.profile_top < 1:
+        raise ValueError("profile top must be greather than 0")
+
+    # Fail before the run rather than after it
+    try:
+        open(config.profile, "w").close()
+    except OSError:
+        raise
+
+    # Imported here, the tools start faster without them
+    import cProfile
+    import tracemalloc
+
+    if not config.profile_nomemory:
+        tracemalloc.start()
+
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    waited = wait_totals()
+
+    def stop():
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        waits = {
+            name: (spent - waited[name][0], count - waited[name][1])
+            for name, (spent, count) in wait_totals().items()}
+
+        snapshot, peak = None, 0
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(
+                    False, "<frozen importlib._bootstrap_external>"),
+            ))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            snapshot.dump(f"{config.profile}.heap")
+
+        profiler.dump_stats(f"{config.profile}.prof")
+        with open(config.profile, "w") as out:
+            write_report(
+                out, profiler, elapsed, config.profile_top, snapshot, peak,
+                waits)
+        logger.debug("stop:report written to %s", config.profile)
+
+    atexit.register(stop)
+    profiler.enable()
@@ -1,5 +1,8 @@
+import time
 from pyrate_limiter import Rate, Limiter
 
+from .metrics import RATELIMITER_WAIT_SECONDS
+
 
 class RateLimiter(Limiter):
     def __init__(self, batch: int, delay: int):
@@ -12,3 +15,10 @@ class RateLimiter(Limiter):
                 "rate limiter's delay must be greather or equal to 0")
 
         super().__init__(Rate(batch, delay))
+
+    async def try_acquire_async(self, *args, **kwargs) -> bool:
+        start = time.perf_counter()
+        try:
+            return await super().try_acquire_async(*args, **kwargs)
+        finally:
+            RATELIMITER_WAIT_SECONDS.observe(time.perf_counter() - start)
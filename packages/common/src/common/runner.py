@@ -0,0 +1,157 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Iterable, Optional, Protocol
+
+from .logger import getLogger
+from .ratelimiter import RateLimiter
+
+logger = getLogger(__name__)
+
+
+class Command(Protocol):
+    """
+    Any graphrecon command: IS_ASYNC tells whether run() is a coroutine.
+    """
+
+    IS_ASYNC: bool
+
+    def run(self) -> Any:
+        ...
+
+
+class CommandRunner:
+    """
+    Run graphrecon commands in parallel.
+
+    Async commands run on the event loop, sync commands are offloaded to
+    an executor (a thread pool by default). Every command shares the same
+    concurrency limit and rate budget, whatever its kind.
+
+    A ProcessPoolExecutor can be given for CPU-bound sync commands, in
+    which case the commands and their callbacks must be picklable.
+    """
+
+    concurrency: int
+    ratelimiter: Optional[RateLimiter]
+    executor: Executor
+
+    def __init__(
+            self,
+            concurrency: int = 8,
+            ratelimiter_batch: Optional[int] = None,
+            ratelimiter_delay: Optional[int] = None,
+            executor: Optional[Executor] = None
+    ):
+        """
+        Instanciate the CommandRunner.
+
+        :param concurrency: number of commands running at the same time
+        :param ratelimiter_batch: size of each commands batch
+        :param ratelimiter_delay: delay between each commands batch
+        :param executor: executor of the sync commands, a thread pool of
+            CONCURRENCY threads by default
+        :raises ValueError: when concurrency or rate limiter receive
+            impossible values
+        """
+        if concurrency < 1:
+            raise ValueError(
+                "runner's concurrency must be greather than 0")
+
+        self.concurrency = concurrency
+
+        self.ratelimiter = None
+        if ratelimiter_batch is not None and ratelimiter_delay is not None:
+            try:
+                self.ratelimiter = RateLimiter(
+                    ratelimiter_batch,
+                    ratelimiter_delay)
+            except ValueError:
+                raise
+
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.executor = executor
+
+    async def run(self, cmd: Command) -> Any:
+        """
+        Run a single command, regardless of its kind.
+        """
+        if self.ratelimiter is not None:
+            await self.ratelimiter.try_acquire_async()
+
+        logger.debug(
+            "run:%s:async=%s", type(cmd).__name__, cmd.IS_ASYNC)
+
+        if cmd.IS_ASYNC:
+            return await cmd.run()
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, cmd.run)
+
+    async def run_all(
+            self,
+            commands: Iterable[Command],
+            return_exceptions: bool = True
+    ) -> list[Any]:
+        """
+        Run every command of COMMANDS, at most CONCURRENCY at a time.
+
+        Commands are pulled lazily, so COMMANDS can be a generator of any
+        length.
+
+        :param commands: the commands to run
+        :param return_exceptions: return the exception raised by a command
+            in place of its result instead of raising it
+        :returns: the results, in the order of COMMANDS
+        """
+        results: dict[int, Any] = {}
+        it = enumerate(commands)
+
+        async def work():
+            for i, cmd in it:
+                try:
+                    results[i] = await self.run(cmd)
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    logger.debug("run_all:%s:%s", type(cmd).__name__, e)
+                    results[i] = e
+
+        workers = [
+            asyncio.create_task(work())
+            for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        except Exception:
+            for worker in workers:
+                worker.cancel()
+            raise
+
+        return [results[i] for i in range(len(results))]
+
+    async def consume(self, queue: asyncio.Queue):
+        """
+        Run the commands put in QUEUE until cancelled.
+
+        Await queue.join() to wait for the queued commands to be done.
+        """
+        async def work():
+            while True:
+                cmd = await queue.get()
+                try:
+                    await self.run(cmd)
+                except Exception as e:
+                    logger.error(f"consume:{type(cmd).__name__}:{e}")
+                finally:
+                    queue.task_done()
+
+        await asyncio.gather(*[work() for _ in range(self.concurrency)])
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.shutdown()
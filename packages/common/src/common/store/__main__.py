@@ -0,0 +1,162 @@
+import common.cli_setup  # noqa: F401
+
+import sys
+import asyncio
+import sqlite3
+from argparse import ArgumentParser
+from termcolor import colored
+
+from common.output import print_error
+from common.metrics import add_metrics_arguments, start_metrics
+from common.profile import add_profile_arguments, start_profile
+
+from .local import LocalStore, TABLES
+from .client import DEFAULT_STORE, open_store
+from .sync import sync_store
+from .bulk import Importer, export_store, open_dump
+
+
+def print_counts(counts: dict[str, int], nocolor: bool = False):
+    for table, count in counts.items():
+        if nocolor:
+            print(f"{table}: {count}")
+        else:
+            print(f"{colored(table, 'blue', attrs=['bold'])}: {count}")
+
+
+async def sync(config):
+    client = open_store(config.broker)
+    counts = await sync_store(
+        config.local, client, config.concurrency, config.batch_size)
+    print_counts(counts, config.nocolor)
+
+
+def export(config):
+    if config.output == "-":
+        count = export_store(config.local, sys.stdout)
+    else:
+        with open_dump(config.output, "w") as out:
+            count = export_store(config.local, out)
+    print(f"exported {count} records", file=sys.stderr)
+
+
+async def import_(config):
+    client = open_store(config.store)
+    importer = Importer(client, config.concurrency, config.batch_size)
+    for path in config.files:
+        if path == "-":
+            await importer.load(sys.stdin)
+        else:
+            with open_dump(path) as f:
+                await importer.load(f)
+
+    stats = importer.stats
+    print_counts(
+        {f"{kind} {state}": getattr(stats, state)[kind]
+         for state in ("created", "duplicates", "skipped")
+         for kind in stats.created},
+        config.nocolor)
+
+
+def status(config):
+    print_counts(
+        {table: config.local.count(table, synced=False) for table in TABLES},
+        config.nocolor)
+
+
+def main():
+    options = ArgumentParser(add_help=False)
+    options.add_argument(
+        "--nocolor", help="Disable colors on stdout",
+        action="store_true")
+
+    parser = ArgumentParser(
+        description="Manage a local asset store.",
+        prog="assetstore")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = commands.add_parser(
+        "sync", help="push the local store into the broker",
+        parents=[options])
+    sync_parser.add_argument("path", help="path of the local store")
+    sync_parser.add_argument(
+        "--broker", help="the broker URL",
+        default=DEFAULT_STORE)
+    sync_parser.add_argument(
+        "-c", "--concurrency", help="number of broker calls in flight",
+        type=int, default=16)
+    sync_parser.add_argument(
+        "-b", "--batch-size", help="number of rows synced at once",
+        type=int, default=500)
+    add_metrics_arguments(sync_parser)
+    add_profile_arguments(sync_parser)
+
+    export_parser = commands.add_parser(
+        "export", help="dump the local store as NDJSON",
+        parents=[options])
+    export_parser.add_argument("path", help="path of the local store")
+    export_parser.add_argument(
+        "-o", "--output", help="output file, gzip compressed when it ends "
+        "with .gz, '-' for stdout",
+        default="-")
+
+    import_parser = commands.add_parser(
+        "import", help="load NDJSON dumps into an asset store",
+        parents=[options])
+    import_parser.add_argument(
+        "files", help="dumps written by export, '-' for stdin",
+        nargs="+")
+    import_parser.add_argument(
+        "--store", help="the broker URL, or sqlite:PATH",
+        default=DEFAULT_STORE)
+    import_parser.add_argument(
+        "-c", "--concurrency", help="number of store calls in flight",
+        type=int, default=16)
+    import_parser.add_argument(
+        "-b", "--batch-size", help="number of records sent at once",
+        type=int, default=500)
+    add_metrics_arguments(import_parser)
+    add_profile_arguments(import_parser)
+
+    status_parser = commands.add_parser(
+        "status", help="count the rows not synced yet",
+        parents=[options])
+    status_parser.add_argument("path", help="path of the local store")
+
+    config = parser.parse_args()
+
+    if config.command == "import":
+        try:
+            start_metrics(config)
+            start_profile(config)
+            asyncio.run(import_(config))
+        except Exception as e:
+            print_error(e, config.nocolor)
+            sys.exit(1)
+        return
+
+    try:
+        config.local = LocalStore(config.path)
+    except (ValueError, sqlite3.Error) as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    try:
+        if config.command == "sync":
+            start_metrics(config)
+            start_profile(config)
+            asyncio.run(sync(config))
+        elif config.command == "export":
+            export(config)
+        else:
+            status(config)
+    except Exception as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+    finally:
+        config.local.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import gzip
+import json
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable, Iterator, TextIO
+
+from common.logger import getLogger
+from common.metrics import STAGE_ITEMS
+
+from .local import (
+    LocalStore, dumps, load_asset, load_relation, load_property)
+
+logger = getLogger(__name__)
+
+# Export order, every record only points to records written before it
+KINDS = ("entity", "edge", "entity_tag", "edge_tag")
+
+# Fields of each kind pointing to another record, and its kind
+REFERENCES = {
+    "entity": {},
+    "edge": {"from": "entity", "to": "entity"},
+    "entity_tag": {"entity": "entity"},
+    "edge_tag": {"edge": "edge"},
+}
+
+
+def open_dump(path: str, mode: str = "r") -> TextIO:
+    """
+    Open an export file, gzip compressed when PATH ends with .gz.
+
+    :raises OSError: when the file cannot be opened
+    """
+    try:
+        if path.endswith(".gz"):
+            return gzip.open(path, mode + "t", encoding="utf-8")
+        return open(path, mode, encoding="utf-8")
+    except OSError:
+        raise
+
+
+def export_records(local: LocalStore) -> Iterator[str]:
+    """
+    Stream the content of LOCAL as NDJSON lines, one entity, edge or
+    tag per line:
+
+        {"kind":"entity","id":1,"type":"FQDN","data":{...}}
+        {"kind":"edge","id":1,"type":"SimpleRelation","data":{...},"from":1,"to":2}
+        {"kind":"entity_tag","id":1,"type":"SourceProperty","data":{...},"entity":1}
+        {"kind":"edge_tag","id":1,"type":"SourceProperty","data":{...},"edge":1}
+
+    Ids are only meaningful inside one export. The stored JSON content
+    is written as is, without being decoded.
+    """
+    tables = ("entities", "edges", "entity_tags", "edge_tags")
+
+    for kind, table in zip(KINDS, tables):
+        for id, type, content, *refs in local.rows(table):
+            line = (
+                f'{{"kind":"{kind}","id":{id},'
+                f'"type":{json.dumps(type)},"data":{content}')
+            for name, ref in zip(REFERENCES[kind], refs):
+                line += f',"{name}":{ref}'
+            yield line + "}\n"
+
+
+def export_store(local: LocalStore, out: TextIO) -> int:
+    """
+    Write the content of LOCAL to OUT, see export_records.
+
+    :returns: the number of records written
+    """
+    count = 0
+    for line in export_records(local):
+        out.write(line)
+        count += 1
+    logger.debug("export_store:%s", count)
+    return count
+
+
+@dataclass
+class ImportStats:
+    created:    dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(KINDS, 0))
+    duplicates: dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(KINDS, 0))
+    skipped:    dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(KINDS, 0))
+
+
+class Importer:
+    """
+    Apply NDJSON records written by export_records to an asset store.
+
+    Records are sent in batches of concurrent calls. A record equal to
+    one already sent, by asset key for entities or by content for
+    edges and tags, is not sent again. Its id is mapped to the id the
+    store returned the first time.
+    """
+
+    client: Any
+    concurrency: int
+    batch: int
+    stats: ImportStats
+
+    def __init__(self, client: Any, concurrency: int = 16, batch: int = 500):
+        """
+        Instanciate the Importer.
+
+        :param client: an oam_client.AsyncBrokerClient or AsyncLocalStore
+        :param concurrency: number of store calls in flight
+        :param batch: number of records read before they are sent
+        :raises ValueError: when parameters are impossible values
+        """
+        if concurrency < 1:
+            raise ValueError("import concurrency must be greather than 0")
+
+        if batch < 1:
+            raise ValueError("import batch size must be greather than 0")
+
+        self.client = client
+        self.concurrency = concurrency
+        self.batch = batch
+        self.stats = ImportStats()
+        self.seen: dict[tuple, str] = {}
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def _call(
+            self,
+            kind: str,
+            type: str,
+            content: str,
+            refs: tuple[str, ...]
+    ) -> tuple[tuple, Callable[[], Awaitable[Any]]]:
+        """
+        Return the deduplication key of a record and the store call
+        creating it.
+        """
+        match kind:
+            case "entity":
+                asset = load_asset(type, content)
+                return ((kind, type, asset.key),
+                        lambda: self.client.create_entity(asset))
+            case "edge":
+                relation = load_relation(type, content)
+                return ((kind, type, dumps(relation), *refs),
+                        lambda: self.client.create_edge(relation, *refs))
+            case "entity_tag":
+                prop = load_property(type, content)
+                return ((kind, type, dumps(prop), *refs),
+                        lambda: self.client.create_entity_tag(prop, *refs))
+            case "edge_tag":
+                prop = load_property(type, content)
+                return ((kind, type, dumps(prop), *refs),
+                        lambda: self.client.create_edge_tag(prop, *refs))
+            case _:
+                raise ValueError(f"unknown record kind {kind}")
+
+    async def _flush(self, pending: dict[tuple, tuple[list, Callable]]):
+        async def send(key, ids, call):
+            async with self.semaphore:
+                remote = await call()
+            return (key, ids, remote.id)
+
+        results = await asyncio.gather(*[
+            send(key, ids, call) for key, (ids, call) in pending.items()])
+
+        for key, ids, remote_id in results:
+            self.seen[key] = remote_id
+            for id in ids:
+                self.ids[id] = remote_id
+            self.stats.created[key[0]] += 1
+            STAGE_ITEMS.inc(tool="store", stage=f"import_{key[0]}")
+
+        pending.clear()
+
+    async def load(self, lines: Iterable[str]) -> ImportStats:
+        """
+        Import every record of LINES, the content of one export.
+        Records already sent by a previous call are deduplicated too.
+
+        :raises ValueError: when a line is not a valid record
+        """
+        self.ids: dict[tuple[str, int], str] = {}
+        pending: dict[tuple, tuple[list, Callable]] = {}
+        kind = None
+
+        for number, line in enumerate(lines, 1):
+            if line.strip() == "":
+                continue
+
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {number}: {e}")
+
+            if not isinstance(record, dict) \
+               or record.get("kind") not in KINDS \
+               or not {"id", "type", "data", *REFERENCES[record["kind"]]} \
+               <= record.keys():
+                raise ValueError(f"line {number}: not a valid record")
+
+            # Records of the next kind point to the ones still pending
+            if record["kind"] != kind or len(pending) >= self.batch:
+                await self._flush(pending)
+                kind = record["kind"]
+
+            try:
+                refs = tuple(
+                    self.ids[(referenced, record[name])]
+                    for name, referenced in REFERENCES[kind].items())
+            except KeyError as e:
+                logger.warning(
+                    f"import:line {number}: unknown reference {e}, skipped")
+                self.stats.skipped[kind] += 1
+                continue
+
+            try:
+                key, call = self._call(
+                    kind, record["type"],
+                    json.dumps(record["data"]), refs)
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"line {number}: {e}")
+
+            id = (kind, record["id"])
+            if key in self.seen:
+                self.ids[id] = self.seen[key]
+                self.stats.duplicates[kind] += 1
+            elif key in pending:
+                pending[key][0].append(id)
+                self.stats.duplicates[kind] += 1
+            else:
+                pending[key] = ([id], call)
+
+        await self._flush(pending)
+        logger.debug("import:%s", self.stats)
+        return self.stats
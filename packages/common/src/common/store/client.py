@@ -0,0 +1,132 @@
+import atexit
+import asyncio
+import sqlite3
+import threading
+from argparse import ArgumentParser
+from typing import Any, Awaitable
+from oam_client import AsyncBrokerClient, BrokerClient
+
+from common.logger import getLogger
+
+from .local import LocalStore, AsyncLocalStore
+
+logger = getLogger(__name__)
+
+DEFAULT_STORE = "https://localhost"
+DEFAULT_WINDOW = 32
+LOCAL_SCHEME = "sqlite:"
+
+_sessions: dict[tuple[str, bool], Any] = {}
+_locals: dict[str, LocalStore] = {}
+_lock = threading.Lock()
+
+
+def add_store_arguments(parser: ArgumentParser):
+    parser.add_argument(
+        "--store", help="Asset store: the broker URL, or sqlite:PATH to "
+        "write into a local database synced later with `assetstore sync`",
+        default=DEFAULT_STORE)
+    parser.add_argument(
+        "--store-window", help="Max asset store writes in flight",
+        type=int, default=DEFAULT_WINDOW)
+
+
+def _open_local(path: str) -> LocalStore:
+    if path not in _locals:
+        try:
+            _locals[path] = LocalStore(path)
+        except (ValueError, sqlite3.Error):
+            raise
+        atexit.register(_locals[path].close)
+    return _locals[path]
+
+
+def open_store(url: str = DEFAULT_STORE, asynchronous: bool = True) -> Any:
+    """
+    Open the asset store behind URL.
+
+    A URL starting with "sqlite:" opens a LocalStore, committed when the
+    process exits. Any other URL is the address of the broker.
+
+    Each store is opened once per process. Every command and handler
+    gets the same client, so they share its pool of keep-alive HTTP/2
+    connections instead of each opening their own.
+
+    :param url: the broker URL or sqlite:PATH
+    :param asynchronous: return the async flavour of the client
+    :raises sqlite3.Error: when the local database cannot be opened
+    """
+    with _lock:
+        key = (url, asynchronous)
+        if key in _sessions:
+            return _sessions[key]
+
+        if url.startswith(LOCAL_SCHEME):
+            local = _open_local(url[len(LOCAL_SCHEME):])
+            logger.debug("open_store:local:%s", local.path)
+            store = AsyncLocalStore(local) if asynchronous else local
+        else:
+            logger.debug("open_store:broker:%s", url)
+            store = AsyncBrokerClient(url, verify=False) if asynchronous \
+                else BrokerClient(url, verify=False)
+
+        _sessions[key] = store
+        return store
+
+
+class StoreWindow:
+    """
+    Bounded set of asset store writes running in the background.
+
+    Handlers submit their writes instead of awaiting them, so the store
+    latency of many records overlaps instead of adding up. Submitting
+    waits while SIZE writes are in flight.
+    """
+
+    size: int
+    tasks: set[asyncio.Task]
+    errors: list[BaseException]
+
+    def __init__(self, size: int = DEFAULT_WINDOW):
+        """
+        Instanciate the StoreWindow.
+
+        :param size: max number of writes in flight
+        :raises ValueError: when size is an impossible value
+        """
+        if size < 1:
+            raise ValueError("store window must be greather than 0")
+
+        self.size = size
+        self.slots = asyncio.Semaphore(size)
+        self.tasks = set()
+        self.errors = []
+
+    def _done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        self.slots.release()
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("store_window:error:%s", task.exception())
+            self.errors.append(task.exception())
+
+    async def submit(self, write: Awaitable[Any]):
+        """
+        Run WRITE in the background once a slot is free.
+        """
+        await self.slots.acquire()
+        task = asyncio.ensure_future(write)
+        self.tasks.add(task)
+        task.add_done_callback(self._done)
+
+    async def join(self):
+        """
+        Wait for every submitted write.
+
+        :raises Exception: the first error raised by a write
+        """
+        while len(self.tasks) > 0:
+            await asyncio.wait(set(self.tasks))
+
+        if len(self.errors) > 0:
+            error, self.errors = self.errors[0], []
+            raise error
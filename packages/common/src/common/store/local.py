@@ -0,0 +1,438 @@
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Iterator, Optional
+from asset_model import (
+    Asset, AssetType, Property, PropertyType, Relation, RelationType,
+    OAMObject, get_asset_by_type, get_property_by_type, get_relation_by_type)
+from asset_store.types import Entity, Edge, EntityTag, EdgeTag
+
+from common.logger import getLogger
+
+logger = getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    id         INTEGER PRIMARY KEY,
+    etype      TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    content    TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    remote_id  TEXT,
+    synced     INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (etype, key)
+);
+CREATE TABLE IF NOT EXISTS edges (
+    id         INTEGER PRIMARY KEY,
+    rtype      TEXT NOT NULL,
+    content    TEXT NOT NULL,
+    from_id    INTEGER NOT NULL REFERENCES entities (id),
+    to_id      INTEGER NOT NULL REFERENCES entities (id),
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    remote_id  TEXT,
+    synced     INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (from_id, to_id, rtype, content)
+);
+CREATE TABLE IF NOT EXISTS entity_tags (
+    id         INTEGER PRIMARY KEY,
+    entity_id  INTEGER NOT NULL REFERENCES entities (id),
+    ptype      TEXT NOT NULL,
+    content    TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    remote_id  TEXT,
+    synced     INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (entity_id, ptype, content)
+);
+CREATE TABLE IF NOT EXISTS edge_tags (
+    id         INTEGER PRIMARY KEY,
+    edge_id    INTEGER NOT NULL REFERENCES edges (id),
+    ptype      TEXT NOT NULL,
+    content    TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    remote_id  TEXT,
+    synced     INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (edge_id, ptype, content)
+);
+CREATE INDEX IF NOT EXISTS entities_synced ON entities (synced);
+CREATE INDEX IF NOT EXISTS edges_synced ON edges (synced);
+CREATE INDEX IF NOT EXISTS entity_tags_synced ON entity_tags (synced);
+CREATE INDEX IF NOT EXISTS edge_tags_synced ON edge_tags (synced);
+"""
+
+TABLES = ("entities", "edges", "entity_tags", "edge_tags")
+
+
+def _datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def dumps(o: OAMObject) -> str:
+    return json.dumps(o.to_dict(), separators=(",", ":"))
+
+
+def load_asset(etype: str, content: str) -> Asset:
+    return OAMObject.from_dict(
+        get_asset_by_type(AssetType(etype)), json.loads(content))
+
+
+def load_relation(rtype: str, content: str) -> Relation:
+    return OAMObject.from_dict(
+        get_relation_by_type(RelationType(rtype)), json.loads(content))
+
+
+def load_property(ptype: str, content: str) -> Property:
+    return OAMObject.from_dict(
+        get_property_by_type(PropertyType(ptype)), json.loads(content))
+
+
+class LocalStore:
+    """
+    Asset store embedded in a SQLite database.
+
+    It exposes the same calls as oam_client.BrokerClient, so the tools
+    can write at disk speed while offline. Entities are deduplicated on
+    their asset key, edges and tags on their content, like the broker
+    does. Every row remembers whether it reached the broker, so the
+    database can be synced later, see common.store.sync.
+    """
+
+    path: str
+    commit_every: int
+    db: sqlite3.Connection
+
+    def __init__(
+            self,
+            path: str,
+            commit_every: int = 1000,
+            cache_size: int = 4096
+    ):
+        """
+        Instanciate the LocalStore.
+
+        :param path: path of the SQLite database, created when missing
+        :param commit_every: number of writes grouped in a transaction
+        :param cache_size: number of entities and edges kept in memory
+        :raises ValueError: when parameters are impossible values
+        :raises sqlite3.Error: when the database cannot be opened
+        """
+        if commit_every < 1:
+            raise ValueError(
+                "local store's commit batch must be greather than 0")
+
+        self.path = path
+        self.commit_every = commit_every
+        self.pending = 0
+        self.lock = threading.RLock()
+
+        try:
+            self.db = sqlite3.connect(
+                path, timeout=30, isolation_level=None,
+                check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+        except sqlite3.Error:
+            raise
+
+        self.find_entity_by_id = lru_cache(cache_size)(self._find_entity_by_id)
+        self.find_edge_by_id = lru_cache(cache_size)(self._find_edge_by_id)
+
+    def _write(
+            self,
+            query: str,
+            params: tuple,
+            select: str,
+            key: tuple
+    ) -> tuple:
+        """
+        Run an upsert returning the id of the row, or look the existing
+        row up when the upsert changed nothing.
+
+        :returns: the row returned by the upsert or the lookup
+        """
+        with self.lock:
+            if self.pending == 0:
+                self.db.execute("BEGIN")
+
+            row = self.db.execute(query, params).fetchone()
+            if row is None:
+                row = self.db.execute(select, key).fetchone()
+
+            self.pending += 1
+            if self.pending >= self.commit_every:
+                self.commit()
+
+            return row
+
+    def commit(self):
+        with self.lock:
+            if self.pending > 0:
+                self.db.execute("COMMIT")
+                self.pending = 0
+
+    def create_entity(self, asset: Asset) -> Entity:
+        now = time.time()
+        id, updated = self._write(
+            """
+            INSERT INTO entities (etype, key, content, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (etype, key) DO UPDATE SET
+                content = excluded.content,
+                updated_at = excluded.updated_at,
+                synced = 0
+            WHERE entities.content != excluded.content
+            RETURNING id, created_at != updated_at
+            """,
+            (asset.asset_type.value, asset.key, dumps(asset), now, now),
+            "SELECT id, 0 FROM entities WHERE etype = ? AND key = ?",
+            (asset.asset_type.value, asset.key))
+
+        # The cached entity, and the edges holding it, have the old
+        # content. Updates are rare, new entities are not cached yet.
+        if updated:
+            self.find_entity_by_id.cache_clear()
+            self.find_edge_by_id.cache_clear()
+        logger.debug("create_entity:%s:%s", asset.key, id)
+        return Entity(asset, str(id), _datetime(now), _datetime(now))
+
+    def create_edge(
+            self,
+            relation: Relation,
+            from_id: str,
+            to_id: str
+    ) -> Edge:
+        now = time.time()
+        key = (int(from_id), int(to_id),
+               relation.relation_type.value, dumps(relation))
+        id, = self._write(
+            """
+            INSERT INTO edges
+                (from_id, to_id, rtype, content, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (from_id, to_id, rtype, content) DO NOTHING
+            RETURNING id
+            """,
+            (*key, now, now),
+            """
+            SELECT id FROM edges
+            WHERE from_id = ? AND to_id = ? AND rtype = ? AND content = ?
+            """,
+            key)
+        logger.debug("create_edge:%s:%s:%s:%s",
+                     relation.label, from_id, to_id, id)
+        return Edge(
+            relation,
+            self.find_entity_by_id(from_id),
+            self.find_entity_by_id(to_id),
+            str(id), _datetime(now), _datetime(now))
+
+    def create_entity_tag(self, prop: Property, entity_id: str) -> EntityTag:
+        now = time.time()
+        key = (int(entity_id), prop.property_type.value, dumps(prop))
+        id, = self._write(
+            """
+            INSERT INTO entity_tags
+                (entity_id, ptype, content, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (entity_id, ptype, content) DO NOTHING
+            RETURNING id
+            """,
+            (*key, now, now),
+            """
+            SELECT id FROM entity_tags
+            WHERE entity_id = ? AND ptype = ? AND content = ?
+            """,
+            key)
+        logger.debug("create_entity_tag:%s:%s:%s", prop.name, entity_id, id)
+        return EntityTag(
+            self.find_entity_by_id(entity_id), prop,
+            str(id), _datetime(now), _datetime(now))
+
+    def create_edge_tag(self, prop: Property, edge_id: str) -> EdgeTag:
+        now = time.time()
+        key = (int(edge_id), prop.property_type.value, dumps(prop))
+        id, = self._write(
+            """
+            INSERT INTO edge_tags
+                (edge_id, ptype, content, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (edge_id, ptype, content) DO NOTHING
+            RETURNING id
+            """,
+            (*key, now, now),
+            """
+            SELECT id FROM edge_tags
+            WHERE edge_id = ? AND ptype = ? AND content = ?
+            """,
+            key)
+        logger.debug("create_edge_tag:%s:%s:%s", prop.name, edge_id, id)
+        return EdgeTag(
+            self.find_edge_by_id(edge_id), prop,
+            str(id), _datetime(now), _datetime(now))
+
+    def _find_entity_by_id(self, id: str) -> Entity:
+        with self.lock:
+            row = self.db.execute(
+                """
+                SELECT etype, content, created_at, updated_at
+                FROM entities WHERE id = ?
+                """,
+                (int(id),)).fetchone()
+
+        if row is None:
+            raise KeyError(f"no entity with id {id}")
+
+        etype, content, created_at, updated_at = row
+        return Entity(
+            load_asset(etype, content), id,
+            _datetime(created_at), _datetime(updated_at))
+
+    def _find_edge_by_id(self, id: str) -> Edge:
+        with self.lock:
+            row = self.db.execute(
+                """
+                SELECT rtype, content, from_id, to_id, created_at, updated_at
+                FROM edges WHERE id = ?
+                """,
+                (int(id),)).fetchone()
+
+        if row is None:
+            raise KeyError(f"no edge with id {id}")
+
+        rtype, content, from_id, to_id, created_at, updated_at = row
+        return Edge(
+            load_relation(rtype, content),
+            self.find_entity_by_id(str(from_id)),
+            self.find_entity_by_id(str(to_id)),
+            id, _datetime(created_at), _datetime(updated_at))
+
+    def unsynced(self, table: str, limit: int) -> list[tuple[Any, ...]]:
+        """
+        Return up to LIMIT rows of TABLE not yet pushed to the broker,
+        with the remote ids of the rows they point to.
+        """
+        queries = {
+            "entities": """
+                SELECT id, etype, content FROM entities
+                WHERE synced = 0 ORDER BY id LIMIT ?
+                """,
+            "edges": """
+                SELECT e.id, e.rtype, e.content, f.remote_id, t.remote_id
+                FROM edges e
+                JOIN entities f ON f.id = e.from_id
+                JOIN entities t ON t.id = e.to_id
+                WHERE e.synced = 0 AND f.synced = 1 AND t.synced = 1
+                ORDER BY e.id LIMIT ?
+                """,
+            "entity_tags": """
+                SELECT g.id, g.ptype, g.content, e.remote_id
+                FROM entity_tags g
+                JOIN entities e ON e.id = g.entity_id
+                WHERE g.synced = 0 AND e.synced = 1
+                ORDER BY g.id LIMIT ?
+                """,
+            "edge_tags": """
+                SELECT g.id, g.ptype, g.content, e.remote_id
+                FROM edge_tags g
+                JOIN edges e ON e.id = g.edge_id
+                WHERE g.synced = 0 AND e.synced = 1
+                ORDER BY g.id LIMIT ?
+                """,
+        }
+        with self.lock:
+            self.commit()
+            return self.db.execute(queries[table], (limit,)).fetchall()
+
+    def mark_synced(self, table: str, remote_ids: dict[int, str]):
+        if table not in TABLES:
+            raise ValueError(f"unknown table {table}")
+
+        with self.lock:
+            self.commit()
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                f"UPDATE {table} SET remote_id = ?, synced = 1 WHERE id = ?",
+                [(remote_id, id) for id, remote_id in remote_ids.items()])
+            self.db.execute("COMMIT")
+
+    def rows(self, table: str) -> Iterator[tuple[Any, ...]]:
+        """
+        Stream every row of TABLE, in insertion order, as
+        (id, type, content, *ids of the rows it points to).
+        """
+        queries = {
+            "entities": "SELECT id, etype, content FROM entities",
+            "edges": "SELECT id, rtype, content, from_id, to_id FROM edges",
+            "entity_tags": "SELECT id, ptype, content, entity_id FROM entity_tags",
+            "edge_tags": "SELECT id, ptype, content, edge_id FROM edge_tags",
+        }
+        self.commit()
+        yield from self.db.execute(queries[table] + " ORDER BY id")
+
+    def count(self, table: str, synced: Optional[bool] = None) -> int:
+        if table not in TABLES:
+            raise ValueError(f"unknown table {table}")
+
+        query = f"SELECT count(*) FROM {table}"
+        if synced is not None:
+            query += f" WHERE synced = {int(synced)}"
+
+        with self.lock:
+            return self.db.execute(query).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsyncLocalStore:
+    """
+    LocalStore exposing the calls of oam_client.AsyncBrokerClient.
+
+    The writes are plain SQLite statements grouped in transactions,
+    cheaper than a hop to a worker thread, so they run on the event
+    loop.
+    """
+
+    local: LocalStore
+
+    def __init__(self, local: LocalStore):
+        self.local = local
+
+    async def create_entity(self, asset: Asset) -> Entity:
+        return self.local.create_entity(asset)
+
+    async def create_edge(
+            self,
+            relation: Relation,
+            from_id: str,
+            to_id: str
+    ) -> Edge:
+        return self.local.create_edge(relation, from_id, to_id)
+
+    async def create_entity_tag(
+            self,
+            prop: Property,
+            entity_id: str
+    ) -> EntityTag:
+        return self.local.create_entity_tag(prop, entity_id)
+
+    async def create_edge_tag(self, prop: Property, edge_id: str) -> EdgeTag:
+        return self.local.create_edge_tag(prop, edge_id)
+
+    def close(self):
+        self.local.close()
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from common.logger import getLogger
+from common.metrics import STAGE_ITEMS
+
+from .local import LocalStore, load_asset, load_relation, load_property
+
+logger = getLogger(__name__)
+
+
+async def _push(
+        local: LocalStore,
+        table: str,
+        create: Callable[[tuple[Any, ...]], Awaitable[Any]],
+        concurrency: int,
+        batch: int
+) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+    pushed = 0
+
+    async def push(row: tuple[Any, ...]) -> tuple[int, str]:
+        async with semaphore:
+            remote = await create(row)
+        return (row[0], remote.id)
+
+    while True:
+        rows = local.unsynced(table, batch)
+        if len(rows) == 0:
+            return pushed
+
+        remote_ids = dict(await asyncio.gather(*[push(row) for row in rows]))
+        local.mark_synced(table, remote_ids)
+        pushed += len(remote_ids)
+        STAGE_ITEMS.inc(len(remote_ids), tool="store", stage=f"sync_{table}")
+        logger.debug("sync:%s:%s", table, pushed)
+
+
+async def sync_store(
+        local: LocalStore,
+        client: Any,
+        concurrency: int = 16,
+        batch: int = 500
+) -> dict[str, int]:
+    """
+    Push every row of LOCAL not yet synced into the broker behind
+    CLIENT, an oam_client.AsyncBrokerClient.
+
+    Entities go first, then edges and entity tags, then edge tags, so
+    the broker ids a row points to are always known. The broker id of
+    each row is kept, so an interrupted sync resumes where it stopped.
+
+    :param concurrency: number of broker calls in flight
+    :param batch: number of rows read and marked synced at once
+    :returns: the number of rows pushed, by table
+    :raises ValueError: when parameters are impossible values
+    """
+    if concurrency < 1:
+        raise ValueError("sync concurrency must be greather than 0")
+
+    if batch < 1:
+        raise ValueError("sync batch size must be greather than 0")
+
+    async def entity(row):
+        _, etype, content = row
+        return await client.create_entity(load_asset(etype, content))
+
+    async def edge(row):
+        _, rtype, content, from_id, to_id = row
+        return await client.create_edge(
+            load_relation(rtype, content), from_id, to_id)
+
+    async def entity_tag(row):
+        _, ptype, content, entity_id = row
+        return await client.create_entity_tag(
+            load_property(ptype, content), entity_id)
+
+    async def edge_tag(row):
+        _, ptype, content, edge_id = row
+        return await client.create_edge_tag(
+            load_property(ptype, content), edge_id)
+
+    return {
+        "entities": await _push(
+            local, "entities", entity, concurrency, batch),
+        "edges": await _push(
+            local, "edges", edge, concurrency, batch),
+        "entity_tags": await _push(
+            local, "entity_tags", entity_tag, concurrency, batch),
+        "edge_tags": await _push(
+            local, "edge_tags", edge_tag, concurrency, batch),
+    }
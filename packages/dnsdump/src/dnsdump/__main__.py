@@ -5,11 +5,13 @@ import json
 import asyncio
 from argparse import ArgumentParser
 from termcolor import colored
-from pygments import highlight, lexers, formatters
-from oam_client import AsyncBrokerClient
 from .service import DumpDNSCommand
+from .snapshot import RecordSnapshot
 
-from common.output import print_error
+from common.output import print_error, add_output_arguments, open_output
+from common.store.client import add_store_arguments, open_store
+from common.metrics import add_metrics_arguments, start_metrics, InstrumentedStore
+from common.profile import add_profile_arguments, start_profile
 
 
 def _get_displayable_name(
@@ -30,6 +32,8 @@ def _get_displayable_data(
     if nocolor:
         return json_data + "\n"
     else:
+        from pygments import highlight, lexers, formatters
+
         colorful_json_data = highlight(
             json_data,
             lexers.JsonLexer(),
@@ -95,13 +99,16 @@ async def async_main():
         "-t", "--timeout", help="DNS query timeout per nameserver (ms)",
         type=int, default=5000)
     parser.add_argument(
-        "-l", "--lifetime", help="Max total time per DNS query (ms)",
+        "-l", "--lifetime", help="Max total time per DNS query, retries "
+        "included (ms)",
         type=int, default=10000)
     parser.add_argument(
-        "--retries", help="Number of retries on timeout or network error",
+        "--retries", help="Number of attempts on timeout, SERVFAIL or "
+        "network error",
         type=int, default=3)
     parser.add_argument(
-        "--retry-delay", help="Delay between retries (ms)",
+        "--retry-delay", help="Base delay of the exponential backoff "
+        "between retries (ms)",
         type=int, default=1000)
     parser.add_argument(
         "--nocolor", help="Disable colors on stdout",
@@ -109,6 +116,16 @@ async def async_main():
     parser.add_argument(
         "--nosource", help="Disable source tags in OAM",
         action="store_true")
+    parser.add_argument(
+        "--noaxfr", help="Do not try a zone transfer before querying "
+        "each RRType", action="store_true")
+    parser.add_argument(
+        "--follow-cnames", help="Follow CNAME chains to their terminal "
+        "records, flag the ones ending on an NXDOMAIN", action="store_true")
+    parser.add_argument(
+        "--diff", help="SQLite database of the records of the last dump, "
+        "only the added and removed ones are written and shown",
+        metavar="STATE")
 
     output_group = parser.add_mutually_exclusive_group()
 
@@ -119,19 +136,54 @@ async def async_main():
         "-s", "--silent", help="Show failed attempts",
         action="store_true")
 
+    add_output_arguments(parser)
+    add_store_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+
     config = parser.parse_args()
 
     try:
-        store = AsyncBrokerClient("https://localhost", verify=False)
+        start_metrics(config)
+        start_profile(config)
+    except (OSError, ValueError) as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    try:
+        store = InstrumentedStore(open_store(config.store))
     except Exception as e:
         print_error(e, config.nocolor, config.silent)
         sys.exit(1)
 
-    def success_handler(rdtype: str, data: dict):
-        display_success(rdtype, data, config.nocolor, config.silent)
+    snapshot = None
+    try:
+        if config.diff is not None:
+            snapshot = RecordSnapshot(config.diff)
+    except Exception as e:
+        print_error(e, config.nocolor, config.silent)
+        sys.exit(1)
+
+    writer = open_output(config)
+
+    def success_handler(domain: str, rdtype: str, data: dict):
+        if writer is None:
+            # Zone transfers return the records of the names below too
+            if domain.lower() != config.domain.rstrip(".").lower():
+                rdtype = f"{rdtype} {domain}"
+            if data.get("removed"):
+                rdtype = f"REMOVED {rdtype}"
+            display_success(rdtype, data, config.nocolor, config.silent)
+        elif not config.silent:
+            writer.write({"domain": domain, "type": rdtype, "data": data})
 
     def failure_handler(rdtype: str):
-        display_fail(rdtype, config.nocolor, config.silent, config.verbose)
+        if writer is None:
+            display_fail(
+                rdtype, config.nocolor, config.silent, config.verbose)
+        elif config.verbose:
+            writer.write(
+                {"domain": config.domain, "type": rdtype, "data": None})
 
     try:
         cmd = DumpDNSCommand(
@@ -146,12 +198,20 @@ async def async_main():
             lifetime=config.lifetime,
             retries=config.retries,
             retry_delay=config.retry_delay,
+            store_window=config.store_window,
+            axfr=not config.noaxfr,
+            follow_cnames=config.follow_cnames,
+            snapshot=snapshot,
         )
     except Exception as e:
         print_error(e, config.nocolor, config.silent)
         sys.exit(1)
 
-    await cmd.run()
+    try:
+        await cmd.run()
+    finally:
+        if snapshot is not None:
+            snapshot.close()
 
 
 def main():
@@ -1,18 +1,29 @@
+import time
 import asyncio
+import dns.rcode
 import dns.rdata
+import dns.message
 import dns.rdatatype
 from dns.name import Name
-from dns.asyncresolver import Resolver
-from typing import Generator, Optional
-from dns.rdata import GenericRdata
-from dns.exception import DNSException, Timeout
+from dns.rrset import RRset
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Generator, Optional
+from dns.rdata import Rdata, GenericRdata
+from dns.resolver import NXDOMAIN, NoAnswer
+from dns.exception import DNSException
 
 from common.logger import getLogger
+from common.dns.resolve import ResilientResolver
 
 logger = getLogger(__name__)
 
 YieldValue = tuple[str, Optional[GenericRdata], Optional[Exception]]
 DumpDNSGenerator = Generator[YieldValue, None, None]
+TransferGenerator = AsyncGenerator[RRset, None]
+
+
+class TransferRefused(DNSException):
+    """The zone transfer was refused or failed on every nameserver."""
 
 RDTYPES = [
     name for name, value in dns.rdatatype.__dict__.items()
@@ -21,51 +32,305 @@ RDTYPES = [
     and not dns.rdatatype.is_metatype(value)]
 
 
-async def _resolve_with_retry(
-    resolver: Resolver,
-    domain: Name,
-    rdtype: str,
-    retries: int,
-    retry_delay: float,
-):
-    last_exc: Exception | None = None
-    for attempt in range(retries):
-        try:
-            return await resolver.resolve(domain, rdtype)
-        except (Timeout, OSError) as e:
-            last_exc = e
-            if attempt < retries - 1:
-                logger.debug(
-                    "resolve %s %s failed (attempt %s/%s): %s, retrying in %.1fs",
-                    rdtype, domain, attempt + 1, retries, e, retry_delay,
-                )
-                await asyncio.sleep(retry_delay)
-            else:
-                raise
-    assert last_exc is not None
-    raise last_exc
-
-
 async def dump_dns_records(
         domain: Name,
-        resolver: Resolver,
-        retries: int = 3,
-        retry_delay: float = 1.0,
+        resolver: ResilientResolver
 ) -> DumpDNSGenerator:
 
-    logger.debug(f"dump_dns_records:all:{RDTYPES}")
+    logger.debug("dump_dns_records:all:%s", RDTYPES)
 
     for rdtype in RDTYPES:
-        logger.debug(f"dump_dns_records:test:{rdtype}")
+        logger.debug("dump_dns_records:test:%s", rdtype)
         try:
-            logger.debug(f"try record:{rdtype}")
-            answers = await _resolve_with_retry(
-                resolver, domain, rdtype, retries, retry_delay
-            )
+            answers = await resolver.resolve(domain, rdtype)
             for rdata in answers:
-                logger.debug(f"rdata:{rdata}")
+                logger.debug("rdata:%s", rdata)
                 yield (rdtype, rdata, None)
 
         except DNSException as e:
             logger.debug(type(e).__name__)
             yield (rdtype, None, e)
+
+
+async def find_nameservers(
+        zone: Name,
+        resolver: ResilientResolver
+) -> list[str]:
+    """
+    Return the addresses of the nameservers of ZONE.
+
+    :raises NoAnswer: when ZONE is not the apex of a zone
+    :raises DNSException: when its NS set cannot be resolved
+    """
+    answers = await resolver.resolve(zone, dns.rdatatype.NS)
+    targets = sorted({rdata.target for rdata in answers})
+
+    results = await asyncio.gather(*[
+        resolver.resolve(target, rdtype)
+        for target in targets
+        for rdtype in (dns.rdatatype.A, dns.rdatatype.AAAA)],
+        return_exceptions=True)
+
+    addresses: list[str] = []
+    for result in results:
+        if isinstance(result, DNSException):
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        for rdata in result:
+            if rdata.address not in addresses:
+                addresses.append(rdata.address)
+
+    logger.debug("find_nameservers:%s:%s", zone, addresses)
+    return addresses
+
+
+async def _read_message(
+        reader: asyncio.StreamReader,
+        timeout: float
+) -> dns.message.Message:
+    length = await asyncio.wait_for(reader.readexactly(2), timeout)
+    wire = await asyncio.wait_for(
+        reader.readexactly(int.from_bytes(length, "big")), timeout)
+    return dns.message.from_wire(wire, xfr=True, one_rr_per_rrset=True)
+
+
+async def _start_transfer(
+        zone: Name,
+        where: str,
+        port: int,
+        timeout: float
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, dns.message.Message]:
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(where, port), timeout)
+
+    try:
+        wire = dns.message.make_query(zone, dns.rdatatype.AXFR).to_wire()
+        writer.write(len(wire).to_bytes(2, "big") + wire)
+        await writer.drain()
+
+        message = await _read_message(reader, timeout)
+        if message.rcode() != dns.rcode.NOERROR \
+           or len(message.answer) == 0 \
+           or message.answer[0].rdtype != dns.rdatatype.SOA:
+            raise TransferRefused(
+                f"{where} refused the transfer of {zone}: "
+                f"{dns.rcode.to_text(message.rcode())}")
+    except BaseException:
+        writer.close()
+        raise
+
+    return reader, writer, message
+
+
+async def transfer_zone(
+        zone: Name,
+        addresses: list[str],
+        port: int = 53,
+        timeout: float = 5.0
+) -> TransferGenerator:
+    """
+    Transfer ZONE with AXFR and stream its records, one RRset per
+    record, the closing SOA excluded.
+
+    The transfer is asked to every nameserver at once, records are
+    streamed from the first one accepting it.
+
+    :param addresses: the addresses of the nameservers of ZONE
+    :param port: the port the nameservers listen on
+    :param timeout: max time to connect and between two messages (in s)
+    :raises TransferRefused: when no nameserver accepts the transfer
+    :raises DNSException: when the transfer breaks off
+    """
+    pending = {
+        asyncio.create_task(_start_transfer(zone, where, port, timeout))
+        for where in addresses}
+    transfer = None
+
+    while len(pending) > 0 and transfer is None:
+        done, pending = await asyncio.wait(
+            pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                logger.debug("transfer_zone:%s:%s", zone, task.exception())
+            elif transfer is None:
+                transfer = task.result()
+            else:
+                task.result()[1].close()
+
+    for task in pending:
+        task.cancel()
+
+    if transfer is None:
+        raise TransferRefused(f"no nameserver transfers {zone}")
+
+    reader, writer, message = transfer
+    soa = 0
+    try:
+        while True:
+            for rrset in message.answer:
+                if rrset.rdtype == dns.rdatatype.SOA:
+                    soa += 1
+                    if soa == 2:
+                        return
+                yield rrset
+
+            try:
+                message = await _read_message(reader, timeout)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                    OSError) as e:
+                raise DNSException(f"transfer of {zone} broke off: {e!r}")
+
+            if message.rcode() != dns.rcode.NOERROR:
+                raise DNSException(
+                    f"transfer of {zone} failed: "
+                    f"{dns.rcode.to_text(message.rcode())}")
+    finally:
+        writer.close()
+
+
+@dataclass
+class CNAMEHop:
+    """
+    A name of a CNAME chain and its records: the CNAME to the next name,
+    or the A and AAAA records of the terminal name.
+    """
+
+    name:       Name
+    rdatas:     list[Rdata] = field(default_factory=list)
+    dangling:   bool = False
+    ttl:        int = 0
+    # Whether its records are in the store, set by the commands
+    stored:     bool = False
+
+    @property
+    def next(self) -> Optional[Name]:
+        if len(self.rdatas) > 0 \
+           and self.rdatas[0].rdtype == dns.rdatatype.CNAME:
+            return self.rdatas[0].target
+        return None
+
+
+class CNAMEFollower:
+    """
+    Follow CNAME chains to their terminal records.
+
+    Each name is resolved once and remembered for the TTL of its
+    records, so the CDN and SaaS endpoints shared by many FQDNs are only
+    queried for the first one. Concurrent chains going through the same
+    name wait for the same queries. A chain ending on an NXDOMAIN is
+    dangling: its last name can be registered by anyone.
+    """
+
+    resolver: ResilientResolver
+    max_hops: int
+    max_ttl: int
+    hops: dict[Name, tuple[float, CNAMEHop]]
+    inflight: dict[Name, asyncio.Future]
+    sweep_at: int
+
+    def __init__(
+            self,
+            resolver: ResilientResolver,
+            max_hops: int = 16,
+            max_ttl: int = 3600
+    ):
+        """
+        Instanciate the CNAMEFollower.
+
+        :param resolver: the resolver of the chains queries
+        :param max_hops: max names followed per chain
+        :param max_ttl: max time a name is remembered for (s)
+        :raises ValueError: when parameters are impossible values
+        """
+        if max_hops < 1:
+            raise ValueError("CNAME max hops must be greather than 0")
+
+        if max_ttl < 0:
+            raise ValueError("CNAME cache TTL must be greather or equal to 0")
+
+        self.resolver = resolver
+        self.max_hops = max_hops
+        self.max_ttl = max_ttl
+        self.hops = {}
+        self.inflight = {}
+        self.sweep_at = 1024
+
+    def _remember(self, hop: CNAMEHop):
+        now = time.monotonic()
+        self.hops[hop.name] = (now + hop.ttl, hop)
+
+        # The expired names are dropped as the cache doubles, a long
+        # running follower does not keep every name it ever resolved
+        if len(self.hops) >= self.sweep_at:
+            self.hops = {
+                name: cached for name, cached in self.hops.items()
+                if cached[0] > now}
+            self.sweep_at = max(1024, 2 * len(self.hops))
+
+    async def _resolve_hop(self, name: Name) -> CNAMEHop:
+        hop = CNAMEHop(name, ttl=self.max_ttl)
+        try:
+            answer = await self.resolver.resolve(name, dns.rdatatype.CNAME)
+            hop.rdatas = list(answer)
+            hop.ttl = min(hop.ttl, answer.rrset.ttl)
+        except NoAnswer:
+            for rdtype in (dns.rdatatype.A, dns.rdatatype.AAAA):
+                try:
+                    answer = await self.resolver.resolve(name, rdtype)
+                except NoAnswer:
+                    continue
+                except NXDOMAIN:
+                    # Removed between the queries
+                    hop.rdatas = []
+                    hop.dangling = True
+                    break
+                hop.rdatas += list(answer)
+                hop.ttl = min(hop.ttl, answer.rrset.ttl)
+        except NXDOMAIN:
+            hop.dangling = True
+
+        # Failed queries raise before being remembered
+        self._remember(hop)
+        return hop
+
+    async def hop(self, name: Name) -> CNAMEHop:
+        """
+        Resolve NAME, or return the records it resolved to less than
+        their TTL ago.
+
+        :raises DNSException: when a query fails
+        """
+        cached = self.hops.get(name)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        future = self.inflight.get(name)
+        if future is None:
+            future = asyncio.ensure_future(self._resolve_hop(name))
+            self.inflight[name] = future
+            future.add_done_callback(lambda _: self.inflight.pop(name, None))
+
+        return await asyncio.shield(future)
+
+    async def follow(self, target: Name) -> list[CNAMEHop]:
+        """
+        Return the hops of the chain starting at TARGET, up to the
+        terminal name, the dangling one, a loop or max_hops.
+
+        :raises DNSException: when a query fails
+        """
+        chain: list[CNAMEHop] = []
+        name: Optional[Name] = target
+
+        while name is not None and len(chain) < self.max_hops:
+            if any(hop.name == name for hop in chain):
+                logger.warning(f"follow:{target} CNAME chain loops on {name}")
+                break
+
+            hop = await self.hop(name)
+            chain.append(hop)
+            name = hop.next
+
+        logger.debug("follow:%s:%s", target, [str(h.name) for h in chain])
+        return chain
@@ -1,16 +1,33 @@
+import asyncio
+import dns.rdatatype
+from datetime import datetime, timezone
 from dns import name
 from dns.rdata import Rdata
 from dns.asyncresolver import Resolver
+from dns.resolver import NXDOMAIN, NoAnswer
 from dns.exception import DNSException
 from oam_client import AsyncBrokerClient
+from oam_client.messages import Entity
 from asset_model import FQDN
-from typing import Callable, Awaitable
+from typing import Callable, Awaitable, Optional
+
+from common.logger import getLogger
 
 from common.dns.utils import ensure_domain
+from common.dns.resolve import ResilientResolver, RetryPolicy
 from common.ratelimiter import RateLimiter
+from common.metrics import STAGE_ITEMS
+from common.store.client import StoreWindow, DEFAULT_WINDOW
+
+from .store import dispatch, store_node, tag_dangling, tag_change
+from .snapshot import RecordSnapshot, Record
+from .core import (
+    dump_dns_records, find_nameservers, transfer_zone, CNAMEFollower,
+    DumpDNSGenerator)
+
+logger = getLogger(__name__)
 
-from .store import dispatch
-from .core import dump_dns_records, DumpDNSGenerator
+RecordHandler = Callable[[name.Name, str, Rdata], Awaitable[None]]
 
 
 class DumpDNSCommand:
@@ -19,17 +36,23 @@ class DumpDNSCommand:
 
     domain: name.Name
     resolver: Resolver
+    resilient: ResilientResolver
     dump:  DumpDNSGenerator
     store: AsyncBrokerClient
+    window: StoreWindow
     ratelimiter: RateLimiter
-    on_success: Callable[[str, Rdata], Awaitable[None]]
-    on_failure: Callable[[str], Awaitable[None]]
+    nodes: dict[name.Name, Awaitable[Entity]]
+    axfr: bool
+    cnames: Optional[CNAMEFollower]
+    snapshot: Optional[RecordSnapshot]
+    on_success: Callable[[str, str, dict], None]
+    on_failure: Callable[[str], None]
 
     def __init__(
         self,
         domain: str,
         store: AsyncBrokerClient,
-        on_success: Callable[[str, Rdata], None],
+        on_success: Callable[[str, str, dict], None],
         on_failure: Callable[[str], None],
         ratelimiter_delay: int = 300,
         ratelimiter_batch: int = 5,
@@ -38,25 +61,68 @@ class DumpDNSCommand:
         lifetime: int = 10000,
         retries: int = 3,
         retry_delay: int = 1000,
+        resolver: Optional[Resolver] = None,
+        store_window: int = DEFAULT_WINDOW,
+        axfr: bool = True,
+        follow_cnames: bool = False,
+        cnames: Optional[CNAMEFollower] = None,
+        snapshot: Optional[RecordSnapshot] = None,
     ):
         try:
             self.domain = name.from_text(domain)
         except DNSException:
             raise
 
+        # A shared resolver is used as is, its configuration is left
+        # to its owner.
+        if resolver is not None:
+            self.resolver = resolver
+        else:
+            try:
+                self.resolver = Resolver(
+                    filename=resolv,
+                    configure=True)
+            except DNSException:
+                raise
+
+            # Each attempt asks the nameservers once, the lifetime is
+            # the deadline of the query and all of its retries
+            self.resolver.timeout = timeout / 1000.0
+            self.resolver.lifetime = timeout / 1000.0
+
         try:
-            self.resolver = Resolver(
-                filename=resolv,
-                configure=True)
-        except DNSException:
+            policy = RetryPolicy(
+                attempts=retries,
+                base_delay=retry_delay / 1000.0,
+                deadline=lifetime / 1000.0)
+        except ValueError:
             raise
 
-        self.resolver.timeout = timeout / 1000.0
-        self.resolver.lifetime = lifetime / 1000.0
-        self.retries = retries
-        self.retry_delay = retry_delay / 1000.0
+        self.resilient = ResilientResolver(self.resolver, policy, "dnsdump")
         self.store = store
 
+        try:
+            self.window = StoreWindow(store_window)
+        except ValueError:
+            raise
+
+        self.axfr = axfr
+
+        # A follower shared between commands resolves each CNAME target
+        # once for all of them
+        self.cnames = None
+        if cnames is not None:
+            self.cnames = cnames
+        elif follow_cnames:
+            try:
+                self.cnames = CNAMEFollower(self.resilient)
+            except ValueError:
+                raise
+
+        # With a snapshot, only the records that changed since the last
+        # dump are written
+        self.snapshot = snapshot
+
         self.on_success = on_success
         self.on_failure = on_failure
 
@@ -75,36 +141,181 @@ class DumpDNSCommand:
         except ValueError:
             raise
 
+    def _node(self, domain: name.Name) -> Awaitable[Entity]:
+        # Concurrent records of one name wait for the same entity
+        if domain not in self.nodes:
+            self.nodes[domain] = asyncio.ensure_future(
+                self._store_node(domain))
+        return self.nodes[domain]
+
+    async def _store_node(self, domain: name.Name) -> Entity:
+        parent = await self._node(domain.parent())
+        return await store_node(self.store, parent, domain.to_text(True))
+
+    async def _transfer(self, handler: RecordHandler):
+        """
+        Transfer the zone the target is the apex of, and pass its records
+        to HANDLER.
+
+        The names below an apex are not transferred: each of them would
+        transfer the whole parent zone again, and in the transformers the
+        names a transfer stores would trigger as many transfers.
+
+        :raises NoAnswer: when the target is not the apex of a zone
+        :raises DNSException: when every nameserver refuses the transfer
+        """
+        try:
+            addresses = await find_nameservers(self.domain, self.resilient)
+        except DNSException:
+            raise
+
+        records = transfer_zone(
+            self.domain, addresses, self.resolver.port, self.resolver.timeout)
+        async for rrset in records:
+            rdtype = dns.rdatatype.to_text(rrset.rdtype)
+            for rdata in rrset:
+                await self.window.submit(handler(rrset.name, rdtype, rdata))
+
+        STAGE_ITEMS.inc(tool="dnsdump", stage="transfer")
+
+    async def _follow(self, source: name.Name, target: name.Name):
+        try:
+            chain = await self.cnames.follow(target)
+        except DNSException as e:
+            logger.warning(
+                f"follow:{source} → {target} unresolved: {type(e).__name__}")
+            return
+
+        # The target was stored with the CNAME record, get its id
+        node = await self.store.create_entity(FQDN(target.to_text(True)))
+        for hop in chain:
+            domain = hop.name.to_text(True)
+            if hop.dangling:
+                await tag_dangling(self.store, node, source.to_text(True))
+                STAGE_ITEMS.inc(tool="dnsdump", stage="dangling")
+                self.on_success(domain, "NXDOMAIN", {"dangling": True})
+                break
+
+            # Another chain went through this name since it was
+            # resolved, its records are stored already
+            if not hop.stored:
+                for rdata in hop.rdatas:
+                    rdtype = dns.rdatatype.to_text(rdata.rdtype)
+                    data = await dispatch(self.store, node, rdtype, rdata)
+                    STAGE_ITEMS.inc(tool="dnsdump", stage="cname_chain")
+                    self.on_success(domain, rdtype, data)
+                hop.stored = True
+
+            if hop.next is not None:
+                node = await self.store.create_entity(
+                    FQDN(hop.next.to_text(True)))
+
+    async def _write_diff(self, covered: Optional[set[tuple[str, str]]]):
+        zone = self.domain.to_text(True)
+
+        # Only the (name, rdtype) pairs this run answered for tell a
+        # record is gone, None when a transfer covered the whole zone. A
+        # type whose query failed may still have its records.
+        removed = {
+            record for record in self.previous - self.seen
+            if covered is None or record[:2] in covered}
+
+        observed = datetime.now(timezone.utc)
+        for domain, rdtype, value in sorted(removed):
+            node = await self._node(name.from_text(domain))
+            await tag_change(
+                self.store, node, "removed", rdtype, value, observed)
+            STAGE_ITEMS.inc(tool="dnsdump", stage="removed")
+            self.on_success(
+                domain, rdtype, {"value": value, "removed": True})
+
+        self.snapshot.update(zone, self.seen, removed)
+        logger.debug(
+            "diff:%s:%s seen:%s removed", zone, len(self.seen), len(removed))
+
+    async def _finish(self, covered: Optional[set[tuple[str, str]]]):
+        await self.window.join()
+        if self.snapshot is not None:
+            await self._write_diff(covered)
+
     async def run(self):
 
-        print(FQDN(self.domain.to_text(True)))
         self.base = await self.store.create_entity(FQDN(self.domain.to_text(True)))
+        self.nodes = {self.domain: asyncio.get_running_loop().create_future()}
+        self.nodes[self.domain].set_result(self.base)
 
-        async def success_handler(rdtype: str, rdata: Rdata):
-            try:
-                data = await dispatch(self.store, self.base, rdtype, rdata)
-            except Exception as e:
-                raise e
-            self.on_success(rdtype, data)
+        self.previous: set[Record] = set()
+        self.seen: set[Record] = set()
+        if self.snapshot is not None:
+            self.previous = self.snapshot.load(self.domain.to_text(True))
+        observed = datetime.now(timezone.utc)
+
+        async def success_handler(domain: name.Name, rdtype: str, rdata: Rdata):
+            unchanged = False
+            if self.snapshot is not None:
+                record = (domain.to_text(True), rdtype, rdata.to_text())
+                self.seen.add(record)
+                unchanged = record in self.previous
+
+            # An unchanged record is in the store already, its CNAME
+            # target may be dangling since though
+            if unchanged:
+                STAGE_ITEMS.inc(tool="dnsdump", stage="unchanged")
+            else:
+                try:
+                    node = await self._node(domain)
+                    data = await dispatch(self.store, node, rdtype, rdata)
+                except Exception as e:
+                    raise e
+                STAGE_ITEMS.inc(tool="dnsdump", stage="record")
+
+                # The first dump of a domain has nothing to compare with
+                if len(self.previous) > 0:
+                    await tag_change(
+                        self.store, node, "added", rdtype, rdata.to_text(),
+                        observed)
+                self.on_success(domain.to_text(True), rdtype, data)
+
+            if self.cnames is not None \
+               and rdata.rdtype == dns.rdatatype.CNAME:
+                await self._follow(domain, rdata.target)
 
         async def failure_handler(rdtype: str):
+            STAGE_ITEMS.inc(tool="dnsdump", stage="no_record")
             self.on_failure(rdtype)
 
         try:
-            await ensure_domain(self.domain, self.resolver)
+            await ensure_domain(self.domain, self.resilient)
         except DNSException:
             raise
 
-        self.dump = dump_dns_records(
-            self.domain,
-            self.resolver,
-            retries=self.retries,
-            retry_delay=self.retry_delay,
-        )
+        # A single zone transfer returns every record at once, the
+        # queries by type are only sent when it is refused
+        if self.axfr:
+            try:
+                await self._transfer(success_handler)
+                await self._finish(None)
+                return
+            except DNSException as e:
+                logger.debug("transfer:%s:%s", self.domain, e)
+
+        # The queries by type only answer for the target itself
+        target = self.domain.to_text(True)
+        covered: set[tuple[str, str]] = set()
+        self.dump = dump_dns_records(self.domain, self.resilient)
         async for rdtype, rdata, err in self.dump:
             await self.ratelimiter.try_acquire_async()
             if rdata is None:
+                if isinstance(err, (NoAnswer, NXDOMAIN)):
+                    covered.add((target, rdtype))
                 await failure_handler(rdtype)
                 continue
 
-            await success_handler(rdtype, rdata)
+            covered.add((target, rdtype))
+
+            # Records are stored in the background so the store latency
+            # overlaps with the next queries
+            await self.window.submit(
+                success_handler(self.domain, rdtype, rdata))
+
+        await self._finish(covered)
@@ -0,0 +1,99 @@
+import time
+import sqlite3
+
+from common.logger import getLogger
+
+logger = getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    zone       TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    rdtype     TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen  REAL NOT NULL,
+    PRIMARY KEY (zone, name, rdtype, value)
+);
+"""
+
+Record = tuple[str, str, str]
+
+
+class RecordSnapshot:
+    """
+    The DNS records written to the asset store by the last dump of each
+    domain, kept in a SQLite database.
+
+    The broker is write only for the tools, this is what a re-scan
+    compares its fresh records with to write only the changes.
+    """
+
+    path: str
+    db: sqlite3.Connection
+
+    def __init__(self, path: str):
+        """
+        Instanciate the RecordSnapshot.
+
+        :param path: path of the SQLite database, created when missing
+        :raises sqlite3.Error: when the database cannot be opened
+        """
+        self.path = path
+
+        try:
+            self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+        except sqlite3.Error:
+            raise
+
+    def load(self, zone: str) -> set[Record]:
+        """
+        Return the (name, rdtype, value) records last dumped for ZONE.
+        """
+        rows = self.db.execute(
+            "SELECT name, rdtype, value FROM records WHERE zone = ?",
+            (zone,))
+        records = set(rows)
+        logger.debug("load:%s:%s records", zone, len(records))
+        return records
+
+    def update(
+            self,
+            zone: str,
+            seen: set[Record],
+            removed: set[Record]
+    ):
+        """
+        Record the SEEN records of ZONE, and forget the REMOVED ones, in
+        one transaction.
+        """
+        now = time.time()
+        self.db.execute("BEGIN")
+        try:
+            self.db.executemany(
+                "INSERT INTO records "
+                "(zone, name, rdtype, value, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (zone, name, rdtype, value) DO UPDATE SET "
+                "last_seen = excluded.last_seen",
+                [(zone, *record, now, now) for record in seen])
+            self.db.executemany(
+                "DELETE FROM records "
+                "WHERE zone = ? AND name = ? AND rdtype = ? AND value = ?",
+                [(zone, *record) for record in removed])
+        except sqlite3.Error:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
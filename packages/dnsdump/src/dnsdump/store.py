@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Type, Callable, Awaitable
 from dns.rdata import Rdata
 import dns.rdtypes.IN.A
@@ -13,8 +14,11 @@ from asset_model import FQDN
 from asset_model import Identifier, IdentifierType
 from asset_model import BasicDNSRelation, RRHeader
 from asset_model import PrefDNSRelation
+from asset_model import SimpleRelation
+from asset_model import SimpleProperty
 from asset_model import SourceProperty
 from asset_model import DNSRecordProperty
+from asset_model import VulnProperty
 
 from oam_client import BrokerClient
 from oam_client.messages import Entity, Edge, EntityTag, EdgeTag
@@ -27,14 +31,71 @@ handlers: dict[Type[dns.rdata.Rdata], HandlerCallback] = {}
 
 
 async def add_source(store: BrokerClient, o: Entity | Edge) -> EntityTag | EdgeTag:
-    if type(o) is Entity:
+    # The broker and the local store return different classes, tell
+    # entities and edges apart by their content
+    if hasattr(o, "asset"):
         return await store.create_entity_tag(
             SourceProperty(source=__title__, confidence=100), o.id)
-    if type(o) is Edge:
+    if hasattr(o, "relation"):
         return await store.create_edge_tag(
             SourceProperty(source=__title__, confidence=100), o.id)
 
 
+async def store_node(
+        store: BrokerClient,
+        parent: Entity,
+        name: str
+) -> Entity:
+    """
+    Store the FQDN NAME found below PARENT, e.g. by a zone transfer.
+    """
+    child = await store.create_entity(FQDN(name))
+    await add_source(store, child)
+
+    rel = await store.create_edge(
+        SimpleRelation("node"), parent.id, child.id)
+    await add_source(store, rel)
+    return child
+
+
+async def tag_dangling(
+        store: BrokerClient,
+        target: Entity,
+        source: str
+) -> EntityTag:
+    """
+    Flag TARGET, the name a CNAME chain from SOURCE ends on but which
+    does not exist, as a subdomain takeover candidate.
+    """
+    return await store.create_entity_tag(
+        VulnProperty(
+            id="dangling_cname",
+            description=f"CNAME chain from {source} ends on "
+            f"{target.asset.name}, which does not exist",
+            source=__title__,
+            category="subdomain takeover"),
+        target.id)
+
+
+async def tag_change(
+        store: BrokerClient,
+        node: Entity,
+        change: str,
+        rdtype: str,
+        value: str,
+        observed: datetime
+) -> EntityTag:
+    """
+    Record that the RDTYPE record VALUE of NODE was added or removed
+    (CHANGE) since the previous dump, as observed at OBSERVED.
+    """
+    return await store.create_entity_tag(
+        SimpleProperty(
+            f"dns_record_{change}",
+            f"{observed.isoformat(timespec='seconds')} {rdtype} {value}"),
+        node.id)
+
+
 async def dispatch(
         store: BrokerClient,
         base: Entity,
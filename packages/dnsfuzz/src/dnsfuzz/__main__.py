@@ -3,11 +3,16 @@ import common.cli_setup  # noqa: F401
 import sys
 import asyncio
 from argparse import ArgumentParser
-from oam_client import BrokerClient
 from termcolor import colored
 
-from common.output import print_error
+from common.output import print_error, add_output_arguments, open_output
+from common.store.client import (
+    add_store_arguments, open_store, LOCAL_SCHEME)
+from common.metrics import add_metrics_arguments, start_metrics, InstrumentedStore
+from common.profile import add_profile_arguments, start_profile
 from .service import FuzzDNSCommand
+from .rank import WordRanking, HitStats
+from .store import stored_fqdns
 
 
 def success_handler(
@@ -62,8 +67,7 @@ async def __async_main():
         "-w", "--wordlist", help="path to wordlist",
         required=True)
     parser.add_argument(
-        "-d", "--domain", help="target domain",
-        required=True)
+        "-d", "--domain", help="target domain")
     parser.add_argument(
         "-r", "--resolv", help="Path to the resolver configuration file",
         default="./resolve.conf")
@@ -73,6 +77,33 @@ async def __async_main():
     parser.add_argument(
         "-rd", "--delay", help="rate limiter delay between batches (in ms)",
         type=int, default=300)
+    parser.add_argument(
+        "--retries", help="attempts per query on timeout, SERVFAIL or "
+        "network error", type=int, default=3)
+    parser.add_argument(
+        "--retry-delay", help="base delay of the exponential backoff "
+        "between retries (ms)", type=int, default=200)
+    parser.add_argument(
+        "--walk", help="walk the NSEC/NSEC3 chain of a signed zone instead "
+        "of guessing names, NSEC3 hashes are cracked with the wordlist",
+        action="store_true")
+    parser.add_argument(
+        "--crack-processes", help="processes cracking NSEC3 hashes "
+        "(default: number of CPUs)", type=int, default=None)
+    parser.add_argument(
+        "--workers", help="processes sharing the wordlist, each one with "
+        "its own event loop and resolver, the rate limit is split between "
+        "them", type=int, default=1)
+    parser.add_argument(
+        "--rank", help="try the most probable words first, ranked by the "
+        "subdomains of a local asset store (--store sqlite:PATH) and by "
+        "--hit-stats", action="store_true")
+    parser.add_argument(
+        "--rank-only", help="print the ranked wordlist and exit",
+        action="store_true")
+    parser.add_argument(
+        "--hit-stats", help="SQLite database of the tries and hits of "
+        "each word, updated by every run")
     parser.add_argument(
         "--nocolor", help="disable colored output",
         action="store_true")
@@ -89,37 +120,101 @@ async def __async_main():
         "-s", "--silent", help="disable outputs",
         action="store_true")
 
+    add_output_arguments(parser)
+    add_store_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+
     config = parser.parse_args()
 
+    if config.domain is None and not config.rank_only:
+        parser.error("the following arguments are required: -d/--domain")
+
+    try:
+        start_metrics(config)
+        start_profile(config)
+    except (OSError, ValueError) as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    try:
+        store = InstrumentedStore(open_store(config.store, asynchronous=False))
+    except Exception as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    ranking = None
+    stats = None
     try:
-        store = BrokerClient("https://localhost", verify=False)
+        if config.hit_stats is not None:
+            stats = HitStats(config.hit_stats)
+
+        if config.rank or config.rank_only:
+            ranking = WordRanking()
+            if config.store.startswith(LOCAL_SCHEME):
+                local = open_store(config.store, asynchronous=False)
+                ranking.learn_names(stored_fqdns(local))
+            if stats is not None:
+                ranking.learn_stats(stats)
     except Exception as e:
         print_error(e, config.nocolor)
         sys.exit(1)
 
+    if config.rank_only:
+        try:
+            with open(config.wordlist) as words:
+                for word in ranking.rank(words):
+                    print(word)
+        except OSError as e:
+            print_error(e, config.nocolor)
+            sys.exit(1)
+        return
+
+    writer = open_output(config)
+
+    def on_success(domain: str):
+        if writer is None:
+            success_handler(
+                domain, config.nocolor, config.verbose, config.silent)
+        elif not config.silent:
+            writer.write({"domain": domain, "found": True})
+
+    def on_failure(domain: str):
+        if writer is None:
+            failure_handler(
+                domain, config.nocolor, config.verbose, config.silent)
+        elif config.verbose:
+            writer.write({"domain": domain, "found": False})
+
     try:
         fuzzer = FuzzDNSCommand(
             domain=config.domain,
             wordlist=config.wordlist,
-            on_success=(lambda d: success_handler(
-                d, config.nocolor,
-                config.verbose,
-                config.silent)),
-            on_failure=(lambda d: failure_handler(
-                d, config.nocolor,
-                config.verbose,
-                config.silent)),
+            on_success=on_success,
+            on_failure=on_failure,
             resolv=config.resolv,
             store=store,
             ratelimiter_batch=config.batch_size,
             ratelimiter_delay=config.delay,
-            disable_store=config.nostore
+            disable_store=config.nostore,
+            store_window=config.store_window,
+            retries=config.retries,
+            retry_delay=config.retry_delay,
+            walk=config.walk,
+            crack_processes=config.crack_processes,
+            workers=config.workers,
+            ranking=ranking,
+            stats=stats,
         )
     except Exception as e:
         print_error(e)
         sys.exit(1)
 
-    await fuzzer.run()
+    try:
+        await fuzzer.run()
+    finally:
+        if stats is not None:
+            stats.close()
 
 
 def main():
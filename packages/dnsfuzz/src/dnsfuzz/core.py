@@ -1,12 +1,14 @@
 from dataclasses import dataclass
 from dns.name import Name, from_text
-from dns.asyncresolver import Resolver as AsyncResolver
-from dns.resolver import Resolver as SyncResolver
-from typing import TextIO, Callable
+from dns.rdatatype import A, AAAA
+from dns.resolver import NXDOMAIN, NoAnswer
+from typing import TextIO, Callable, Awaitable
 from dns.exception import DNSException
 import asyncio
+from zlib import crc32
 
 from common.logger import getLogger
+from common.dns.resolve import ResilientResolver
 
 logger = getLogger(__name__)
 
@@ -15,32 +17,52 @@ logger = getLogger(__name__)
 class DNSFuzz:
     domain:         Name
     wordlist:       TextIO
-    resolver: AsyncResolver
-    on_success:     Callable[[Name], None]
-    on_failure:     Callable[[Name], None]
+    resolver:       ResilientResolver
+    on_success:     Callable[[Name], Awaitable[None]]
+    on_failure:     Callable[[Name], Awaitable[None]]
+    shard:          int = 0
+    shards:         int = 1
 
     async def does_domain_exists(self, domain: Name) -> bool:
-        logger.debug(f"does_domain_exists:{domain}")
+        logger.debug("does_domain_exists:%s", domain)
         try:
-            await self.resolver.resolve_name(domain)
-            logger.debug(f"does_domain_exists:{domain}:{True}")
-            return True
-        except DNSException:
-            logger.debug(f"does_domain_exists:{domain}:{False}")
-            return False
+            for rdtype in (A, AAAA):
+                try:
+                    await self.resolver.resolve(domain, rdtype)
+                    logger.debug("does_domain_exists:%s:%s", domain, True)
+                    return True
+                except NoAnswer:
+                    continue
+        except NXDOMAIN:
+            pass
+        except DNSException as e:
+            # Retries are spent, the subdomain may exist all the same
+            logger.warning(
+                f"does_domain_exists:{domain} unresolved: "
+                f"{type(e).__name__}")
         except Exception:
             raise
 
+        logger.debug("does_domain_exists:%s:%s", domain, False)
+        return False
+
     async def fuzz_domain(self, domain: Name):
         if await self.does_domain_exists(domain):
-            self.on_success(domain)
+            await self.on_success(domain)
         else:
-            self.on_failure(domain)
+            await self.on_failure(domain)
 
     async def fuzz(self):
         for line, word in enumerate(self.wordlist):
             word = word.strip()
-            logger.debug(f"fuzz:try word:{word}")
+
+            # Each worker of a sharded fuzz only tries its share of the
+            # wordlist, the hash is stable across processes
+            if self.shards > 1 \
+               and crc32(word.encode()) % self.shards != self.shard:
+                continue
+
+            logger.debug("fuzz:try word:%s", word)
 
             try:
                 subdomain = from_text(f"{word}.{self.domain}")
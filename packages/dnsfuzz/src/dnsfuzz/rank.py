@@ -0,0 +1,165 @@
+import time
+import sqlite3
+from collections import Counter
+from typing import Iterable
+from dns.name import from_text
+from dns.exception import DNSException
+from apex.core import is_apex
+
+from common.logger import getLogger
+
+logger = getLogger(__name__)
+
+# Weight of the stored subdomains against the hit statistics, in tries:
+# a word tried that many times is ranked by its own hit rate
+PRIOR_WEIGHT = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS words (
+    word     TEXT PRIMARY KEY,
+    tries    INTEGER NOT NULL,
+    hits     INTEGER NOT NULL,
+    last_hit REAL
+);
+"""
+
+
+class HitStats:
+    """
+    How many times each wordlist entry was tried and found by past
+    runs, kept in a SQLite database.
+    """
+
+    path: str
+    commit_every: int
+    db: sqlite3.Connection
+
+    def __init__(self, path: str, commit_every: int = 1000):
+        """
+        Instanciate the HitStats.
+
+        :param path: path of the SQLite database, created when missing
+        :param commit_every: number of tries grouped in a transaction
+        :raises ValueError: when parameters are impossible values
+        :raises sqlite3.Error: when the database cannot be opened
+        """
+        if commit_every < 1:
+            raise ValueError(
+                "hit statistics commit batch must be greather than 0")
+
+        self.path = path
+        self.commit_every = commit_every
+        self.pending = 0
+
+        try:
+            self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+        except sqlite3.Error:
+            raise
+
+    def load(self) -> dict[str, tuple[int, int]]:
+        """
+        Return the (tries, hits) of every word tried so far.
+        """
+        return {
+            word: (tries, hits) for word, tries, hits in self.db.execute(
+                "SELECT word, tries, hits FROM words")}
+
+    def record(self, word: str, found: bool):
+        if self.pending == 0:
+            self.db.execute("BEGIN")
+
+        self.db.execute(
+            "INSERT INTO words (word, tries, hits, last_hit) "
+            "VALUES (?, 1, ?, ?) "
+            "ON CONFLICT (word) DO UPDATE SET "
+            "tries = tries + 1, hits = hits + excluded.hits, "
+            "last_hit = coalesce(excluded.last_hit, last_hit)",
+            (word, int(found), time.time() if found else None))
+
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        if self.pending > 0:
+            self.db.execute("COMMIT")
+            self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
+        logger.debug("close:%s", self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class WordRanking:
+    """
+    Order a wordlist by the estimated probability of each entry to be a
+    subdomain.
+
+    The prior of a word is the share of the stored domains having it as
+    a subdomain label. It is refined by the hit rate of the word in past
+    runs, weighted by the number of tries.
+    """
+
+    labels: Counter[str]
+    parents: int
+    stats: dict[str, tuple[int, int]]
+
+    def __init__(self):
+        self.labels = Counter()
+        self.parents = 0
+        self.stats = {}
+
+    def learn_names(self, fqdns: Iterable[str]):
+        """
+        Count the subdomain labels of FQDNS, e.g. the FQDN entities of
+        the asset store. Each label counts once per parent domain.
+        """
+        pairs: set[tuple[str, str]] = set()
+        parents: set[str] = set()
+
+        for fqdn in fqdns:
+            try:
+                domain = from_text(fqdn)
+            except DNSException:
+                continue
+
+            # Labels of the registered domain and above are not subdomains
+            while len(domain) > 2 and not is_apex(domain):
+                parent = domain.parent()
+                label = domain[0].decode("ascii", errors="replace").lower()
+                pairs.add((label, parent.to_text(True).lower()))
+                parents.add(parent.to_text(True).lower())
+                domain = parent
+
+        self.labels.update(label for label, _ in pairs)
+        self.parents += len(parents)
+        logger.debug(
+            "learn_names:%s labels under %s domains",
+            len(self.labels), self.parents)
+
+    def learn_stats(self, stats: HitStats):
+        self.stats.update(stats.load())
+
+    def probability(self, word: str) -> float:
+        word = word.lower()
+        prior = (self.labels[word] + 1) / (self.parents + 2)
+        tries, hits = self.stats.get(word, (0, 0))
+        return (hits + PRIOR_WEIGHT * prior) / (tries + PRIOR_WEIGHT)
+
+    def rank(self, words: Iterable[str]) -> list[str]:
+        """
+        Return the entries of WORDS, stripped and without duplicates, most
+        probable first. Entries as probable keep the wordlist order.
+        """
+        unique = list(dict.fromkeys(filter(None, (w.strip() for w in words))))
+        return sorted(unique, key=self.probability, reverse=True)
@@ -1,6 +1,7 @@
+import dns.flags
 from dns import name
-from typing import Callable
-from asyncio import Task, gather
+from typing import Callable, Optional
+from asyncio import Task, gather, to_thread
 from oam_client import BrokerClient
 from dns.exception import DNSException
 from dns.asyncresolver import Resolver as AsyncResolver
@@ -8,9 +9,15 @@ from dns.resolver import Resolver as SyncResolver
 
 from common.logger import getLogger
 from common.ratelimiter import RateLimiter
+from common.metrics import STAGE_ITEMS
+from common.store.client import StoreWindow, DEFAULT_WINDOW
 from common.dns.utils import ensure_domain
+from common.dns.resolve import ResilientResolver, RetryPolicy
 
 from .core import DNSFuzz
+from .walk import DNSWalk, ZoneNotSigned
+from .shard import ShardedFuzz
+from .rank import WordRanking, HitStats
 from .store import store_fqdn
 
 logger = getLogger(__name__)
@@ -24,8 +31,14 @@ class FuzzDNSCommand:
     IS_ASYNC = True
 
     core: DNSFuzz
+    walker: Optional[DNSWalk]
+    sharded: Optional[ShardedFuzz]
+    stats: Optional[HitStats]
+    crack_processes: Optional[int]
+    resilient: ResilientResolver
     ratelimiter: RateLimiter
     store: BrokerClient
+    window: StoreWindow
 
     def __init__(
             self,
@@ -38,6 +51,14 @@ class FuzzDNSCommand:
             ratelimiter_batch: int = 5,
             disable_store: bool = False,
             resolv: str = "/etc/resolv.conf",
+            store_window: int = DEFAULT_WINDOW,
+            retries: int = 3,
+            retry_delay: int = 200,
+            walk: bool = False,
+            crack_processes: Optional[int] = None,
+            workers: int = 1,
+            ranking: Optional[WordRanking] = None,
+            stats: Optional[HitStats] = None,
     ):
         """
         Instanciate the DNSFuzzService.
@@ -51,9 +72,23 @@ class FuzzDNSCommand:
         :param ratelimiter_delay: delay between each requests batch
         :param ratelimiter_batch: size of each requests batch
         :param disable_store: disable asset store
+        :param store_window: max asset store writes in flight
+        :param retries: attempts per query on timeout, SERVFAIL or
+            network error
+        :param retry_delay: base delay of the backoff between retries (ms)
+        :param walk: enumerate the DNSSEC chain of a signed zone instead
+            of guessing names, NSEC3 hashes are cracked with the wordlist
+        :param crack_processes: size of the NSEC3 cracking process pool,
+            the number of CPUs by default
+        :param workers: processes sharing the wordlist and the rate
+            limit, each one with its own event loop and resolver
+        :param ranking: try the wordlist entries most probable first
+        :param stats: hit statistics updated with every try, for the
+            ranking of the next runs
         :raises InvalidDomain: when domain cannot be turned into a Name object
         :raises OSError: when wordlist cannot be opened
-        :raises ValueError: when rate limiter receive impossible values
+        :raises ValueError: when rate limiter receive impossible values,
+            or when workers is combined with walk
         """
         try:
             self.domain = name.from_text(domain)
@@ -65,6 +100,11 @@ class FuzzDNSCommand:
         except OSError as e:
             raise e
 
+        words = self.wordlist
+        if ranking is not None:
+            words = ranking.rank(self.wordlist)
+            logger.debug("rank:%s words", len(words))
+
         try:
             self.resolver = AsyncResolver(
                 filename=resolv,
@@ -72,26 +112,75 @@ class FuzzDNSCommand:
         except DNSException:
             raise
 
-        def success_handler(domain: name.Name):
+        try:
+            self.window = StoreWindow(store_window)
+        except ValueError:
+            raise
+
+        try:
+            policy = RetryPolicy(
+                attempts=retries,
+                base_delay=retry_delay / 1000.0)
+        except ValueError:
+            raise
+
+        self.resilient = ResilientResolver(self.resolver, policy, "dnsfuzz")
+
+        async def success_handler(domain: name.Name):
             domain_name = domain.to_text(True)
-            logger.debug(f"find:{domain_name}")
+            logger.debug("find:%s", domain_name)
+            STAGE_ITEMS.inc(tool="dnsfuzz", stage="found")
 
+            # The store client is blocking, writes run in worker
+            # threads so they overlap with the queries
             if not disable_store:
-                store_fqdn(store, domain)
+                await self.window.submit(to_thread(store_fqdn, store, domain))
 
             on_success(domain_name)
 
-        def failure_handler(domain: name.Name):
+        async def failure_handler(domain: name.Name):
             domain_name = domain.to_text(True)
-            logger.debug(f"try:{domain_name}")
+            logger.debug("try:%s", domain_name)
+            STAGE_ITEMS.inc(tool="dnsfuzz", stage="not_found")
             on_failure(domain_name)
 
+        # Only guessed names are counted, the ones a walk finds were
+        # never tried
+        async def try_handler(domain: name.Name, found: bool):
+            if self.stats is not None:
+                self.stats.record(
+                    domain.relativize(self.domain).to_text(), found)
+            if found:
+                await success_handler(domain)
+            else:
+                await failure_handler(domain)
+
+        self.try_handler = try_handler
+        self.stats = stats
+        self.words = words
         self.core = DNSFuzz(
             self.domain,
-            self.wordlist,
-            self.resolver,
-            success_handler,
-            failure_handler)
+            words,
+            self.resilient,
+            lambda domain: try_handler(domain, True),
+            lambda domain: try_handler(domain, False))
+
+        self.sharded = None
+        if workers != 1:
+            if walk:
+                raise ValueError("workers cannot be combined with walk")
+
+            try:
+                self.sharded = ShardedFuzz(
+                    self.domain,
+                    wordlist if ranking is None else words,
+                    workers,
+                    self.resolver,
+                    policy,
+                    ratelimiter_batch,
+                    ratelimiter_delay)
+            except ValueError:
+                raise
 
         try:
             self.ratelimiter = RateLimiter(
@@ -100,17 +189,58 @@ class FuzzDNSCommand:
         except ValueError:
             raise
 
+        self.walker = None
+        self.crack_processes = crack_processes
+        if walk:
+            try:
+                walk_resolver = AsyncResolver(
+                    filename=resolv,
+                    configure=True)
+            except DNSException:
+                raise
+
+            # NSEC3 records only come along with DNSSEC aware answers
+            walk_resolver.use_edns(0, dns.flags.DO, 1232)
+            self.walker = DNSWalk(
+                self.domain,
+                ResilientResolver(walk_resolver, policy, "dnsfuzz"),
+                success_handler,
+                ratelimiter=self.ratelimiter)
+
         self.store = store
 
     async def run(self):
         try:
-            await ensure_domain(self.domain, self.resolver)
+            await self._run()
+        finally:
+            # Long-running callers build a command per domain
+            self.wordlist.close()
+            if self.stats is not None:
+                self.stats.commit()
+
+    async def _run(self):
+        try:
+            await ensure_domain(self.domain, self.resilient)
         except DNSException:
             raise
 
+        if self.walker is not None:
+            try:
+                await self.walker.walk(self.words, self.crack_processes)
+                await self.window.join()
+                return
+            except ZoneNotSigned as e:
+                logger.warning(f"walk:{e}, guessing names instead")
+
+        if self.sharded is not None:
+            await self.sharded.fuzz(self.try_handler)
+            await self.window.join()
+            return
+
         tasks: list[Task] = []
         async for sub in self.core.fuzz():
             await self.ratelimiter.try_acquire_async()
             tasks.append(sub)
 
         await gather(*tasks)
+        await self.window.join()
@@ -0,0 +1,279 @@
+import time
+import queue
+import asyncio
+import multiprocessing
+from dataclasses import dataclass
+from typing import Callable, Awaitable, Union
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from dns.name import Name, from_text
+from dns.asyncresolver import Resolver
+
+from common.logger import getLogger
+from common.ratelimiter import RateLimiter
+from common.dns.resolve import ResilientResolver, RetryPolicy
+
+from .core import DNSFuzz
+
+logger = getLogger(__name__)
+
+# Results are sent to the parent in batches of REPORT_SIZE, at least
+# every REPORT_DELAY (s)
+REPORT_SIZE = 256
+REPORT_DELAY = 0.2
+
+Report = list[tuple[str, bool]]
+
+
+def split_rate(batch: int, delay: int, workers: int) -> list[tuple[int, int]]:
+    """
+    Split a rate of BATCH requests per DELAY (ms) into the (batch, delay)
+    rates of WORKERS, summing up to the same rate.
+    """
+    if batch >= workers:
+        return [
+            (batch // workers + (1 if index < batch % workers else 0), delay)
+            for index in range(workers)]
+
+    # Fewer requests than workers per batch, each one waits longer
+    return [(1, delay * workers // batch)] * workers
+
+
+@dataclass
+class ResolverConfig:
+    """
+    The settings of a resolver, sent to the workers to build theirs.
+    """
+
+    nameservers:    list[str]
+    port:           int
+    timeout:        float
+    lifetime:       float
+
+    @classmethod
+    def of(cls, resolver: Resolver) -> "ResolverConfig":
+        return cls(
+            [str(nameserver) for nameserver in resolver.nameservers],
+            resolver.port,
+            resolver.timeout,
+            resolver.lifetime)
+
+    def build(self) -> Resolver:
+        resolver = Resolver(configure=False)
+        resolver.nameservers = self.nameservers
+        resolver.port = self.port
+        resolver.timeout = self.timeout
+        resolver.lifetime = self.lifetime
+        return resolver
+
+
+class _Reporter:
+    """
+    Buffer the results of a worker and send them to the parent in batches.
+    """
+
+    def __init__(self, results: multiprocessing.Queue):
+        self.results = results
+        self.buffer: Report = []
+        self.flushed = time.monotonic()
+
+    def add(self, domain: Name, found: bool):
+        self.buffer.append((domain.to_text(True), found))
+        if len(self.buffer) >= REPORT_SIZE \
+           or time.monotonic() - self.flushed > REPORT_DELAY:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) > 0:
+            self.results.put(self.buffer)
+            self.buffer = []
+        self.flushed = time.monotonic()
+
+
+def _init_worker(results: multiprocessing.Queue):
+    global _results
+    _results = results
+
+
+async def _fuzz(
+        domain: str,
+        wordlist: Union[str, list[str]],
+        index: int,
+        workers: int,
+        config: ResolverConfig,
+        policy: RetryPolicy,
+        rate: tuple[int, int],
+        reporter: _Reporter
+) -> int:
+    resolver = ResilientResolver(config.build(), policy, "dnsfuzz")
+    ratelimiter = RateLimiter(*rate)
+    found = 0
+
+    async def on_success(domain: Name):
+        nonlocal found
+        found += 1
+        reporter.add(domain, True)
+
+    async def on_failure(domain: Name):
+        reporter.add(domain, False)
+
+    # A ranked wordlist is sent as is, its order would be lost otherwise
+    words = open(wordlist) if isinstance(wordlist, str) \
+        else nullcontext(wordlist)
+
+    with words as words:
+        core = DNSFuzz(
+            from_text(domain),
+            words,
+            resolver,
+            on_success,
+            on_failure,
+            index,
+            workers)
+
+        tasks: list[asyncio.Task] = []
+        async for sub in core.fuzz():
+            await ratelimiter.try_acquire_async()
+            tasks.append(sub)
+
+        await asyncio.gather(*tasks)
+    return found
+
+
+def _fuzz_shard(
+        domain: str,
+        wordlist: Union[str, list[str]],
+        index: int,
+        workers: int,
+        config: ResolverConfig,
+        policy: RetryPolicy,
+        rate: tuple[int, int]
+) -> int:
+    reporter = _Reporter(_results)
+    try:
+        return asyncio.run(_fuzz(
+            domain, wordlist, index, workers, config, policy, rate, reporter))
+    finally:
+        # The parent stops reading once every worker sent its None
+        reporter.flush()
+        _results.put(None)
+
+
+class ShardedFuzz:
+    """
+    Fuzz a domain across WORKERS processes, each one resolving the
+    wordlist entries of its shard on its own event loop.
+
+    The workers only resolve names, the results are sent back to the
+    parent so the store writes and the output stay in one process.
+    """
+
+    domain: Name
+    wordlist: Union[str, list[str]]
+    workers: int
+    resolver: Resolver
+    policy: RetryPolicy
+    rates: list[tuple[int, int]]
+
+    def __init__(
+            self,
+            domain: Name,
+            wordlist: Union[str, list[str]],
+            workers: int,
+            resolver: Resolver,
+            policy: RetryPolicy,
+            ratelimiter_batch: int,
+            ratelimiter_delay: int
+    ):
+        """
+        Instanciate the ShardedFuzz.
+
+        :param domain: the target domain
+        :param wordlist: the path of the wordlist file, or its ranked
+            entries
+        :param workers: number of worker processes
+        :param resolver: the resolver the ones of the workers are copied
+            from, when the fuzz starts
+        :param policy: the retry policy of the workers
+        :param ratelimiter_batch: size of each requests batch, shared by
+            the workers
+        :param ratelimiter_delay: delay between each requests batch
+        :raises ValueError: when workers or the rate limiter receive
+            impossible values
+        """
+        if workers < 1:
+            raise ValueError("workers must be greather than 0")
+
+        if ratelimiter_batch < 1:
+            raise ValueError(
+                "rate limiter's batch size must be greather than 0")
+
+        self.domain = domain
+        self.wordlist = wordlist
+        self.workers = workers
+        self.resolver = resolver
+        self.policy = policy
+        self.rates = split_rate(ratelimiter_batch, ratelimiter_delay, workers)
+
+    async def _collect(self, results: multiprocessing.Queue):
+        done = 0
+        while done < self.workers:
+            try:
+                report = await asyncio.to_thread(
+                    results.get, True, REPORT_DELAY)
+            except queue.Empty:
+                continue
+
+            if report is None:
+                done += 1
+                continue
+
+            for domain, found in report:
+                yield from_text(domain), found
+
+    async def fuzz(
+            self,
+            on_result: Callable[[Name, bool], Awaitable[None]]
+    ) -> int:
+        """
+        Run the workers, and call ON_RESULT with each name and whether it
+        exists, in the parent process.
+
+        :returns: number of names found
+        :raises Exception: the first error of a worker
+        """
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        config = ResolverConfig.of(self.resolver)
+
+        # Workers are spawned, forking a process running threads and an
+        # event loop is unsafe
+        with ProcessPoolExecutor(
+                self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(results,)) as pool:
+            shards = asyncio.gather(*[
+                loop.run_in_executor(
+                    pool, _fuzz_shard, self.domain.to_text(), self.wordlist,
+                    index, self.workers, config, self.policy,
+                    self.rates[index])
+                for index in range(self.workers)])
+
+            async def collect():
+                async for domain, found in self._collect(results):
+                    await on_result(domain, found)
+
+            collector = asyncio.create_task(collect())
+            try:
+                found = await shards
+            except BaseException:
+                collector.cancel()
+                raise
+            await collector
+
+        logger.debug(
+            "fuzz:%s:%s names found by %s workers",
+            self.domain, sum(found), self.workers)
+        return sum(found)
@@ -1,9 +1,13 @@
+from typing import Iterator
 from dns.name import Name
+from asset_model import AssetType
 from asset_model import FQDN
 from asset_model import SimpleRelation
 from oam_client import BrokerClient
 from apex.core import is_apex
 
+from common.store.local import LocalStore, load_asset
+
 __parents: set[Name] = set()
 
 
@@ -23,3 +27,12 @@ def store_fqdn(store: BrokerClient, domain: Name):
     parent = store.create_entity(FQDN(domain.to_text(True)))
     store.create_edge(SimpleRelation("node"), parent.id, child.id)
     store_fqdn(store, domain)
+
+
+def stored_fqdns(local: LocalStore) -> Iterator[str]:
+    """
+    Stream the FQDN entities of LOCAL, the subdomains found so far.
+    """
+    for _, etype, content in local.rows("entities"):
+        if etype == AssetType.FQDN.value:
+            yield load_asset(etype, content).name
@@ -0,0 +1,264 @@
+import base64
+import bisect
+import asyncio
+import secrets
+import multiprocessing
+from itertools import batched
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Iterable, Optional
+from dns.name import Name, from_text
+from dns.dnssec import nsec3_hash
+from dns.rdatatype import A, NSEC, NSEC3, NSEC3PARAM, RdataType
+from dns.resolver import NXDOMAIN, NoAnswer, Answer
+from dns.exception import DNSException
+
+from common.logger import getLogger
+from common.metrics import STAGE_ITEMS
+from common.ratelimiter import RateLimiter
+from common.dns.resolve import ResilientResolver
+
+logger = getLogger(__name__)
+
+# Words hashed by a worker process per task
+CRACK_CHUNK = 2000
+
+# Queries sent at once to fill the gaps of the NSEC3 chain
+PROBES = 16
+
+
+class ZoneNotSigned(DNSException):
+    """The zone has neither an NSEC nor an NSEC3 chain to walk."""
+
+
+@dataclass
+class NSEC3Chain:
+    """
+    The NSEC3 records seen so far, as a ring of base32hex hashes.
+    """
+
+    algorithm:  int
+    iterations: int
+    salt:       bytes
+    links:      dict[str, str] = field(default_factory=dict)
+    owners:     list[str] = field(default_factory=list)
+
+    def add(self, owner: str, next: str):
+        if owner not in self.links:
+            bisect.insort(self.owners, owner)
+        self.links[owner] = next
+
+    def covers(self, digest: str) -> bool:
+        """
+        Tell if DIGEST is an owner hash or falls between an owner hash
+        and its next one.
+        """
+        if len(self.owners) == 0:
+            return False
+
+        # The owner before DIGEST, index -1 is the record wrapping around
+        owner = self.owners[bisect.bisect_right(self.owners, digest) - 1]
+        next = self.links[owner]
+        if owner < next:
+            return owner <= digest < next
+        return digest >= owner or digest < next
+
+    def complete(self) -> bool:
+        return len(self.links) > 0 \
+            and all(next in self.links for next in self.links.values())
+
+
+def _init_cracker(zone: str, chain: NSEC3Chain):
+    global _zone, _chain, _hashes
+    _zone, _chain = zone, chain
+
+    # The next hashes of an incomplete chain are names of the zone too
+    _hashes = set(chain.links) | set(chain.links.values())
+
+
+def _crack(words: tuple[str, ...]) -> list[str]:
+    found = []
+    for word in words:
+        name = f"{word}.{_zone}"
+        digest = nsec3_hash(name, _chain.salt, _chain.iterations,
+                            _chain.algorithm)
+        if digest in _hashes:
+            found.append(name)
+    return found
+
+
+@dataclass
+class DNSWalk:
+    domain:         Name
+    resolver:       ResilientResolver
+    on_success:     Callable[[Name], Awaitable[None]]
+    max_queries:    int = 10000
+    ratelimiter:    Optional[RateLimiter] = None
+
+    async def _resolve(self, qname: Name, rdtype: RdataType) -> Answer:
+        if self.ratelimiter is not None:
+            await self.ratelimiter.try_acquire_async()
+        return await self.resolver.resolve(qname, rdtype)
+
+    async def walk(
+            self,
+            wordlist: Iterable[str],
+            processes: Optional[int] = None
+    ) -> int:
+        """
+        Enumerate the names of the zone from its DNSSEC chain.
+
+        An NSEC chain is followed name by name. The hashes of an NSEC3
+        chain are collected, then matched against the WORDLIST entries
+        across a pool of PROCESSES.
+
+        :returns: the number of names found
+        :raises ZoneNotSigned: when there is no chain to walk
+        """
+        try:
+            await self._resolve(self.domain, NSEC)
+            return await self.walk_nsec()
+        except (NoAnswer, NXDOMAIN):
+            pass
+
+        try:
+            answer = await self._resolve(self.domain, NSEC3PARAM)
+        except (NoAnswer, NXDOMAIN):
+            raise ZoneNotSigned(f"{self.domain} is not signed")
+
+        params = answer[0]
+        chain = NSEC3Chain(params.algorithm, params.iterations, params.salt)
+        await self.collect_nsec3(chain)
+        return await self.crack(chain, wordlist, processes)
+
+    async def walk_nsec(self) -> int:
+        """
+        Follow the NSEC chain from the apex until it loops back.
+        """
+        found = 0
+        current = self.domain
+        seen = {self.domain}
+
+        for _ in range(self.max_queries):
+            try:
+                answer = await self._resolve(current, NSEC)
+            except DNSException as e:
+                logger.warning(f"walk_nsec:chain broken at {current}: {e}")
+                break
+
+            next = answer[0].next
+            if next in seen or not next.is_subdomain(self.domain):
+                break
+
+            # Online signers answer with made up "\000." successors
+            if next.labels[0] == b"\x00":
+                logger.warning(
+                    f"walk_nsec:{self.domain} uses minimally covering NSEC "
+                    f"records, names cannot be walked")
+                break
+
+            seen.add(next)
+            current = next
+            if next.labels[0] == b"*":
+                continue
+
+            STAGE_ITEMS.inc(tool="dnsfuzz", stage="nsec")
+            found += 1
+            await self.on_success(next)
+
+        logger.debug("walk_nsec:%s:%s names", self.domain, found)
+        return found
+
+    async def _probe(self, chain: NSEC3Chain, qname: Name):
+        try:
+            answer = await self._resolve(qname, A)
+            responses = [answer.response]
+        except NXDOMAIN as e:
+            responses = list(e.responses().values())
+        except NoAnswer as e:
+            responses = [e.response()]
+        except DNSException as e:
+            logger.debug("collect_nsec3:%s:%s", qname, e)
+            return
+
+        for response in responses:
+            for rrset in response.authority:
+                if rrset.rdtype != NSEC3:
+                    continue
+                owner = rrset.name.labels[0].decode("ascii").upper()
+                for rdata in rrset:
+                    next = base64.b32hexencode(rdata.next).decode("ascii")
+                    chain.add(owner, next.rstrip("="))
+
+    async def collect_nsec3(self, chain: NSEC3Chain):
+        """
+        Fill CHAIN with the NSEC3 records proving random names do not
+        exist. A name is only queried when its hash is not covered yet,
+        so every query reveals a new record.
+        """
+        zone = self.domain.to_text()
+        queries = 0
+
+        while not chain.complete() and queries < self.max_queries:
+            probes: list[Name] = []
+            # The last gaps of the ring are narrow, give up on hashes
+            # no random name lands in
+            for _ in range(PROBES * 1000):
+                qname = f"{secrets.token_hex(8)}.{zone}"
+                digest = nsec3_hash(
+                    qname, chain.salt, chain.iterations, chain.algorithm)
+                if not chain.covers(digest):
+                    probes.append(from_text(qname))
+                if len(probes) == PROBES:
+                    break
+
+            if len(probes) == 0:
+                break
+
+            await asyncio.gather(*[self._probe(chain, q) for q in probes])
+            queries += len(probes)
+            logger.debug(
+                "collect_nsec3:%s:%s hashes after %s queries",
+                self.domain, len(chain.links), queries)
+
+        if not chain.complete():
+            logger.warning(
+                f"collect_nsec3:{len(chain.links)} hashes of {self.domain} "
+                f"collected, the chain is still incomplete after "
+                f"{queries} queries")
+
+    async def crack(
+            self,
+            chain: NSEC3Chain,
+            wordlist: Iterable[str],
+            processes: Optional[int] = None
+    ) -> int:
+        """
+        Hash every WORDLIST entry under the zone with the parameters of
+        CHAIN, across a pool of PROCESSES, and report the matches.
+        """
+        loop = asyncio.get_running_loop()
+        words = (word.strip() for word in wordlist)
+        found = 0
+
+        # Workers are spawned, forking a process running threads and an
+        # event loop is unsafe
+        with ProcessPoolExecutor(
+                processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_cracker,
+                initargs=(self.domain.to_text(), chain)) as pool:
+            tasks = [
+                loop.run_in_executor(pool, _crack, chunk)
+                for chunk in batched(filter(None, words), CRACK_CHUNK)]
+
+            for task in asyncio.as_completed(tasks):
+                for name in await task:
+                    STAGE_ITEMS.inc(tool="dnsfuzz", stage="nsec3")
+                    found += 1
+                    await self.on_success(from_text(name))
+
+        logger.debug(
+            "crack:%s:%s of %s hashes cracked",
+            self.domain, found, len(chain.links))
+        return found
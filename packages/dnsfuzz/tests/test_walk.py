@@ -0,0 +1,62 @@
+from dns.dnssec import nsec3_hash
+
+from dnsfuzz.walk import NSEC3Chain, _init_cracker, _crack
+
+SALT = bytes.fromhex("aabbccdd")
+ITERATIONS = 1
+
+
+def chain(*links: tuple[str, str]) -> NSEC3Chain:
+    ring = NSEC3Chain(1, ITERATIONS, SALT)
+    for owner, next in links:
+        ring.add(owner, next)
+    return ring
+
+
+def digest(name: str) -> str:
+    return nsec3_hash(name, SALT, ITERATIONS, 1)
+
+
+def test_covers():
+    ring = chain(("BB", "DD"), ("DD", "FF"), ("FF", "BB"))
+
+    assert ring.owners == ["BB", "DD", "FF"]
+    assert ring.covers("BB")
+    assert ring.covers("CC")
+    assert ring.covers("EE")
+
+
+def test_covers_wrap_around():
+    ring = chain(("BB", "DD"), ("DD", "FF"), ("FF", "BB"))
+
+    # The last record covers the hashes after it and before the first
+    assert ring.covers("GG")
+    assert ring.covers("AA")
+
+
+def test_covers_gaps():
+    ring = chain(("BB", "DD"))
+
+    assert not chain().covers("CC")
+    assert ring.covers("CC")
+    assert not ring.covers("DD")
+    assert not ring.covers("EE")
+    assert not ring.covers("AA")
+
+
+def test_complete():
+    ring = chain(("BB", "DD"))
+    assert not chain().complete()
+    assert not ring.complete()
+
+    ring.add("DD", "BB")
+    assert ring.complete()
+
+
+def test_crack():
+    www, mail = digest("www.example.test."), digest("mail.example.test.")
+    _init_cracker("example.test.", chain((www, mail)))
+
+    # mail is only known as the next hash of www
+    assert _crack(("www", "mail", "ftp")) == [
+        "www.example.test.", "mail.example.test."]
@@ -0,0 +1 @@
+__title__ = "ptrsweep"
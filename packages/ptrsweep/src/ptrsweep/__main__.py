@@ -0,0 +1,201 @@
+import common.cli_setup  # noqa: F401
+
+import sys
+import asyncio
+from itertools import chain
+from argparse import ArgumentParser
+from termcolor import colored
+
+from common.output import print_error, add_output_arguments, open_output
+from common.store.client import (
+    add_store_arguments, open_store, LOCAL_SCHEME)
+from common.metrics import add_metrics_arguments, start_metrics, InstrumentedStore
+from common.profile import add_profile_arguments, start_profile
+from .cache import PTRCache
+from .store import stored_addresses
+from .service import SweepPTRCommand
+
+
+def success_handler(
+        address: str,
+        names: list[str],
+        nocolor: bool = False,
+        silent: bool = False
+):
+    if silent:
+        return
+
+    if not nocolor:
+        address = colored(address, 'green', attrs=['bold'])
+        names = [colored(name, 'blue') for name in names]
+
+    print(address, " ".join(names))
+
+
+def failure_handler(
+        address: str,
+        nocolor: bool = False,
+        verbose: bool = False
+):
+    if not verbose:
+        return
+
+    prefix = "NO PTR: "
+    if not nocolor:
+        prefix = colored(prefix, 'light_grey', attrs=['bold'])
+        address = colored(address, 'light_grey')
+
+    print(prefix + address)
+
+
+async def __async_main():
+    parser = ArgumentParser(
+        prog="ptrsweep",
+        description="Sweep IP addresses and networks with reverse DNS "
+        "lookups.")
+    parser.add_argument(
+        "targets", help="IP addresses or CIDR networks",
+        nargs="*")
+    parser.add_argument(
+        "-f", "--file", help="file of IP addresses or CIDR networks, one "
+        "per line, - for stdin")
+    parser.add_argument(
+        "--from-store", help="sweep the IP addresses of the local asset "
+        "store given by --store (sqlite:PATH)",
+        action="store_true")
+    parser.add_argument(
+        "-n", "--neighbors", help="sweep the /N network around each IPv4 "
+        "address, e.g. 24", type=int, default=None)
+    parser.add_argument(
+        "-r", "--resolv", help="Path to the resolver configuration file",
+        default="./resolve.conf")
+    parser.add_argument(
+        "-c", "--concurrency", help="max reverse lookups in flight",
+        type=int, default=256)
+    parser.add_argument(
+        "-rb", "--batch-size", help="rate limiter batch size",
+        type=int, default=500)
+    parser.add_argument(
+        "-rd", "--delay", help="rate limiter delay between batches (in ms)",
+        type=int, default=1000)
+    parser.add_argument(
+        "-t", "--timeout", help="DNS query timeout per attempt (ms)",
+        type=int, default=2000)
+    parser.add_argument(
+        "--retries", help="attempts per query on timeout, SERVFAIL or "
+        "network error", type=int, default=2)
+    parser.add_argument(
+        "--retry-delay", help="base delay of the exponential backoff "
+        "between retries (ms)", type=int, default=200)
+    parser.add_argument(
+        "--cache", help="SQLite database of the lookups already done, "
+        "their addresses are skipped by the next sweeps")
+    parser.add_argument(
+        "--cache-ttl", help="time a cached lookup is trusted for (s)",
+        type=int, default=86400)
+    parser.add_argument(
+        "--nocolor", help="disable colored output",
+        action="store_true")
+    parser.add_argument(
+        "--nostore", help="disable asset store",
+        action="store_true")
+
+    output_group = parser.add_mutually_exclusive_group()
+
+    output_group.add_argument(
+        "-v", "--verbose", help="show addresses without a name",
+        action="store_true")
+    output_group.add_argument(
+        "-s", "--silent", help="disable outputs",
+        action="store_true")
+
+    add_output_arguments(parser)
+    add_store_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+
+    config = parser.parse_args()
+
+    try:
+        start_metrics(config)
+        start_profile(config)
+    except (OSError, ValueError) as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    try:
+        store = InstrumentedStore(open_store(config.store))
+    except Exception as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    targets = [config.targets]
+    try:
+        if config.file == "-":
+            targets.append(sys.stdin)
+        elif config.file is not None:
+            targets.append(open(config.file))
+
+        if config.from_store:
+            if not config.store.startswith(LOCAL_SCHEME):
+                raise ValueError(
+                    "--from-store needs a local asset store (sqlite:PATH)")
+            local = open_store(config.store, asynchronous=False)
+            targets.append(stored_addresses(local))
+
+        cache = None
+        if config.cache is not None:
+            cache = PTRCache(config.cache, config.cache_ttl)
+    except Exception as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    writer = open_output(config)
+
+    def on_success(address: str, names: list[str]):
+        if writer is None:
+            success_handler(address, names, config.nocolor, config.silent)
+        elif not config.silent:
+            writer.write({"address": address, "names": names})
+
+    def on_failure(address: str):
+        if writer is None:
+            failure_handler(address, config.nocolor, config.verbose)
+        elif config.verbose:
+            writer.write({"address": address, "names": []})
+
+    try:
+        cmd = SweepPTRCommand(
+            targets=chain.from_iterable(targets),
+            store=store,
+            on_success=on_success,
+            on_failure=on_failure,
+            neighbors=config.neighbors,
+            concurrency=config.concurrency,
+            ratelimiter_batch=config.batch_size,
+            ratelimiter_delay=config.delay,
+            resolv=config.resolv,
+            timeout=config.timeout,
+            retries=config.retries,
+            retry_delay=config.retry_delay,
+            cache=cache,
+            disable_store=config.nostore,
+            store_window=config.store_window,
+        )
+    except Exception as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    try:
+        await cmd.run()
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def main():
+    asyncio.run(__async_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import json
+import time
+import sqlite3
+from typing import Optional
+
+from common.logger import getLogger
+
+logger = getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ptr (
+    address     TEXT PRIMARY KEY,
+    names       TEXT NOT NULL,
+    resolved_at REAL NOT NULL
+);
+"""
+
+
+class PTRCache:
+    """
+    Reverse lookups already answered, kept in a SQLite database.
+
+    Addresses without a PTR record are remembered too, a sweep run
+    again only queries the addresses it has never seen, the ones older
+    than MAX_AGE and the ones whose lookup failed.
+    """
+
+    path: str
+    max_age: float
+    commit_every: int
+    db: sqlite3.Connection
+
+    def __init__(
+            self,
+            path: str = ":memory:",
+            max_age: float = 86400.0,
+            commit_every: int = 1000
+    ):
+        """
+        Instanciate the PTRCache.
+
+        :param path: path of the SQLite database, created when missing,
+            the cache only lasts for the process by default
+        :param max_age: seconds a lookup is trusted for
+        :param commit_every: number of lookups grouped in a transaction
+        :raises ValueError: when parameters are impossible values
+        :raises sqlite3.Error: when the database cannot be opened
+        """
+        if max_age < 0:
+            raise ValueError(
+                "cache max age must be greather or equal to 0")
+
+        if commit_every < 1:
+            raise ValueError(
+                "cache commit batch must be greather than 0")
+
+        self.path = path
+        self.max_age = max_age
+        self.commit_every = commit_every
+        self.pending = 0
+
+        try:
+            self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+        except sqlite3.Error:
+            raise
+
+    def get(self, address: str) -> Optional[list[str]]:
+        """
+        Return the names cached for ADDRESS, None when it has to be
+        looked up.
+        """
+        row = self.db.execute(
+            "SELECT names FROM ptr WHERE address = ? AND resolved_at >= ?",
+            (address, time.time() - self.max_age)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, address: str, names: list[str]):
+        if self.pending == 0:
+            self.db.execute("BEGIN")
+
+        self.db.execute(
+            "INSERT OR REPLACE INTO ptr (address, names, resolved_at) "
+            "VALUES (?, ?, ?)",
+            (address, json.dumps(names), time.time()))
+
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        if self.pending > 0:
+            self.db.execute("COMMIT")
+            self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
+        logger.debug("close:%s", self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,104 @@
+import ipaddress
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Optional
+from dns.rdatatype import PTR
+from dns.reversename import from_address
+from dns.resolver import NXDOMAIN, NoAnswer
+from dns.exception import DNSException
+
+from common.logger import getLogger
+from common.dns.resolve import ResilientResolver
+
+logger = getLogger(__name__)
+
+Address = ipaddress.IPv4Address | ipaddress.IPv6Address
+Network = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+# A sweep larger than a /8 is most likely a typo
+MAX_ADDRESSES = 1 << 24
+
+
+def parse_targets(
+        targets: Iterable[str],
+        neighbors: Optional[int] = None
+) -> list[Network]:
+    """
+    Turn TARGETS, IP addresses or CIDR networks, into the networks to
+    sweep.
+
+    With NEIGHBORS, an IPv4 target stands for the /NEIGHBORS network
+    around it. IPv6 networks are too wide to guess, they are swept as
+    given. Overlapping targets are merged, so an address is never
+    queried twice.
+
+    :raises ValueError: when a target is not an address nor a network,
+        or when it holds more than MAX_ADDRESSES addresses
+    """
+    if neighbors is not None and not 0 <= neighbors <= 32:
+        raise ValueError("neighbors prefix must be between 0 and 32")
+
+    networks: dict[int, list[Network]] = {4: [], 6: []}
+
+    for target in targets:
+        target = target.strip()
+        if target == "" or target.startswith("#"):
+            continue
+
+        try:
+            network = ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            raise ValueError(
+                f"{target} is neither an IP address nor a network")
+
+        if neighbors is not None and network.version == 4 \
+           and network.prefixlen > neighbors:
+            network = network.supernet(new_prefix=neighbors)
+
+        if network.num_addresses > MAX_ADDRESSES:
+            raise ValueError(
+                f"{target} holds more than {MAX_ADDRESSES} addresses")
+
+        networks[network.version].append(network)
+
+    collapsed = [
+        network
+        for version in (4, 6)
+        for network in ipaddress.collapse_addresses(networks[version])]
+    logger.debug("parse_targets:%s", collapsed)
+    return collapsed
+
+
+@dataclass
+class PTRSweep:
+    resolver:       ResilientResolver
+    on_success:     Callable[[Address, list[str]], Awaitable[None]]
+    on_failure:     Callable[[Address], Awaitable[None]]
+
+    async def reverse(self, address: Address) -> Optional[list[str]]:
+        """
+        Return the names ADDRESS points to, an empty list when it has no
+        PTR record, or None when the lookup failed and is worth another
+        try later.
+        """
+        try:
+            answer = await self.resolver.resolve(
+                from_address(str(address)), PTR)
+        except (NXDOMAIN, NoAnswer):
+            return []
+        except DNSException as e:
+            # Retries are spent, the address may have a name all the same
+            logger.warning(
+                f"reverse:{address} unresolved: {type(e).__name__}")
+            return None
+
+        return [rdata.target.to_text(True) for rdata in answer]
+
+    async def sweep_address(self, address: Address) -> Optional[list[str]]:
+        names = await self.reverse(address)
+        logger.debug("sweep_address:%s:%s", address, names)
+
+        if names:
+            await self.on_success(address, names)
+        else:
+            await self.on_failure(address)
+        return names
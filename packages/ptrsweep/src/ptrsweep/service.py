@@ -0,0 +1,193 @@
+import asyncio
+from typing import Callable, Iterable, Optional
+from oam_client import AsyncBrokerClient
+from dns.exception import DNSException
+from dns.asyncresolver import Resolver
+
+from common.logger import getLogger
+from common.ratelimiter import RateLimiter
+from common.metrics import STAGE_ITEMS
+from common.store.client import StoreWindow, DEFAULT_WINDOW
+from common.dns.resolve import ResilientResolver, RetryPolicy
+
+from .core import PTRSweep, Address, Network, parse_targets
+from .cache import PTRCache
+from .store import store_ip, store_ptr
+
+logger = getLogger(__name__)
+
+
+class SweepPTRCommand:
+    """
+    Resolve the PTR records of every address of TARGETS.
+    """
+
+    IS_ASYNC = True
+
+    networks: list[Network]
+    core: PTRSweep
+    resilient: ResilientResolver
+    ratelimiter: RateLimiter
+    concurrency: int
+    cache: Optional[PTRCache]
+    store: AsyncBrokerClient
+    window: StoreWindow
+
+    def __init__(
+            self,
+            targets: Iterable[str],
+            store: AsyncBrokerClient,
+            on_success: Callable[[str, list[str]], None],
+            on_failure: Callable[[str], None],
+            neighbors: Optional[int] = None,
+            concurrency: int = 256,
+            ratelimiter_delay: int = 1000,
+            ratelimiter_batch: int = 500,
+            resolv: str = "/etc/resolv.conf",
+            timeout: int = 2000,
+            retries: int = 2,
+            retry_delay: int = 200,
+            resolver: Optional[Resolver] = None,
+            cache: Optional[PTRCache] = None,
+            disable_store: bool = False,
+            store_window: int = DEFAULT_WINDOW,
+    ):
+        """
+        Instanciate the SweepPTRCommand.
+
+        :param targets: IP addresses and CIDR networks
+        :param store: the asset store
+        :param on_success: function called with an address and its names
+        :param on_failure: function called when an address has no name
+        :param neighbors: sweep the /NEIGHBORS network around each IPv4
+            address instead of the address alone
+        :param concurrency: max reverse lookups in flight
+        :param ratelimiter_delay: delay between each requests batch
+        :param ratelimiter_batch: size of each requests batch
+        :param resolv: path to the resolv.conf file
+        :param timeout: timeout of each attempt (ms)
+        :param retries: attempts per query on timeout, SERVFAIL or
+            network error
+        :param retry_delay: base delay of the backoff between retries (ms)
+        :param resolver: a resolver shared with other commands, used
+            instead of resolv and timeout
+        :param cache: lookups already done, their addresses are skipped
+        :param disable_store: disable asset store
+        :param store_window: max asset store writes in flight
+        :raises ValueError: when a target is not an address nor a network,
+            or when parameters are impossible values
+        """
+        try:
+            self.networks = parse_targets(targets, neighbors)
+        except ValueError:
+            raise
+
+        if concurrency < 1:
+            raise ValueError("concurrency must be greather than 0")
+
+        if resolver is None:
+            try:
+                resolver = Resolver(
+                    filename=resolv,
+                    configure=True)
+            except DNSException:
+                raise
+
+            resolver.timeout = timeout / 1000.0
+            resolver.lifetime = timeout / 1000.0
+
+        try:
+            policy = RetryPolicy(
+                attempts=retries,
+                base_delay=retry_delay / 1000.0)
+        except ValueError:
+            raise
+
+        self.resilient = ResilientResolver(resolver, policy, "ptrsweep")
+
+        try:
+            self.ratelimiter = RateLimiter(
+                ratelimiter_batch,
+                ratelimiter_delay)
+        except ValueError:
+            raise
+
+        try:
+            self.window = StoreWindow(store_window)
+        except ValueError:
+            raise
+
+        self.concurrency = concurrency
+        self.cache = cache
+        self.store = store
+
+        async def store_names(address: Address, names: list[str]):
+            ip = await store_ip(self.store, str(address), address.version)
+            for name in names:
+                await store_ptr(self.store, ip, name)
+
+        async def success_handler(address: Address, names: list[str]):
+            STAGE_ITEMS.inc(tool="ptrsweep", stage="found")
+
+            # Names are stored in the background so the store latency
+            # overlaps with the next lookups
+            if not disable_store:
+                await self.window.submit(store_names(address, names))
+
+            on_success(str(address), names)
+
+        async def failure_handler(address: Address):
+            STAGE_ITEMS.inc(tool="ptrsweep", stage="not_found")
+            on_failure(str(address))
+
+        self.core = PTRSweep(
+            self.resilient,
+            success_handler,
+            failure_handler)
+
+    async def _sweep(self, address: Address):
+        names = await self.core.sweep_address(address)
+        if names is not None and self.cache is not None:
+            self.cache.put(str(address), names)
+
+    def _addresses(self) -> Iterable[Address]:
+        for network in self.networks:
+            for address in network:
+                if self.cache is not None \
+                   and self.cache.get(str(address)) is not None:
+                    STAGE_ITEMS.inc(tool="ptrsweep", stage="cached")
+                    continue
+                yield address
+
+    async def run(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks: set[asyncio.Task] = set()
+        errors: list[BaseException] = []
+
+        def done(task: asyncio.Task):
+            tasks.discard(task)
+            slots.release()
+            if not task.cancelled() and task.exception() is not None:
+                errors.append(task.exception())
+
+        try:
+            for address in self._addresses():
+                if len(errors) > 0:
+                    break
+
+                await self.ratelimiter.try_acquire_async()
+                await slots.acquire()
+                task = asyncio.create_task(self._sweep(address))
+                tasks.add(task)
+                task.add_done_callback(done)
+
+            while len(tasks) > 0:
+                await asyncio.wait(set(tasks))
+        finally:
+            if self.cache is not None:
+                self.cache.commit()
+
+        await self.window.join()
+
+        if len(errors) > 0:
+            raise errors[0]
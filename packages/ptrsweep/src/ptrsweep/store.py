@@ -0,0 +1,53 @@
+from typing import Iterator
+from asset_model import AssetType
+from asset_model import IPAddress, IPAddressType
+from asset_model import FQDN
+from asset_model import SimpleRelation
+from asset_model import SourceProperty
+from oam_client import AsyncBrokerClient
+from oam_client.messages import Entity
+
+from common.store.local import LocalStore, load_asset
+
+from . import __title__
+
+
+def stored_addresses(local: LocalStore) -> Iterator[str]:
+    """
+    Stream the IPAddress entities of LOCAL, e.g. the A and AAAA records
+    found by dnsdump.
+    """
+    for _, etype, content in local.rows("entities"):
+        if etype == AssetType.IPAddress.value:
+            yield load_asset(etype, content).address
+
+
+async def store_ip(
+        store: AsyncBrokerClient,
+        address: str,
+        version: int
+) -> Entity:
+    ip_type = IPAddressType.IPv4 if version == 4 else IPAddressType.IPv6
+    ip = await store.create_entity(IPAddress(address, ip_type))
+    await store.create_entity_tag(
+        SourceProperty(source=__title__, confidence=100), ip.id)
+    return ip
+
+
+async def store_ptr(
+        store: AsyncBrokerClient,
+        ip: Entity,
+        name: str
+) -> Entity:
+    """
+    Store the FQDN NAME the IP address IP points back to.
+    """
+    fqdn = await store.create_entity(FQDN(name))
+    await store.create_entity_tag(
+        SourceProperty(source=__title__, confidence=100), fqdn.id)
+
+    rel = await store.create_edge(
+        SimpleRelation("ptr_record"), ip.id, fqdn.id)
+    await store.create_edge_tag(
+        SourceProperty(source=__title__, confidence=100), rel.id)
+    return fqdn
@@ -1,9 +1,23 @@
+import common.cli_setup  # noqa: F401
+
+import os
+import sys
+import socket
 import asyncio
+from argparse import ArgumentParser
+from dns.asyncresolver import Resolver
 from common.logger import getLogger
+from common.output import print_error
+from common.metrics import add_metrics_arguments, start_metrics, InstrumentedStore
+from common.profile import add_profile_arguments, start_profile
+from common.store.client import open_store
 from oam_client import AsyncBrokerClient
-from oam_client.messages import Event, ServerAction
-from asset_model import AssetType
-from dnsdump.service import DumpDNSCommand
+from oam_client.messages import Event
+
+from .core import Pipeline, LeasedPipeline, Transform
+from .ledger import Ledger
+from .lease import LeaseTable
+from .service import Transforms
 
 logger = getLogger(__name__)
 
@@ -12,31 +26,165 @@ class BrokerHandler:
     def __init__(
             self,
             client: AsyncBrokerClient,
+            pipeline: Pipeline,
     ):
         self.client = client
+        self.pipeline = pipeline
 
     async def handler(self, event: Event):
-        logger.debug(f"handler:{event.action}:{event.data.type}")
+        logger.debug("handler:%s:%s", event.action, event.data.type)
+        await self.pipeline.submit(event)
+
+
+def parse_transform(
+        spec: str,
+        transforms: Transforms,
+        default_concurrency: int
+) -> Transform:
+    """
+    Build a Transform from NAME[:CONCURRENCY[:BATCH:DELAY]].
+    """
+    parts = spec.split(":")
+    if len(parts) not in (1, 2, 4):
+        raise ValueError(
+            f"invalid transform '{spec}', "
+            "expected NAME[:CONCURRENCY[:BATCH:DELAY]]")
+
+    try:
+        values = [int(p) for p in parts[1:]]
+    except ValueError:
+        raise ValueError(
+            f"invalid transform '{spec}', "
+            "CONCURRENCY, BATCH and DELAY must be integers")
 
-        if event.action == ServerAction.EntityCreated \
-           and event.data.type == AssetType.FQDN:
-            try:
-                await DumpDNSCommand(
-                    domain=event.data.asset.name,
-                    store=self.client,
-                    on_success=lambda rdtype, rdata: print("find:", rdtype, rdata),
-                    on_failure=lambda rdtype: print("try:", rdtype),
-                ).run()
-            except Exception as e:
-                print(e)
+    concurrency = values[0] if len(values) > 0 else default_concurrency
+    batch, delay = values[1:] if len(values) == 3 else (None, None)
+
+    return transforms.make_transform(parts[0], concurrency, batch, delay)
 
 
 async def async_main():
-    client = AsyncBrokerClient("https://localhost", verify=False)
+    parser = ArgumentParser(
+        prog="transformers",
+        description="Run the tools on the assets created in the broker.")
+    parser.add_argument(
+        "-T", "--transform", help="transform to run, as "
+        "NAME[:CONCURRENCY[:BATCH:DELAY]] (dnsdump, txtminer, certdump, "
+        "dnsfuzz, apex), can be repeated", action="append", default=None)
+    parser.add_argument(
+        "-w", "--workers", help="default number of events handled "
+        "concurrently per transform", type=int, default=4)
+    parser.add_argument(
+        "-q", "--queue-size", help="number of pending events per transform "
+        "before the listener blocks", type=int, default=1000)
+    parser.add_argument(
+        "--wordlist", help="path to the dnsfuzz wordlist",
+        default=None)
+    parser.add_argument(
+        "-r", "--resolv", help="Path to the resolver configuration file",
+        default="./resolve.conf")
+    parser.add_argument(
+        "-t", "--timeout", help="DNS query timeout per nameserver (ms)",
+        type=int, default=5000)
+    parser.add_argument(
+        "-l", "--lifetime", help="Max total time per DNS query (ms)",
+        type=int, default=10000)
+    parser.add_argument(
+        "--ttl", help="Freshness window of a processed asset (s)",
+        type=float, default=86400)
+    parser.add_argument(
+        "--ledger", help="Path to the processed-asset ledger file",
+        default=None)
+    parser.add_argument(
+        "--lease", help="Path to a lease database shared with other "
+        "transformer processes, enables distributed mode", default=None)
+    parser.add_argument(
+        "--lease-time", help="Duration of a work lease (s)",
+        type=float, default=60)
+    parser.add_argument(
+        "--worker-id", help="Unique identifier of this process in "
+        "distributed mode", default=f"{socket.gethostname()}:{os.getpid()}")
+    parser.add_argument(
+        "--consume-only", help="Do not listen to broker events, only run "
+        "the work leased from --lease", action="store_true")
+    parser.add_argument(
+        "--nocolor", help="Disable colors on stdout",
+        action="store_true")
+
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+
+    config = parser.parse_args()
+
+    try:
+        start_metrics(config)
+        start_profile(config)
+    except (OSError, ValueError) as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    ledger = None
+    leases = None
+
+    try:
+        client = InstrumentedStore(open_store())
+        sync_client = InstrumentedStore(open_store(asynchronous=False))
+        resolver = Resolver(filename=config.resolv, configure=True)
+        if config.lease is not None:
+            # The lease table keeps track of processed assets for all
+            # the workers, it replaces the ledger.
+            leases = LeaseTable(
+                config.lease,
+                config.worker_id,
+                lease_time=config.lease_time,
+                ttl=config.ttl)
+            pipeline = LeasedPipeline(leases)
+        else:
+            ledger = Ledger(config.ttl, config.ledger)
+            pipeline = Pipeline(config.queue_size, ledger)
+    except Exception as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    resolver.timeout = config.timeout / 1000.0
+    resolver.lifetime = config.lifetime / 1000.0
+
+    transforms = Transforms(
+        client=client,
+        resolver=resolver,
+        resolv=config.resolv,
+        wordlist=config.wordlist,
+        sync_client=sync_client,
+    )
+
+    try:
+        for spec in config.transform or ["dnsdump"]:
+            pipeline.register(
+                parse_transform(spec, transforms, config.workers))
+    except ValueError as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
     handler = BrokerHandler(
-        client=client
+        client=client,
+        pipeline=pipeline,
     )
-    await client.listen_events(handler.handler)
+
+    if config.consume_only and config.lease is None:
+        print_error("--consume-only requires --lease", config.nocolor)
+        sys.exit(1)
+
+    try:
+        async with pipeline:
+            if config.consume_only:
+                await asyncio.Event().wait()
+            else:
+                await client.listen_events(handler.handler)
+    finally:
+        if ledger is not None:
+            ledger.close()
+        if leases is not None:
+            leases.close()
 
 
 def main():
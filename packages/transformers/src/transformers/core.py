@@ -0,0 +1,231 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+from oam_client.messages import Event, ServerAction
+from asset_model import Asset, AssetType
+
+from common.logger import getLogger
+from common.ratelimiter import RateLimiter
+from common.metrics import STAGE_ITEMS
+
+from .ledger import Ledger
+from .lease import Job, LeaseTable
+
+logger = getLogger(__name__)
+
+Route = Callable[[Asset], Awaitable[None]]
+RouteKey = tuple[ServerAction, AssetType]
+
+
+def asset_key(asset: Asset) -> str:
+    return f"{asset.asset_type.value}:{asset.key}"
+
+
+@dataclass
+class Transform:
+    """
+    A command triggered by the broker events of a given action and asset
+    type. Each transform has its own queue, concurrency limit and rate
+    budget, so independent transforms of the same asset run in parallel.
+    """
+    name:        str
+    action:      ServerAction
+    asset_type:  AssetType
+    run:         Route
+    concurrency: int = 1
+    ratelimiter: Optional[RateLimiter] = None
+    queue:       asyncio.Queue[Asset] = field(init=False)
+
+    def __post_init__(self):
+        if self.concurrency < 1:
+            raise ValueError(
+                f"{self.name}'s concurrency must be greather than 0")
+
+
+class Pipeline:
+    """
+    Routing registry of transforms fed by broker events.
+
+    Each event is routed on its (action, asset type) pair to every
+    registered transform, through a bounded queue per transform.
+    Submitting an event blocks while one of those queues is full, which
+    applies backpressure to the event listener. Events whose asset was
+    already processed by a transform within the ledger's freshness window
+    are dropped before being queued. The ledger entry is persisted when
+    the transform succeeds.
+    """
+
+    routes: dict[RouteKey, list[Transform]]
+    queue_size: int
+    tasks: list[asyncio.Task]
+    ledger: Optional[Ledger]
+
+    def __init__(
+            self,
+            queue_size: int = 1000,
+            ledger: Optional[Ledger] = None
+    ):
+        """
+        Instanciate the Pipeline.
+
+        :param queue_size: number of events waiting per transform before
+            submit blocks
+        :param ledger: processed-asset ledger, every event is handled if None
+        :raises ValueError: when queue_size is an impossible value
+        """
+        if queue_size < 1:
+            raise ValueError(
+                "pipeline's queue size must be greather than 0")
+
+        self.routes = {}
+        self.queue_size = queue_size
+        self.tasks = []
+        self.ledger = ledger
+
+    def register(self, transform: Transform):
+        transform.queue = asyncio.Queue(maxsize=self.queue_size)
+        key = (transform.action, transform.asset_type)
+        self.routes.setdefault(key, []).append(transform)
+        logger.debug(
+            f"register:{transform.name}:{transform.action}:"
+            f"{transform.asset_type}:{transform.concurrency}")
+
+    def get_transforms(self, event: Event) -> list[Transform]:
+        return self.routes.get((event.action, event.data.type), [])
+
+    async def submit(self, event: Event):
+        transforms = self.get_transforms(event)
+        if len(transforms) == 0:
+            logger.debug(
+                "submit:no route:%s:%s", event.action, event.data.type)
+            return
+
+        asset = event.data.asset
+        for transform in transforms:
+            if self.ledger is not None \
+               and not self.ledger.claim(asset_key(asset), transform.name):
+                logger.debug(
+                    f"submit:already processed:{transform.name}:"
+                    f"{asset_key(asset)}")
+                continue
+
+            await self._put(transform, asset)
+
+    async def _put(self, transform: Transform, asset: Asset):
+        await transform.queue.put(asset)
+
+    async def _run(self, transform: Transform, worker_id: int, asset: Asset):
+        if transform.ratelimiter is not None:
+            await transform.ratelimiter.try_acquire_async()
+        logger.debug(
+            "worker %s/%s:%s", transform.name, worker_id, asset_key(asset))
+        await transform.run(asset)
+        STAGE_ITEMS.inc(tool="transformers", stage=transform.name)
+
+    async def _work(self, transform: Transform, worker_id: int):
+        while True:
+            asset = await transform.queue.get()
+            try:
+                await self._run(transform, worker_id, asset)
+                if self.ledger is not None:
+                    self.ledger.confirm(asset_key(asset), transform.name)
+            except Exception as e:
+                logger.error(
+                    f"worker {transform.name}/{worker_id}:"
+                    f"{type(e).__name__}:{e}")
+                if self.ledger is not None:
+                    self.ledger.release(asset_key(asset), transform.name)
+            finally:
+                transform.queue.task_done()
+
+    def start(self):
+        for transforms in self.routes.values():
+            for transform in transforms:
+                for i in range(transform.concurrency):
+                    self.tasks.append(
+                        asyncio.create_task(self._work(transform, i)))
+
+    async def join(self):
+        for transforms in self.routes.values():
+            for transform in transforms:
+                await transform.queue.join()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+class LeasedPipeline(Pipeline):
+    """
+    Pipeline whose queues are a LeaseTable shared by several transformer
+    processes, on one machine or several.
+
+    Submitted assets are written to the lease table, and the workers of
+    every process lease them, so each asset is transformed by exactly
+    one worker. Leases are renewed while a job runs; the jobs of a dead
+    worker expire and are picked up by the others.
+    """
+
+    leases: LeaseTable
+    poll_interval: float
+
+    def __init__(
+            self,
+            leases: LeaseTable,
+            ledger: Optional[Ledger] = None,
+            poll_interval: float = 0.5
+    ):
+        """
+        Instanciate the LeasedPipeline.
+
+        :param leases: the lease table shared by the workers
+        :param ledger: processed-asset ledger, every event is handled if None
+        :param poll_interval: delay between two polls of an empty table
+            (in s)
+        """
+        super().__init__(ledger=ledger)
+        self.leases = leases
+        self.poll_interval = poll_interval
+
+    async def _put(self, transform: Transform, asset: Asset):
+        await asyncio.to_thread(
+            self.leases.put, transform.name, asset_key(asset), asset)
+
+        # The job outlives this process in the lease table
+        if self.ledger is not None:
+            self.ledger.confirm(asset_key(asset), transform.name)
+
+    async def _renew(self, job: Job):
+        while True:
+            await asyncio.sleep(self.leases.lease_time / 3)
+            if not await asyncio.to_thread(self.leases.renew, job):
+                logger.warning(f"renew:lease lost:{job.transform}:{job.id}")
+                return
+
+    async def _work(self, transform: Transform, worker_id: int):
+        while True:
+            job = await asyncio.to_thread(self.leases.lease, transform.name)
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            renew = asyncio.create_task(self._renew(job))
+            try:
+                await self._run(transform, worker_id, job.asset)
+                await asyncio.to_thread(self.leases.complete, job)
+            except Exception as e:
+                logger.error(
+                    f"worker {transform.name}/{worker_id}:"
+                    f"{type(e).__name__}:{e}")
+                await asyncio.to_thread(self.leases.fail, job)
+            finally:
+                renew.cancel()
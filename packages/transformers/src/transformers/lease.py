@@ -0,0 +1,209 @@
+import json
+import time
+import sqlite3
+from dataclasses import dataclass
+from typing import Optional
+from asset_model import Asset, AssetType, OAMObject, get_asset_by_type
+
+from common.logger import getLogger
+
+logger = getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id         INTEGER PRIMARY KEY,
+    transform  TEXT NOT NULL,
+    asset_key  TEXT NOT NULL,
+    asset_type TEXT NOT NULL,
+    asset      TEXT NOT NULL,
+    state      TEXT NOT NULL DEFAULT 'pending',
+    owner      TEXT,
+    expires    REAL NOT NULL DEFAULT 0,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    updated    REAL NOT NULL,
+    UNIQUE (transform, asset_key)
+);
+CREATE INDEX IF NOT EXISTS jobs_lease ON jobs (transform, state, expires);
+"""
+
+
+@dataclass
+class Job:
+    id:        int
+    transform: str
+    asset:     Asset
+    attempts:  int
+
+
+class LeaseTable:
+    """
+    Work queue shared by several transformer processes through a SQLite
+    database.
+
+    Each job is leased to exactly one worker for a limited time. A worker
+    renews its leases while it runs them, so the jobs of a dead worker
+    expire and are leased again by the others. Done jobs are kept for
+    the freshness window so the same asset is not transformed twice.
+    """
+
+    path: str
+    owner: str
+    lease_time: float
+    ttl: float
+    max_attempts: int
+    db: sqlite3.Connection
+
+    def __init__(
+            self,
+            path: str,
+            owner: str,
+            lease_time: float = 60.0,
+            ttl: float = 86400.0,
+            max_attempts: int = 3
+    ):
+        """
+        Instanciate the LeaseTable.
+
+        :param path: path of the SQLite database shared by the workers
+        :param owner: unique identifier of this worker
+        :param lease_time: duration of a lease before it is renewed (in s)
+        :param ttl: freshness window of a done job (in s)
+        :param max_attempts: number of leases of a job before giving up
+        :raises ValueError: when parameters are impossible values
+        :raises sqlite3.Error: when the database cannot be opened
+        """
+        if lease_time <= 0:
+            raise ValueError(
+                "lease time must be greather than 0")
+
+        if ttl < 0:
+            raise ValueError(
+                "lease table's ttl must be greather or equal to 0")
+
+        if max_attempts < 1:
+            raise ValueError(
+                "lease table's max attempts must be greather than 0")
+
+        self.path = path
+        self.owner = owner
+        self.lease_time = lease_time
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+
+        try:
+            # Calls are run in worker threads to keep the event loop free,
+            # each one is a single statement
+            self.db = sqlite3.connect(
+                path, timeout=30, isolation_level=None,
+                check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.executescript(SCHEMA)
+        except sqlite3.Error:
+            raise
+
+    def put(self, transform: str, asset_key: str, asset: Asset) -> bool:
+        """
+        Queue ASSET for TRANSFORM, unless it is already queued, running,
+        or done within the freshness window.
+
+        :returns: True when a job was queued
+        """
+        now = time.time()
+        cursor = self.db.execute(
+            """
+            INSERT INTO jobs (transform, asset_key, asset_type, asset, updated)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (transform, asset_key) DO UPDATE SET
+                state = 'pending', owner = NULL, expires = 0, attempts = 0,
+                asset = excluded.asset, updated = excluded.updated
+            WHERE jobs.state IN ('done', 'failed') AND jobs.updated < ?
+            """,
+            (transform, asset_key, asset.asset_type.value, asset.to_json(),
+             now, now - self.ttl))
+        queued = cursor.rowcount > 0
+        logger.debug("put:%s:%s:%s", transform, asset_key, queued)
+        return queued
+
+    def lease(self, transform: str) -> Optional[Job]:
+        """
+        Lease the oldest pending or expired job of TRANSFORM.
+
+        The expired jobs without attempts left, whose last worker died,
+        are marked as failed.
+        """
+        now = time.time()
+        failed = self.db.execute(
+            """
+            UPDATE jobs SET state = 'failed', owner = NULL, updated = ?
+            WHERE transform = ? AND state = 'leased' AND expires < ?
+            AND attempts >= ?
+            """,
+            (now, transform, now, self.max_attempts)).rowcount
+        if failed > 0:
+            logger.warning(f"lease:{transform}:{failed} expired jobs failed")
+
+        row = self.db.execute(
+            """
+            UPDATE jobs SET
+                state = 'leased', owner = ?, expires = ?,
+                attempts = attempts + 1, updated = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE transform = ?
+                AND attempts < ?
+                AND (state = 'pending' OR (state = 'leased' AND expires < ?))
+                ORDER BY id LIMIT 1)
+            RETURNING id, asset_type, asset, attempts
+            """,
+            (self.owner, now + self.lease_time, now,
+             transform, self.max_attempts, now)).fetchone()
+
+        if row is None:
+            return None
+
+        id, asset_type, asset, attempts = row
+        asset_cls = get_asset_by_type(AssetType(asset_type))
+        logger.debug("lease:%s:%s:%s", transform, id, attempts)
+        return Job(
+            id=id,
+            transform=transform,
+            asset=OAMObject.from_dict(asset_cls, json.loads(asset)),
+            attempts=attempts)
+
+    def renew(self, job: Job) -> bool:
+        """
+        Extend the lease of JOB.
+
+        :returns: False when the lease was lost to another worker
+        """
+        cursor = self.db.execute(
+            "UPDATE jobs SET expires = ? WHERE id = ? AND owner = ?",
+            (time.time() + self.lease_time, job.id, self.owner))
+        return cursor.rowcount > 0
+
+    def complete(self, job: Job):
+        self.db.execute(
+            """
+            UPDATE jobs SET state = 'done', owner = NULL, updated = ?
+            WHERE id = ? AND owner = ?
+            """,
+            (time.time(), job.id, self.owner))
+
+    def fail(self, job: Job):
+        self.db.execute(
+            """
+            UPDATE jobs SET
+                state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                owner = NULL, expires = 0, updated = ?
+            WHERE id = ? AND owner = ?
+            """,
+            (self.max_attempts, time.time(), job.id, self.owner))
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
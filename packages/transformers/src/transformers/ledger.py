@@ -0,0 +1,162 @@
+import os
+import json
+import time
+from typing import Optional, TextIO
+
+from common.logger import getLogger
+
+logger = getLogger(__name__)
+
+PURGE_EVERY = 10000
+
+Key = tuple[str, str]
+
+
+class Ledger:
+    """
+    Processed-asset ledger.
+
+    Remembers when each (asset, transform) pair was last processed so that
+    a transform runs once per freshness window instead of once per event.
+    When a path is given, the ledger is kept in an append-only JSON lines
+    file and survives restarts.
+    """
+
+    ttl: float
+    path: Optional[str]
+    entries: dict[Key, float]
+    file: Optional[TextIO]
+    claims: int
+
+    def __init__(
+            self,
+            ttl: float = 86400.0,
+            path: Optional[str] = None
+    ):
+        """
+        Instanciate the Ledger.
+
+        :param ttl: freshness window of a processed asset (in s)
+        :param path: path of the ledger file, the ledger is in memory if None
+        :raises ValueError: when ttl is negative
+        :raises OSError: when the ledger file cannot be opened
+        """
+        if ttl < 0:
+            raise ValueError(
+                "ledger's ttl must be greather or equal to 0")
+
+        self.ttl = ttl
+        self.path = path
+        self.entries = {}
+        self.file = None
+        self.claims = 0
+
+        if path is not None:
+            try:
+                self._load(path)
+                self.file = open(path, "a")
+            except OSError:
+                raise
+
+    def _load(self, path: str):
+        if not os.path.exists(path):
+            return
+
+        now = time.time()
+        with open(path) as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                    key = (data["asset"], data["transform"])
+                    at = float(data["at"])
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"load:corrupted entry:{line.strip()}")
+                    continue
+
+                if now - at < self.ttl:
+                    self.entries[key] = at
+                else:
+                    self.entries.pop(key, None)
+
+        # Compact the file so that it only holds fresh entries
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            for (asset, transform), at in self.entries.items():
+                f.write(self._format(asset, transform, at))
+        os.replace(tmp, path)
+
+        logger.debug("load:%s:%s entries", path, len(self.entries))
+
+    @staticmethod
+    def _format(asset: str, transform: str, at: float) -> str:
+        return json.dumps(
+            {"asset": asset, "transform": transform, "at": at}) + "\n"
+
+    def _write(self, asset: str, transform: str, at: float):
+        if self.file is None:
+            return
+        self.file.write(self._format(asset, transform, at))
+        self.file.flush()
+
+    def is_fresh(self, asset: str, transform: str) -> bool:
+        at = self.entries.get((asset, transform))
+        return at is not None and time.time() - at < self.ttl
+
+    def claim(self, asset: str, transform: str) -> bool:
+        """
+        Mark ASSET as processed by TRANSFORM unless it already is.
+
+        The claim only lives in memory until it is confirmed, so the
+        assets still queued when the process stops are processed again
+        after a restart.
+
+        :returns: True when the caller should run the transform
+        """
+        if self.is_fresh(asset, transform):
+            logger.debug("claim:fresh:%s:%s", transform, asset)
+            return False
+
+        self.entries[(asset, transform)] = time.time()
+
+        self.claims += 1
+        if self.claims % PURGE_EVERY == 0:
+            self.purge()
+
+        return True
+
+    def confirm(self, asset: str, transform: str):
+        """
+        Persist the claim of ASSET for TRANSFORM, once the transform is
+        done with it or its job is stored durably.
+        """
+        at = time.time()
+        self.entries[(asset, transform)] = at
+        self._write(asset, transform, at)
+
+    def release(self, asset: str, transform: str):
+        """
+        Forget ASSET for TRANSFORM, e.g. after a failure, so that the next
+        event triggers the transform again.
+        """
+        if self.entries.pop((asset, transform), None) is not None:
+            self._write(asset, transform, 0.0)
+
+    def purge(self):
+        now = time.time()
+        expired = [
+            key for key, at in self.entries.items()
+            if now - at >= self.ttl]
+        for key in expired:
+            del self.entries[key]
+        logger.debug("purge:%s expired entries", len(expired))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,243 @@
+import asyncio
+from typing import Optional
+from dns import name
+from dns.asyncresolver import Resolver
+from dns.resolver import NXDOMAIN, NoAnswer
+from oam_client import AsyncBrokerClient, BrokerClient
+from oam_client.messages import ServerAction
+from asset_model import AssetType, FQDN, IPAddress
+
+from apex.core import is_apex
+from apex.service import FindApexCommand
+from certdump.service import DumpCertificateCommand
+from dnsdump.core import CNAMEFollower
+from dnsdump.service import DumpDNSCommand
+from dnsfuzz.service import FuzzDNSCommand
+from txtminer.service import ExtractProductsFromDomain, ExpandSPFCommand
+from txtminer.spf import SPFExpander
+from txtminer.store import tag_product, tag_network
+from ptrsweep.service import SweepPTRCommand
+
+from common.logger import getLogger
+from common.ratelimiter import RateLimiter
+from common.dns.resolve import ResilientResolver
+
+from .core import Route, Transform
+
+logger = getLogger(__name__)
+
+
+class Transforms:
+    """
+    Routes running each graphrecon tool on the assets created in the
+    broker. They share a single broker client and DNS resolver.
+    """
+
+    client: AsyncBrokerClient
+    sync_client: Optional[BrokerClient]
+    resolver: Resolver
+    resolv: str
+    wordlist: Optional[str]
+    spf: SPFExpander
+    cnames: CNAMEFollower
+
+    def __init__(
+            self,
+            client: AsyncBrokerClient,
+            resolver: Resolver,
+            resolv: str = "/etc/resolv.conf",
+            wordlist: Optional[str] = None,
+            sync_client: Optional[BrokerClient] = None
+    ):
+        """
+        Instanciate the transforms.
+
+        :param client: the shared asset store client
+        :param resolver: the shared DNS resolver
+        :param resolv: path to the resolv.conf file, for tools owning
+            their resolver
+        :param wordlist: path of the dnsfuzz wordlist
+        :param sync_client: the blocking flavour of the asset store
+            client, for the tools storing from worker threads
+        """
+        self.client = client
+        self.sync_client = sync_client
+        self.resolver = resolver
+        self.resolv = resolv
+        self.wordlist = wordlist
+
+        # Most domains include the same few mail providers, their SPF
+        # records are expanded once for every transform
+        self.spf = SPFExpander(
+            ResilientResolver(resolver, tool="txtminer"))
+
+        # Likewise for the CDN and SaaS endpoints FQDNs point to
+        self.cnames = CNAMEFollower(
+            ResilientResolver(resolver, tool="dnsdump"))
+
+    def routes(self) -> dict[str, tuple[ServerAction, AssetType, Route]]:
+        return {
+            "dnsdump": (
+                ServerAction.EntityCreated, AssetType.FQDN, self.dump_dns),
+            "txtminer": (
+                ServerAction.EntityCreated, AssetType.FQDN, self.mine_txt),
+            "certdump": (
+                ServerAction.EntityCreated, AssetType.FQDN, self.dump_cert),
+            "dnsfuzz": (
+                ServerAction.EntityCreated, AssetType.FQDN, self.fuzz_dns),
+            "apex": (
+                ServerAction.EntityCreated, AssetType.FQDN, self.find_apex),
+            "ptrsweep": (
+                ServerAction.EntityCreated, AssetType.IPAddress,
+                self.sweep_ptr),
+        }
+
+    def make_transform(
+            self,
+            transform: str,
+            concurrency: int = 1,
+            ratelimiter_batch: Optional[int] = None,
+            ratelimiter_delay: Optional[int] = None
+    ) -> Transform:
+        """
+        Build the Transform registered under the name TRANSFORM.
+
+        :param transform: the transform name (e.g. "dnsdump")
+        :param concurrency: number of assets transformed concurrently
+        :param ratelimiter_batch: size of each transforms batch
+        :param ratelimiter_delay: delay between each transforms batch
+        :raises ValueError: when transform is unknown or when rate limiter
+            receive impossible values
+        """
+        routes = self.routes()
+        if transform not in routes:
+            raise ValueError(
+                f"unknown transform '{transform}', "
+                f"expected one of {', '.join(routes)}")
+
+        if transform == "dnsfuzz" and self.wordlist is None:
+            raise ValueError("dnsfuzz transform requires a wordlist")
+
+        if transform == "dnsfuzz" and self.sync_client is None:
+            raise ValueError("dnsfuzz transform requires a blocking client")
+
+        ratelimiter = None
+        if ratelimiter_batch is not None and ratelimiter_delay is not None:
+            try:
+                ratelimiter = RateLimiter(ratelimiter_batch, ratelimiter_delay)
+            except ValueError:
+                raise
+
+        action, asset_type, route = routes[transform]
+        return Transform(
+            name=transform,
+            action=action,
+            asset_type=asset_type,
+            run=route,
+            concurrency=concurrency,
+            ratelimiter=ratelimiter)
+
+    async def dump_dns(self, fqdn: FQDN):
+        await DumpDNSCommand(
+            domain=fqdn.name,
+            store=self.client,
+            resolver=self.resolver,
+            on_success=lambda domain, rdtype, data: print(
+                "find:", domain, rdtype, data),
+            on_failure=lambda rdtype: print("try:", rdtype),
+            cnames=self.cnames,
+        ).run()
+
+    async def mine_txt(self, fqdn: FQDN):
+        # The commands report from a worker thread, the results are
+        # stored once both are done
+        products: list[tuple[str, str]] = []
+        networks: list[str] = []
+
+        def run():
+            try:
+                cmd = ExtractProductsFromDomain(
+                    fqdn.name,
+                    on_success=lambda p, t: products.append((p, t)),
+                    on_failure=lambda t: None,
+                )
+            except (NXDOMAIN, NoAnswer):
+                logger.debug("mine_txt:no TXT:%s", fqdn.name)
+                return
+            cmd.run()
+
+        # txtminer is synchronous, keep it off the event loop. The SPF
+        # expansion does not depend on the TXT matching, one failing does
+        # not prevent the other
+        results = await asyncio.gather(
+            asyncio.to_thread(run),
+            ExpandSPFCommand(
+                fqdn.name,
+                on_success=lambda p, t: products.append((p, t)),
+                on_failure=lambda t: None,
+                on_network=networks.append,
+                expander=self.spf,
+            ).run(),
+            return_exceptions=True)
+
+        # What one of them found is stored even when the other failed
+        if len(products) > 0 or len(networks) > 0:
+            node = await self.client.create_entity(fqdn)
+            for product, txt in dict.fromkeys(products):
+                await tag_product(self.client, node, product, txt)
+            for network in dict.fromkeys(networks):
+                await tag_network(self.client, node, network)
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def dump_cert(self, fqdn: FQDN):
+        # Fetching the chain is blocking, keep it off the event loop
+        cmd = await asyncio.to_thread(
+            DumpCertificateCommand,
+            fqdn.name,
+            self.client,
+            lambda t, o: print("cert:", t, o))
+        await cmd.run()
+
+    async def fuzz_dns(self, fqdn: FQDN):
+        domain = name.from_text(fqdn.name)
+        if not is_apex(domain):
+            logger.debug("fuzz_dns:not an apex:%s", domain)
+            return
+
+        # dnsfuzz stores each name with the node edges to its parents
+        await FuzzDNSCommand(
+            domain=fqdn.name,
+            wordlist=self.wordlist,
+            on_success=lambda d: None,
+            on_failure=lambda d: None,
+            store=self.sync_client,
+            resolv=self.resolv,
+        ).run()
+
+    async def find_apex(self, fqdn: FQDN):
+        apexes: list[str] = []
+
+        try:
+            FindApexCommand(
+                fqdn.name,
+                on_result=apexes.append,
+            ).run()
+        except ValueError:
+            logger.debug("find_apex:no apex:%s", fqdn.name)
+            return
+
+        for apex in apexes:
+            if apex != fqdn.name:
+                await self.client.create_entity(FQDN(apex))
+
+    async def sweep_ptr(self, ip: IPAddress):
+        await SweepPTRCommand(
+            targets=[ip.address],
+            store=self.client,
+            resolver=self.resolver,
+            on_success=lambda a, names: print("ptr:", a, *names),
+            on_failure=lambda a: None,
+        ).run()
@@ -4,9 +4,13 @@ import argparse
 import sys
 from termcolor import colored
 
-from common.output import print_error
+from common.output import print_error, add_output_arguments, open_output
+from common.metrics import add_metrics_arguments, start_metrics
+from common.profile import add_profile_arguments, start_profile
 
-from .service import ExtractProductFromTxtCommand, ExtractProductsFromDomain
+from .service import (
+    ExtractProductFromTxtCommand, ExtractProductsFromDomain,
+    ExtractProductsFromPrefixes, ExpandSPFCommand)
 
 found = set()
 
@@ -64,6 +68,29 @@ def failure_handler(
     print(prefix + message)
 
 
+def network_handler(
+        network: str,
+        nocolor: bool = False,
+        verbose: bool = False,
+        silent: bool = False
+):
+    if silent:
+        return
+
+    prefix = ""
+    if verbose:
+        prefix = "RANGE: "
+        if not nocolor:
+            prefix = colored(prefix, 'green', attrs=['bold'])
+
+    if not nocolor:
+        message = colored(network, 'green')
+    else:
+        message = network
+
+    print(prefix + message)
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog="dnsminer",
@@ -81,6 +108,21 @@ def main():
     action_group.add_argument(
         "-d", "--domain", help="A domain to query")
 
+    parser.add_argument(
+        "--spf", help="with --domain, expand the SPF record includes to "
+        "find the mail providers and the allowed IP ranges",
+        action="store_true")
+    parser.add_argument(
+        "--prefixes", help="with --domain, also probe the TXT records of "
+        "well-known prefixes (_dmarc, _acme-challenge...) and DKIM selectors",
+        action="store_true")
+    parser.add_argument(
+        "-rb", "--batch-size", help="rate limiter batch size",
+        type=int, default=10)
+    parser.add_argument(
+        "-rd", "--delay", help="rate limiter delay between batches (in ms)",
+        type=int, default=300)
+
     output_group = parser.add_mutually_exclusive_group()
 
     output_group.add_argument(
@@ -90,20 +132,56 @@ def main():
         "-s", "--silent", help="disable outputs",
         action="store_true")
 
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+
     config = parser.parse_args()
 
+    if config.spf and config.domain is None:
+        parser.error("--spf requires --domain")
+
+    if config.prefixes and config.domain is None:
+        parser.error("--prefixes requires --domain")
+
+    try:
+        start_metrics(config)
+        start_profile(config)
+    except (OSError, ValueError) as e:
+        print_error(e, config.nocolor)
+        sys.exit(1)
+
+    writer = open_output(config)
+
+    def on_success(product: str, txt: str):
+        if writer is None:
+            success_handler(
+                product, txt, config.nocolor, config.verbose, config.silent)
+        elif not config.silent:
+            writer.write(
+                {"domain": config.domain, "product": product, "txt": txt})
+
+    def on_failure(txt: str):
+        if writer is None:
+            failure_handler(
+                txt, config.nocolor, config.verbose, config.silent)
+        elif config.verbose:
+            writer.write(
+                {"domain": config.domain, "product": None, "txt": txt})
+
+    def on_network(network: str):
+        if writer is None:
+            network_handler(
+                network, config.nocolor, config.verbose, config.silent)
+        elif not config.silent:
+            writer.write({"domain": config.domain, "network": network})
+
     if config.txt is not None:
         try:
             cmd = ExtractProductFromTxtCommand(
                 config.txt,
-                on_success=(lambda p, t: success_handler(
-                    p, t, config.nocolor,
-                    config.verbose,
-                    config.silent)),
-                on_failure=(lambda t: failure_handler(
-                    t, config.nocolor,
-                    config.verbose,
-                    config.silent)),
+                on_success=on_success,
+                on_failure=on_failure,
             )
         except Exception as e:
             print_error(e)
@@ -112,23 +190,55 @@ def main():
         cmd.run()
         sys.exit(0)
 
-    try:
-        cmd = ExtractProductsFromDomain(
-            config.domain,
-            on_success=(lambda p, t: success_handler(
-                p, t, config.nocolor,
-                config.verbose,
-                config.silent)),
-            on_failure=(lambda t: failure_handler(
-                t, config.nocolor,
-                config.verbose,
-                config.silent)),
+    if config.prefixes:
+        import asyncio
+
+        # The domain itself is the first name probed
+        try:
+            cmd = ExtractProductsFromPrefixes(
+                config.domain,
+                on_success=on_success,
+                on_failure=on_failure,
+                ratelimiter_batch=config.batch_size,
+                ratelimiter_delay=config.delay,
             )
-    except Exception as e:
-        print_error(e)
-        sys.exit(1)
+        except Exception as e:
+            print_error(e)
+            sys.exit(1)
+
+        asyncio.run(cmd.run())
+    else:
+        try:
+            cmd = ExtractProductsFromDomain(
+                config.domain,
+                on_success=on_success,
+                on_failure=on_failure,
+                )
+        except Exception as e:
+            print_error(e)
+            sys.exit(1)
+
+        cmd.run()
+
+    if config.spf:
+        import asyncio
+
+        try:
+            cmd = ExpandSPFCommand(
+                config.domain,
+                on_success=on_success,
+                on_failure=on_failure,
+                on_network=on_network,
+            )
+        except Exception as e:
+            print_error(e)
+            sys.exit(1)
 
-    cmd.run()
+        try:
+            asyncio.run(cmd.run())
+        except Exception as e:
+            print_error(e)
+            sys.exit(1)
 
 
 if __name__ == "__main__":
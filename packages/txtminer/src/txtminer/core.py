@@ -1,23 +1,29 @@
 import json
 import re
-from asset_model import Product
-from typing import TextIO, Optional
-from dns.resolver import resolve
-from dns.name import Name
-from dns.rdatatype import TXT
-from dns.exception import DNSException
+from typing import TYPE_CHECKING, TextIO, Optional
 
 from common.logger import getLogger
 
+# dnspython and asset_model are slow to import and not needed to match
+# a single TXT, they are imported by the functions using them
+if TYPE_CHECKING:
+    from asset_model import Product
+    from dns.name import Name
+    from common.dns.resolve import ResilientResolver
+
 logger = getLogger(__name__)
 
 
-def query_txt(domain: Name) -> list[str]:
-    logger.debug(f"query_txt:{domain}")
+def query_txt(domain: "Name") -> list[str]:
+    from dns.resolver import resolve
+    from dns.rdatatype import TXT
+    from dns.exception import DNSException
+
+    logger.debug("query_txt:%s", domain)
 
     try:
         answers = resolve(domain, TXT)
-        logger.debug(f"query_txt:resolved:{TXT} → {domain}")
+        logger.debug("query_txt:resolved:%s → %s", TXT, domain)
     except DNSException:
         raise
 
@@ -26,30 +32,70 @@ def query_txt(domain: Name) -> list[str]:
         txts.append(
             "".join([string.decode("ascii") for string in ans.strings]))
 
-    logger.debug(f"query_txt:found:{len(txts)} TXTs")
+    logger.debug("query_txt:found:%s TXTs", len(txts))
+    return txts
+
+
+async def probe_txt(domain: "Name", resolver: "ResilientResolver") -> list[str]:
+    """
+    Return the TXTs of DOMAIN, an empty list when it has none.
+
+    :raises DNSException: when the query fails
+    """
+    from dns.rdatatype import TXT
+    from dns.resolver import NXDOMAIN, NoAnswer
+    from dns.exception import DNSException
+
+    try:
+        answers = await resolver.resolve(domain, TXT)
+    except (NXDOMAIN, NoAnswer):
+        return []
+    except DNSException:
+        raise
+
+    txts = [
+        b"".join(ans.strings).decode("ascii", errors="replace")
+        for ans in answers]
+    logger.debug("probe_txt:%s:%s TXTs", domain, len(txts))
     return txts
 
 
-def extract_product(txt: str, mapping: TextIO) -> Optional[Product]:
+def load_prefixes(prefixes: TextIO) -> list[dict]:
+    """
+    Read the PREFIXES entries, the names probed below a domain. An entry
+    may name the product its existence reveals, e.g. a DKIM selector.
+    """
+    return [json.loads(line) for line in prefixes if line.strip() != ""]
+
+
+def match_product(txt: str, mapping: TextIO) -> Optional[dict]:
+    """
+    Return the first entry of MAPPING whose pattern matches TXT.
+    """
     for line in mapping:
         line = line.strip()
 
         if line == "":
             continue
 
-        logger.debug(f"extract_product:read:{line}")
+        logger.debug("match_product:read:%s", line)
         data = json.loads(line)
 
         pattern = data["pattern"]
-        product = Product(
-            id=data["id"],
-            name=data["name"],
-            type=data["type"])
-
         if re.match(pattern, txt):
-            logger.debug(f"extract_product:match found:{pattern} → {txt} ")
-            return product
+            logger.debug("match_product:match found:%s → %s", pattern, txt)
+            return data
 
-        logger.debug(f"extract_product:match failed:{pattern} → {txt} ")
+        logger.debug("match_product:match failed:%s → %s", pattern, txt)
 
     return None
+
+
+def extract_product(txt: str, mapping: TextIO) -> Optional["Product"]:
+    data = match_product(txt, mapping)
+    if data is None:
+        return None
+
+    from asset_model import Product
+
+    return Product(id=data["id"], name=data["name"], type=data["type"])
@@ -1,11 +1,15 @@
 import os
 from abc import ABC, abstractmethod
 from common.logger import getLogger
-from dns.name import from_text
-from dns.exception import DNSException
-from typing import Callable, TextIO
+from common.metrics import STAGE_ITEMS
+from typing import TYPE_CHECKING, Callable, Optional, TextIO
 
-from .core import extract_product, query_txt
+from .core import match_product, query_txt, probe_txt, load_prefixes
+
+if TYPE_CHECKING:
+    from .spf import SPFExpander
+    from common.dns.resolve import ResilientResolver
+    from common.ratelimiter import RateLimiter
 
 __location__ = os.path.realpath(
     os.path.join(os.getcwd(), os.path.dirname(__file__)))
@@ -16,6 +20,7 @@ logger = getLogger(__name__)
 class ExtractProductBase(ABC):
 
     IS_ASYNC: bool = False
+    MAPPING: str = "mapping.jsonl"
 
     mapping: TextIO
     on_success: Callable[[str], None]
@@ -28,7 +33,7 @@ class ExtractProductBase(ABC):
     ):
 
         try:
-            self.mapping = open(os.path.join(__location__, "mapping.jsonl"))
+            self.mapping = open(os.path.join(__location__, self.MAPPING))
         except OSError:
             raise
 
@@ -55,12 +60,12 @@ class ExtractProductFromTxtCommand(ExtractProductBase):
 
     def run(self):
         with self.mapping:
-            product = extract_product(self.txt, self.mapping)
+            product = match_product(self.txt, self.mapping)
             if product is None:
                 self.on_failure(self.txt)
                 return
 
-            self.on_success(product.name, self.txt)
+            self.on_success(product["name"], self.txt)
 
 
 class ExtractProductsFromDomain(ExtractProductBase):
@@ -80,6 +85,9 @@ class ExtractProductsFromDomain(ExtractProductBase):
     ):
         super().__init__(on_success, on_failure)
 
+        from dns.name import from_text
+        from dns.exception import DNSException
+
         try:
             _domain = from_text(domain)
         except DNSException:
@@ -90,11 +98,182 @@ class ExtractProductsFromDomain(ExtractProductBase):
     def run(self):
         with self.mapping:
             for txt in self.txts:
+                STAGE_ITEMS.inc(tool="txtminer", stage="txt")
                 self.mapping.seek(0)
 
-                product = extract_product(txt, self.mapping)
+                product = match_product(txt, self.mapping)
                 if product is None:
                     self.on_failure(txt)
                     continue
 
-                self.on_success(product.name, txt)
+                self.on_success(product["name"], txt)
+
+
+class ExtractProductsFromPrefixes(ExtractProductBase):
+    """
+    Probe the TXT records of DOMAIN and of the well-known prefixes and
+    DKIM selectors below it, and match every TXT found.
+    """
+
+    IS_ASYNC: bool = True
+    PREFIXES: str = "prefixes.jsonl"
+
+    domain: str
+    prefixes: list[dict]
+    resolver: "ResilientResolver"
+    ratelimiter: "RateLimiter"
+
+    def __init__(
+            self,
+            domain: str,
+            on_success: Callable[[str, str], None],
+            on_failure: Callable[[str], None],
+            resolver: Optional["ResilientResolver"] = None,
+            ratelimiter_batch: int = 10,
+            ratelimiter_delay: int = 300
+    ):
+        """
+        Instanciate the ExtractProductsFromPrefixes.
+
+        :param domain: the domain to probe
+        :param on_success: function called with a product and its TXT
+        :param on_failure: function called with an unknown TXT
+        :param resolver: a resolver shared with other commands, the
+            system one by default
+        :param ratelimiter_delay: delay between each requests batch
+        :param ratelimiter_batch: size of each requests batch
+        :raises DNSException: when domain is not a valid name
+        :raises OSError: when the prefix list cannot be opened
+        :raises ValueError: when rate limiter receive impossible values
+        """
+        super().__init__(on_success, on_failure)
+
+        from dns.name import from_text
+        from dns.exception import DNSException
+        from dns.asyncresolver import Resolver
+        from common.dns.resolve import ResilientResolver
+        from common.ratelimiter import RateLimiter
+
+        try:
+            self.domain = from_text(domain)
+        except DNSException:
+            raise
+
+        try:
+            with open(os.path.join(__location__, self.PREFIXES)) as f:
+                self.prefixes = load_prefixes(f)
+        except OSError:
+            raise
+
+        if resolver is None:
+            resolver = ResilientResolver(Resolver(), tool="txtminer")
+        self.resolver = resolver
+
+        try:
+            self.ratelimiter = RateLimiter(
+                ratelimiter_batch,
+                ratelimiter_delay)
+        except ValueError:
+            raise
+
+    async def _probe(self, entry: dict) -> tuple[dict, list[str]]:
+        from dns.name import from_text
+        from dns.exception import DNSException
+
+        try:
+            name = from_text(entry["prefix"], self.domain) \
+                if entry["prefix"] != "" else self.domain
+            return entry, await probe_txt(name, self.resolver)
+        except DNSException as e:
+            logger.warning(
+                f"probe:{entry['prefix']}.{self.domain} unresolved: "
+                f"{type(e).__name__}")
+            return entry, []
+
+    async def run(self):
+        import asyncio
+
+        tasks = []
+        for entry in self.prefixes:
+            await self.ratelimiter.try_acquire_async()
+            tasks.append(asyncio.create_task(self._probe(entry)))
+
+        # TXTs are matched as their answers come, whatever their name
+        with self.mapping:
+            for task in asyncio.as_completed(tasks):
+                entry, txts = await task
+                for txt in txts:
+                    STAGE_ITEMS.inc(tool="txtminer", stage="txt")
+                    self.mapping.seek(0)
+
+                    product = match_product(txt, self.mapping)
+                    if product is None and "name" in entry:
+                        product = entry
+
+                    if product is None:
+                        self.on_failure(txt)
+                        continue
+
+                    self.on_success(product["name"], txt)
+
+
+class ExpandSPFCommand(ExtractProductBase):
+    """
+    Expand the SPF record of DOMAIN, report the products behind its
+    includes and the IP ranges allowed to send its mail.
+    """
+
+    IS_ASYNC: bool = True
+    MAPPING: str = "spf_mapping.jsonl"
+
+    domain: str
+    expander: "SPFExpander"
+    on_network: Callable[[str], None]
+
+    def __init__(
+            self,
+            domain: str,
+            on_success: Callable[[str, str], None],
+            on_failure: Callable[[str], None],
+            on_network: Callable[[str], None],
+            expander: Optional["SPFExpander"] = None
+    ):
+        """
+        Instanciate the ExpandSPFCommand.
+
+        :param domain: the domain whose SPF record is expanded
+        :param on_success: function called with a product and the
+            include it was found in
+        :param on_failure: function called with an unknown include
+        :param on_network: function called with each IP range
+        :param expander: an expander shared with other commands, so
+            their common includes are only expanded once
+        """
+        super().__init__(on_success, on_failure)
+
+        from .spf import SPFExpander
+
+        self.domain = domain
+        self.expander = SPFExpander() if expander is None else expander
+        self.on_network = on_network
+
+    async def run(self):
+        expansion = await self.expander.expand(self.domain)
+        for error in expansion.errors:
+            logger.warning(f"expand_spf:{error}")
+
+        with self.mapping:
+            for include in dict.fromkeys(expansion.includes):
+                STAGE_ITEMS.inc(tool="txtminer", stage="spf_include")
+                self.mapping.seek(0)
+
+                txt = f"include:{include}"
+                product = match_product(include, self.mapping)
+                if product is None:
+                    self.on_failure(txt)
+                    continue
+
+                self.on_success(product["name"], txt)
+
+        for network in dict.fromkeys(expansion.networks):
+            self.on_network(network)
@@ -0,0 +1,261 @@
+import time
+import asyncio
+import ipaddress
+from dataclasses import dataclass, field
+from typing import Optional
+from dns.name import from_text
+from dns.rdatatype import TXT
+from dns.resolver import NXDOMAIN, NoAnswer
+from dns.asyncresolver import Resolver
+from dns.exception import DNSException
+
+from common.logger import getLogger
+from common.metrics import STAGE_ITEMS
+from common.dns.resolve import ResilientResolver
+
+logger = getLogger(__name__)
+
+# RFC 7208 4.6.4, DNS lookups and void lookups allowed per check_host()
+MAX_LOOKUPS = 10
+MAX_VOID_LOOKUPS = 2
+
+# Mechanisms and modifiers costing a DNS lookup
+LOOKUP_TERMS = ("include", "a", "mx", "ptr", "exists", "redirect")
+
+
+class SPFError(DNSException):
+    """The SPF record is malformed or breaks one of the RFC 7208 limits."""
+
+
+@dataclass
+class SPFExpansion:
+    """
+    An SPF record with every include and redirect expanded.
+    """
+
+    domain:     str
+    ttl:        int
+    record:     Optional[str] = None
+    includes:   list[str] = field(default_factory=list)
+    networks:   list[str] = field(default_factory=list)
+    lookups:    int = 0
+    voids:      int = 0
+    errors:     list[str] = field(default_factory=list)
+    truncated:  bool = False
+
+
+def parse_spf(txt: str) -> Optional[list[tuple[str, str]]]:
+    """
+    Split the SPF record TXT into (name, value) terms, qualifiers
+    dropped and names lowercased. Mechanisms without a value, like
+    "mx", have an empty one.
+
+    :returns: None when TXT is not an SPF record
+    """
+    terms = txt.split()
+    if len(terms) == 0 or terms[0].lower() != "v=spf1":
+        return None
+
+    parsed = []
+    for term in terms[1:]:
+        term = term.lstrip("+-~?")
+        for sep in (":", "=", "/"):
+            name, found, value = term.partition(sep)
+            if found:
+                parsed.append(
+                    (name.lower(), value if sep != "/" else sep + value))
+                break
+        else:
+            parsed.append((term.lower(), ""))
+    return parsed
+
+
+class SPFExpander:
+    """
+    Expand SPF records, following their includes and redirects
+    concurrently.
+
+    Each expansion is cached for the TTL of its record, the shortest one
+    of the chain, so the providers shared by many domains (e.g.
+    _spf.google.com) are only expanded once. The cache is meant to be
+    shared by every command of a run.
+    """
+
+    resolver: ResilientResolver
+    max_ttl: int
+    cache: dict[str, tuple[float, SPFExpansion]]
+
+    def __init__(
+            self,
+            resolver: Optional[ResilientResolver] = None,
+            max_ttl: int = 3600
+    ):
+        """
+        Instanciate the SPFExpander.
+
+        :param resolver: the resolver of the TXT queries, the system
+            one by default
+        :param max_ttl: max time an expansion is cached for (s)
+        :raises ValueError: when max_ttl is an impossible value
+        """
+        if max_ttl < 0:
+            raise ValueError("SPF cache TTL must be greather or equal to 0")
+
+        if resolver is None:
+            resolver = ResilientResolver(Resolver(), tool="txtminer")
+
+        self.resolver = resolver
+        self.max_ttl = max_ttl
+        self.cache = {}
+
+    async def _query(self, domain: str) -> tuple[Optional[str], int]:
+        """
+        Return the SPF record of DOMAIN and its TTL, None when it has
+        none.
+
+        :raises SPFError: when DOMAIN has more than one SPF record
+        """
+        try:
+            answer = await self.resolver.resolve(from_text(domain), TXT)
+        except (NXDOMAIN, NoAnswer):
+            return None, self.max_ttl
+
+        records = [
+            record for record in (
+                b"".join(rdata.strings).decode("ascii", errors="replace")
+                for rdata in answer)
+            if parse_spf(record) is not None]
+
+        if len(records) > 1:
+            raise SPFError(f"{domain} has {len(records)} SPF records")
+
+        ttl = min(answer.rrset.ttl, self.max_ttl)
+        return (records[0] if records else None), ttl
+
+    async def expand(
+            self,
+            domain: str,
+            chain: tuple[str, ...] = ()
+    ) -> SPFExpansion:
+        """
+        Expand the SPF record of DOMAIN, or return its cached expansion.
+
+        :param chain: the domains including DOMAIN, to detect loops
+        :raises DNSException: when the TXT query fails
+        """
+        domain = domain.rstrip(".").lower()
+
+        cached = self.cache.get(domain)
+        if cached is not None and cached[0] > time.monotonic():
+            logger.debug("expand:cached:%s", domain)
+            STAGE_ITEMS.inc(tool="txtminer", stage="spf_cached")
+            return cached[1]
+
+        try:
+            record, ttl = await self._query(domain)
+        except SPFError as e:
+            return SPFExpansion(domain, 0, errors=[str(e)])
+        except DNSException:
+            raise
+
+        expansion = SPFExpansion(domain, ttl, record)
+        if record is None:
+            expansion.voids = 1
+        else:
+            await self._expand_record(expansion, record, chain + (domain,))
+
+        STAGE_ITEMS.inc(tool="txtminer", stage="spf_expanded")
+
+        # An expansion cut by a loop or the depth limit depends on the
+        # domains including it, it does not hold for other chains
+        if not expansion.truncated:
+            self.cache[domain] = (time.monotonic() + expansion.ttl, expansion)
+        return expansion
+
+    async def _expand_record(
+            self,
+            expansion: SPFExpansion,
+            record: str,
+            chain: tuple[str, ...]
+    ):
+        terms = parse_spf(record)
+        targets = []
+
+        for name, value in terms:
+            if name in LOOKUP_TERMS:
+                expansion.lookups += 1
+
+            match name:
+                case "ip4" | "ip6":
+                    try:
+                        network = ipaddress.ip_network(value, strict=False)
+                        expansion.networks.append(str(network))
+                    except ValueError:
+                        expansion.errors.append(
+                            f"{expansion.domain}: invalid {name}:{value}")
+                case "include":
+                    targets.append(value)
+                case "redirect":
+                    # A redirect only applies when there is no "all"
+                    if ("all", "") not in terms:
+                        targets.append(value)
+
+        expandable = []
+        for target in targets:
+            if "%" in target:
+                expansion.errors.append(
+                    f"{expansion.domain}: {target} is a macro, "
+                    f"it is not expanded")
+            elif target.rstrip(".").lower() in chain:
+                expansion.truncated = True
+                expansion.errors.append(
+                    f"{expansion.domain}: {target} includes itself")
+            elif len(chain) > MAX_LOOKUPS:
+                # Every level costs a lookup, deeper ones are over the limit
+                expansion.truncated = True
+                expansion.errors.append(
+                    f"{expansion.domain}: {target} is nested too deep")
+            else:
+                expandable.append(target)
+
+        # Siblings are expanded concurrently, the limits are checked
+        # in the order a receiver evaluates them
+        children = await asyncio.gather(
+            *[self.expand(target, chain) for target in expandable],
+            return_exceptions=True)
+
+        for target, child in zip(expandable, children):
+            if isinstance(child, DNSException):
+                expansion.errors.append(
+                    f"{expansion.domain}: {target} unresolved: "
+                    f"{type(child).__name__}")
+                continue
+            if isinstance(child, BaseException):
+                raise child
+
+            expansion.truncated |= child.truncated
+            if expansion.lookups + child.lookups > MAX_LOOKUPS:
+                expansion.errors.append(
+                    f"{expansion.domain}: more than {MAX_LOOKUPS} DNS "
+                    f"lookups, stopped at {target}")
+                break
+
+            if expansion.voids + child.voids > MAX_VOID_LOOKUPS:
+                expansion.errors.append(
+                    f"{expansion.domain}: more than {MAX_VOID_LOOKUPS} void "
+                    f"lookups, stopped at {target}")
+                break
+
+            expansion.ttl = min(expansion.ttl, child.ttl)
+            expansion.voids += child.voids
+            # A child breaking the RFC has no record either, its errors
+            # tell why
+            if child.record is None:
+                expansion.errors += child.errors or [
+                    f"{expansion.domain}: {target} has no SPF record"]
+                continue
+
+            expansion.includes += [child.domain, *child.includes]
+            expansion.networks += child.networks
+            expansion.lookups += child.lookups
+            expansion.errors += child.errors
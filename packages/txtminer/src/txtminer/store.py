@@ -0,0 +1,34 @@
+from typing import TYPE_CHECKING
+from asset_model import SimpleProperty
+
+if TYPE_CHECKING:
+    from oam_client import AsyncBrokerClient
+    from oam_client.messages import Entity, EntityTag
+
+
+async def tag_product(
+        store: "AsyncBrokerClient",
+        node: "Entity",
+        product: str,
+        txt: str
+) -> "EntityTag":
+    """
+    Record that NODE uses PRODUCT, as told by its TXT record or SPF
+    include TXT.
+    """
+    return await store.create_entity_tag(
+        SimpleProperty("txt_product", f"{product} {txt}"),
+        node.id)
+
+
+async def tag_network(
+        store: "AsyncBrokerClient",
+        node: "Entity",
+        network: str
+) -> "EntityTag":
+    """
+    Record that the SPF record of NODE allows NETWORK to send its mail.
+    """
+    return await store.create_entity_tag(
+        SimpleProperty("spf_network", network),
+        node.id)
@@ -0,0 +1,128 @@
+import asyncio
+import dns.rrset
+from dns.name import Name
+from dns.resolver import NXDOMAIN
+
+from txtminer.spf import SPFExpander, parse_spf, MAX_LOOKUPS
+
+
+class FakeAnswer:
+    def __init__(self, rrset: dns.rrset.RRset):
+        self.rrset = rrset
+
+    def __iter__(self):
+        return iter(self.rrset)
+
+
+class FakeResolver:
+    """
+    Answer the TXT queries from ZONE, a dict of domain to TXT strings.
+    """
+
+    def __init__(self, zone: dict[str, list[str]]):
+        self.zone = zone
+        self.queries: list[str] = []
+
+    async def resolve(self, qname: Name, rdtype) -> FakeAnswer:
+        domain = qname.to_text(True)
+        self.queries.append(domain)
+        if domain not in self.zone:
+            raise NXDOMAIN()
+        return FakeAnswer(dns.rrset.from_text_list(
+            qname, 300, "IN", "TXT",
+            [f'"{txt}"' for txt in self.zone[domain]]))
+
+
+def expand(zone: dict[str, list[str]], *domains: str):
+    expander = SPFExpander(FakeResolver(zone))
+
+    async def run():
+        return [await expander.expand(domain) for domain in domains]
+    return expander, asyncio.run(run())
+
+
+def test_parse_spf():
+    assert parse_spf(
+        "v=spf1 +ip4:192.0.2.0/24 ~include:_spf.example.com "
+        "MX mx/24 redirect=other.example.com -all") == [
+            ("ip4", "192.0.2.0/24"),
+            ("include", "_spf.example.com"),
+            ("mx", ""),
+            ("mx", "/24"),
+            ("redirect", "other.example.com"),
+            ("all", "")]
+
+
+def test_parse_spf_not_spf():
+    assert parse_spf("google-site-verification=abc") is None
+    assert parse_spf("v=spf10 -all") is None
+    assert parse_spf("") is None
+
+
+def test_expand_includes():
+    _, [expansion] = expand({
+        "a.test": ["v=spf1 ip4:192.0.2.1 include:b.test -all"],
+        "b.test": ["v=spf1 ip6:2001:db8::/32 ~all"],
+    }, "a.test")
+
+    assert expansion.includes == ["b.test"]
+    assert expansion.networks == ["192.0.2.1/32", "2001:db8::/32"]
+    assert expansion.errors == []
+
+
+def test_lookup_limit():
+    includes = [f"i{i}.test" for i in range(MAX_LOOKUPS + 1)]
+    zone = {
+        include: [f"v=spf1 ip4:10.0.0.{i} -all"]
+        for i, include in enumerate(includes)}
+
+    zone["ten.test"] = [
+        "v=spf1 " + " ".join(f"include:{i}" for i in includes[:-1]) + " -all"]
+    zone["eleven.test"] = [
+        "v=spf1 " + " ".join(f"include:{i}" for i in includes) + " -all"]
+
+    _, [ten, eleven] = expand(zone, "ten.test", "eleven.test")
+
+    assert ten.errors == []
+    assert len(ten.networks) == MAX_LOOKUPS
+    assert eleven.errors == [
+        f"eleven.test: more than {MAX_LOOKUPS} DNS lookups, "
+        f"stopped at i0.test"]
+    assert eleven.networks == []
+
+
+def test_void_limit():
+    _, [expansion] = expand({
+        "a.test": [
+            "v=spf1 include:v0.test include:v1.test include:v2.test -all"],
+    }, "a.test")
+
+    assert expansion.voids == 2
+    assert expansion.errors[-1] == \
+        "a.test: more than 2 void lookups, stopped at v2.test"
+
+
+def test_loop_is_not_cached():
+    expander, [a, b] = expand({
+        "a.test": ["v=spf1 ip4:192.0.2.1 include:b.test -all"],
+        "b.test": ["v=spf1 ip4:192.0.2.2 include:a.test -all"],
+    }, "a.test", "b.test")
+
+    assert a.truncated
+    assert a.networks == ["192.0.2.1/32", "192.0.2.2/32"]
+    assert a.errors == ["b.test: a.test includes itself"]
+
+    # b.test was expanded inside the chain of a.test first, its own
+    # expansion still holds the records of a.test
+    assert b.networks == ["192.0.2.2/32", "192.0.2.1/32"]
+    assert b.errors == ["a.test: b.test includes itself"]
+    assert expander.cache == {}
+
+
+def test_child_error_is_kept():
+    _, [expansion] = expand({
+        "a.test": ["v=spf1 include:b.test -all"],
+        "b.test": ["v=spf1 ip4:192.0.2.1 -all", "v=spf1 -all"],
+    }, "a.test")
+
+    assert expansion.errors == ["b.test has 2 SPF records"]